@@ -34,7 +34,8 @@ __all__ = (
     "internal",
     "storage",
     "attitudes",
-    "exceptions"
+    "exceptions",
+    "config"
 )
 
 __getattr__, __dir__, _ = lazy.attach(__name__, __all__)
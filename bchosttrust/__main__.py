@@ -25,16 +25,31 @@ import click
 from . import __version__
 from .cli import __all__ as list_clis
 from .storage import get_default_storage
+from .storage.instrument import BCHTInstrumentedStorage
 
 
 @click.group()
+@click.option("--config", "config_path", type=click.Path(dir_okay=False),
+              envvar="BCHT_CONFIG", default=None,
+              help="The configuration file to be used.")
+@click.option("--stats", is_flag=True, envvar="BCHT_STATS",
+              help="Print the calls to the storage backend and their latencies "
+              "as JSON into stderr.")
 @click.pass_context
-def cli(ctx):
+def cli(ctx, config_path, stats):
     """BCHostTrust Command-line Script"""
 
-    # get the default storage backend
+    # get the storage backend chosen in the configuration
+    storage = get_default_storage(config_path)
+    if stats:
+        storage = BCHTInstrumentedStorage(storage)
+        # Exited in reverse order: the command is measured before printing
+        ctx.call_on_close(lambda: click.echo(storage.stats.to_json(indent=2), err=True))
+        ctx.with_resource(storage.stats.timer("command"))
+
     ctx.obj = {
-        "storage": get_default_storage()
+        "storage": storage,
+        "config_path": config_path
     }
 
 
@@ -24,7 +24,7 @@ import lazy_loader as lazy
 from typeguard import typechecked
 from ..internal import BCHTBlock
 from ..storage import BCHTStorageBase
-from ..storage.import_block import parse_curr_hashes
+from ..storage.import_block import get_best_hash
 
 __all__ = ("search", "tree", "horizontal")
 
@@ -40,7 +40,8 @@ def get_last_block_hash(backend: BCHTStorageBase, safe: bool = True) -> bytes:
     backend : BCHTStorageBase
         The storage backend to be used.
     safe : bool, optional
-        Whether to skip the current blocks (i.e. no blocks behind it), by default True
+        Whether to skip the current blocks (i.e. no blocks behind it), by default True.
+        If not, the best tip (the block with the most cumulative work) is returned.
 
     Returns
     -------
@@ -55,7 +56,7 @@ def get_last_block_hash(backend: BCHTStorageBase, safe: bool = True) -> bytes:
 
     if safe:
         try:
-            rtn = backend.getattr(b"prev_hash")
+            rtn = backend.getattr_cached(b"prev_hash")
         except KeyError as e:
             raise RuntimeError("Unable to find last block hash") from e
         # Special value for null block (i.e. block "before" genesis block)
@@ -63,10 +64,10 @@ def get_last_block_hash(backend: BCHTStorageBase, safe: bool = True) -> bytes:
             raise RuntimeError("Unable to find last block hash")
         return rtn
 
-    curr_blocks = parse_curr_hashes(backend)
-    if len(curr_blocks) == 0:
+    rtn = get_best_hash(backend)
+    if rtn == (b"\x00" * 32):
         raise RuntimeError("Unable to find last block hash")
-    return curr_blocks[0]
+    return rtn
 
 
 def get_last_block(backend: BCHTStorageBase, safe: bool = True) -> BCHTBlock:
@@ -20,13 +20,19 @@
 # bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
 
 from collections import defaultdict
-from typing import Generator
+from typing import Generator, Optional
 
 from typeguard import typechecked
 
 from ..storage import BCHTStorageBase
+from ..storage.index import (has_block_meta, get_block_meta,
+                             iter_domain_postings, iter_blocks_by_time)
+from ..storage.chainstate import (get_state_tip, get_state_votes,
+                                  iter_state_votes, iter_main_chain)
+from ..storage.prune import get_pruned_height
 from ..internal import BCHTBlock
 from .. import attitudes
+from .. import exceptions
 
 
 @typechecked
@@ -66,10 +72,86 @@ def iter_from_block(backend: BCHTStorageBase, bhash: bytes) -> Generator[BCHTBlo
         yield block
 
 
+@typechecked
+def iter_main_chain_blocks(
+        backend: BCHTStorageBase,
+        start: int = 0,
+        stop: Optional[int] = None,
+        reverse: bool = False) -> Generator[BCHTBlock, None, None]:
+    """Go through the blocks of the main chain by height,
+    without following prev_hash from one block to another.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    start : int, optional
+        The lowest height to be returned (inclusive), by default 0
+    stop : int, optional
+        The height to stop at (exclusive), by default None (the end of the chain)
+    reverse : bool, optional
+        Whether to go from the highest block downwards, by default False
+
+    Yields
+    ------
+    BCHTBlock
+        The blocks
+    """
+
+    for _, bhash in iter_main_chain(backend, start, stop, reverse):
+        yield backend.get(bhash)
+
+
+def _unbounded(since: Optional[int], until: Optional[int]) -> bool:
+    return since is None and until is None
+
+
+def _blocks_after_state(backend: BCHTStorageBase, bhash: bytes) -> Optional[list[BCHTBlock]]:
+    # The blocks from bhash back to the state tip (exclusive), if bhash is built
+    # on it, e.g. the current blocks. Unbounded queries read the materialized
+    # state for the rest, which in the pruned mode is all that is left of it.
+    state_tip = get_state_tip(backend)
+    if bhash == state_tip:
+        return []
+    if not (has_block_meta(backend, bhash) and has_block_meta(backend, state_tip)):
+        return None
+    depth = get_block_meta(backend, bhash).height - get_block_meta(backend, state_tip).height
+    blocks = []
+    for _ in range(depth):
+        blocks.append(backend.get(bhash))
+        bhash = blocks[-1].prev_hash
+    return blocks if bhash == state_tip else None
+
+
+def _check_unpruned(backend: BCHTStorageBase):
+    # Walks along the chain would stop silently at the first block removed
+    height = get_pruned_height(backend)
+    if height > 0:
+        raise exceptions.BCHTHistoryPrunedError(
+            f"Blocks below height {height} are pruned, so only the state tip "
+            "and the blocks built on it can be rated over the whole history.")
+
+
+def _iter_period_from_block(
+        backend: BCHTStorageBase,
+        bhash: bytes,
+        since: Optional[int],
+        until: Optional[int]) -> Generator[BCHTBlock, None, None]:
+    # A block is never earlier than its previous block,
+    # so the walk can stop at the first block earlier than since.
+    for block in iter_from_block(backend, bhash):
+        if since is not None and block.creation_time < since:
+            return
+        if until is None or block.creation_time < until:
+            yield block
+
+
 @typechecked
 def get_website_votes(
         backend: BCHTStorageBase,
-        bhash: bytes) -> defaultdict[str, defaultdict[int, int]]:
+        bhash: bytes,
+        since: Optional[int] = None,
+        until: Optional[int] = None) -> defaultdict[str, defaultdict[int, int]]:
     """Count the number of votes with different attitudes on websites
 
     Parameters
@@ -78,6 +160,10 @@ def get_website_votes(
         The storage backend to be used.
     bhash : bytes
         The hash of the starting block. See iter_from_block(...) for more details.
+    since : int, optional
+        If given, only count blocks created at or after this Unix epoch.
+    until : int, optional
+        If given, only count blocks created before this Unix epoch.
 
     Returns
     -------
@@ -87,11 +173,32 @@ def get_website_votes(
         contains the number of votes.
         defaultdict is an instance of dict, so it can be treated
         as if it is an ordinary dictionary.
+
+    Raises
+    ------
+    BCHTHistoryPrunedError
+        If the whole history is asked for from a block not built on the state tip,
+        but the old blocks were removed in the pruned mode.
     """
 
     result = defaultdict(lambda: defaultdict(int))
 
-    for block in iter_from_block(backend, bhash):
+    newer = _blocks_after_state(backend, bhash) if _unbounded(since, until) else None
+    if newer is not None:
+        # Read the materialized state instead of the whole chain
+        result.update(iter_state_votes(backend))
+        blocks = newer
+    elif _unbounded(since, until):
+        _check_unpruned(backend)
+        blocks = iter_from_block(backend, bhash)
+    elif has_block_meta(backend, bhash):
+        # Read only the blocks within the period from the time index
+        blocks = (backend.get(h) for h in iter_blocks_by_time(
+            backend, since, until, bhash))
+    else:
+        blocks = _iter_period_from_block(backend, bhash, since, until)
+
+    for block in blocks:
         for entry in block.entries:
             result[entry.domain_name][entry.attitude] += 1
 
@@ -102,7 +209,9 @@ def get_website_votes(
 def get_specific_website_votes(
         backend: BCHTStorageBase,
         bhash: bytes,
-        hostname: str) -> defaultdict[int, int]:
+        hostname: str,
+        since: Optional[int] = None,
+        until: Optional[int] = None) -> defaultdict[int, int]:
     """Get the number of votes with different attitudes on a specific website
 
     Parameters
@@ -113,16 +222,48 @@ def get_specific_website_votes(
         The hash of the starting block. See iter_from_block(...) for more details.
     hostname : str
         The hostname to be checked.
+    since : int, optional
+        If given, only count blocks created at or after this Unix epoch.
+    until : int, optional
+        If given, only count blocks created before this Unix epoch.
 
     Returns
     -------
     defaultdict[int, int]
         A dictionary with attitudes as keys and votes as values.
+
+    Raises
+    ------
+    BCHTHistoryPrunedError
+        If the blocks needed were removed, see get_website_votes.
     """
 
+    newer = _blocks_after_state(backend, bhash) if _unbounded(since, until) else None
+    if newer is not None:
+        result = get_state_votes(backend, hostname)
+        for block in newer:
+            for entry in block.entries:
+                if entry.domain_name == hostname:
+                    result[entry.attitude] += 1
+        return result
+    if _unbounded(since, until):
+        _check_unpruned(backend)
+
     result: defaultdict[int, int] = defaultdict(int)
 
-    for block in iter_from_block(backend, bhash):
+    if has_block_meta(backend, bhash):
+        # Read only the votes on this hostname from the domain index
+        for posting in iter_domain_postings(backend, hostname, bhash):
+            if not _unbounded(since, until):
+                creation_time = get_block_meta(
+                    backend, posting.block_hash).creation_time
+                if (since is not None and creation_time < since) or \
+                        (until is not None and creation_time >= until):
+                    continue
+            result[posting.attitude] += 1
+        return result
+
+    for block in _iter_period_from_block(backend, bhash, since, until):
         for entry in block.entries:
             if entry.domain_name == hostname:
                 result[entry.attitude] += 1
@@ -133,7 +274,9 @@ def get_specific_website_votes(
 @typechecked
 def get_website_rating(
         backend: BCHTStorageBase,
-        bhash: bytes) -> dict[str, int]:
+        bhash: bytes,
+        since: Optional[int] = None,
+        until: Optional[int] = None) -> dict[str, int]:
     """Get the rating of hostnames by their votes.
 
     Parameters
@@ -142,15 +285,24 @@ def get_website_rating(
         The storage backend to be used.
     bhash : bytes
         The hash of the starting block. See iter_from_block(...) for more details.
+    since : int, optional
+        If given, only count blocks created at or after this Unix epoch.
+    until : int, optional
+        If given, only count blocks created before this Unix epoch.
 
     Returns
     -------
     dict[str, int]
         A dictionary with website domain names as key, and its rating as the value.
+
+    Raises
+    ------
+    BCHTHistoryPrunedError
+        If the blocks needed were removed, see get_website_votes.
     """
 
     result = {}
-    for name, votes in get_website_votes(backend, bhash).items():
+    for name, votes in get_website_votes(backend, bhash, since, until).items():
         result[name] = sum((attitudes.WEIGHTS[att] * num)
                            for att, num in votes.items())
     return result
@@ -160,7 +312,9 @@ def get_website_rating(
 def get_specific_website_rating(
         backend: BCHTStorageBase,
         bhash: bytes,
-        hostname: str) -> int:
+        hostname: str,
+        since: Optional[int] = None,
+        until: Optional[int] = None) -> int:
     """Get the rating of hostnames by their votes.
 
     Parameters
@@ -171,13 +325,22 @@ def get_specific_website_rating(
         The hash of the starting block. See iter_from_block(...) for more details.
     hostname : str
         The hostname to be checked.
+    since : int, optional
+        If given, only count blocks created at or after this Unix epoch.
+    until : int, optional
+        If given, only count blocks created before this Unix epoch.
 
     Returns
     -------
     int
         The rating of the hostname.
+
+    Raises
+    ------
+    BCHTHistoryPrunedError
+        If the blocks needed were removed, see get_website_votes.
     """
 
-    votes = get_specific_website_votes(backend, bhash, hostname)
+    votes = get_specific_website_votes(backend, bhash, hostname, since, until)
 
     return sum((attitudes.WEIGHTS[att] * num) for att, num in votes.items())
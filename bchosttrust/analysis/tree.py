@@ -19,11 +19,14 @@
 # The legal text of GPLv3 and LGPLv3 can be found at
 # bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
 
+from collections import defaultdict
 from typing import Iterable
 from anytree import Node
 from typeguard import typechecked
 
-from ..internal import BCHTBlock
+from ..internal import BCHTBlock, BCHTBlockHeader
+from ..storage import BCHTStorageBase
+from ..storage.index import get_children
 
 
 @typechecked
@@ -70,3 +73,67 @@ def generate_tree(block_list: Iterable[BCHTBlock], from_block: bytes) -> Node:
         child_block = generate_tree(block_list, child.hash)
         child_block.parent = root
     return root
+
+
+@typechecked
+def generate_tree_from_headers(
+        headers: Iterable[tuple[bytes, BCHTBlockHeader]],
+        from_block: bytes) -> Node:
+    """Generate a tree of blocks in the BCHT chain from the headers of all blocks,
+    going through them only once.
+
+    Parameters
+    ----------
+    headers : Iterable[tuple[bytes, BCHTBlockHeader]]
+        Hashes and headers of blocks, typically returned by backend.iter_headers()
+    from_block : bytes
+        The hash of the starting block
+
+    Returns
+    -------
+    Node
+        The Node object of the root. The name attibute of it is the hash.
+        See https://anytree.readthedocs.io/en/stable/api/anytree.node.html#anytree.node.node.Node
+        for more usages.
+    """
+
+    children = defaultdict(list)
+    for block_hash, header in headers:
+        children[header.prev_hash].append(block_hash)
+
+    root = Node(from_block)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in sorted(children[node.name]):
+            stack.append(Node(child, parent=node))
+    return root
+
+
+@typechecked
+def generate_tree_from_storage(backend: BCHTStorageBase, from_block: bytes) -> Node:
+    """Generate a tree of blocks in the BCHT chain using the children index,
+    reading only the blocks under from_block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    from_block : bytes
+        The hash of the starting block
+
+    Returns
+    -------
+    Node
+        The Node object of the root. The name attibute of it is the hash.
+        See https://anytree.readthedocs.io/en/stable/api/anytree.node.html#anytree.node.node.Node
+        for more usages.
+    """
+
+    root = Node(from_block)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in get_children(backend, node.name):
+            stack.append(Node(child, parent=node))
+    return root
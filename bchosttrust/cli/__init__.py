@@ -27,7 +27,10 @@ __all__ = (
     "create",
     "get_rate",
     "similar_domain",
-    "tree"
+    "tree",
+    "prune",
+    "reindex",
+    "migrate"
 )
 
 import lazy_loader as lazy
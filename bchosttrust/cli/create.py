@@ -26,7 +26,7 @@ from ..internal.block import BCHTEntry
 from ..storage import BCHTStorageBase, import_block
 from ..consensus.powc import attempt
 from .. import exceptions
-from ..storage.import_block import get_curr_blocks
+from ..storage.import_block import get_best_hash
 
 
 @click.command("create")
@@ -93,14 +93,14 @@ def cli(  # pylint: disable=too-many-arguments, too-many-locals
 
         list_entries.append(new_entry)
 
-    curr_hashes = get_curr_blocks(storage)
-    if len(curr_hashes) == 0:
+    best_hash = get_best_hash(storage)
+    if best_hash == b"\x00" * 32:
         echo("Current block not found.", err=True)
         ctx.exit(3)
-    echo(f"Working on {curr_hashes[0].hexdigest}", err=True)
+    echo(f"Working on {best_hash.hex()}", err=True)
 
     try:
-        block, nonce = attempt(version, curr_hashes[0].hash,
+        block, nonce = attempt(version, best_hash,
                                creation_time, tuple(list_entries))
     except exceptions.BCHTOutOfRangeError as e:
         echo(f"Some value is out of range: {e}", err=True)
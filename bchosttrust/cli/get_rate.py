@@ -24,25 +24,40 @@ from click import echo
 
 from ..storage import BCHTStorageBase
 from ..analysis import get_last_block_hash, search
+from .. import exceptions
 
 
 @click.command("get-rate")
 @click.option("--safe/--no-safe", default=True,
               help="Whether to skip the current blocks (i.e. no blocks behind it)")
+@click.option("--since", type=int, default=None,
+              help="Only count blocks created at or after this Unix epoch")
+@click.option("--until", type=int, default=None,
+              help="Only count blocks created before this Unix epoch")
 @click.argument('hostname', type=str)
 @click.pass_context
-def cli(ctx: click.Context, safe: bool, hostname: str):
+def cli(ctx: click.Context,
+        safe: bool,
+        since: int | None,
+        until: int | None,
+        hostname: str):
     """Get the rating of a domain"""
 
     storage: BCHTStorageBase = ctx.obj["storage"]
 
-    last_block_hash = None
-    try:
-        last_block_hash = get_last_block_hash(storage, safe=safe)
-    except RuntimeError as e:
-        echo(f"Error getting last block hash: {e}", err=True)
-        ctx.exit(1)
-
-    rating = search.get_specific_website_rating(
-        storage, hostname, last_block_hash)
-    echo(rating)
+    # The last block and the votes are read as of the same moment
+    with storage.snapshot() as snapshot:
+        last_block_hash = None
+        try:
+            last_block_hash = get_last_block_hash(snapshot, safe=safe)
+        except RuntimeError as e:
+            echo(f"Error getting last block hash: {e}", err=True)
+            ctx.exit(1)
+
+        try:
+            rating = search.get_specific_website_rating(
+                snapshot, last_block_hash, hostname, since, until)
+        except exceptions.BCHTHistoryPrunedError as e:
+            echo(f"History pruned: {e.args[0]}", err=True)
+            ctx.exit(1)
+        echo(rating)
@@ -26,15 +26,19 @@ from click import echo
 
 from ..internal.block import BCHTBlock
 from ..storage import import_block
+from ..storage.orphans import ORPHAN_PREFIX, BCHTOrphanPool
 from .. import exceptions
 
 
 @click.command("import")
 @click.option("--override/--no-override", default=False,
               help="Whether to override existing block of the same hash.")
+@click.option("--hold-orphan/--no-hold-orphan", default=False,
+              help="Whether to hold the block in the database if its previous block "
+              "is not found yet, to be imported together with it later.")
 @click.argument('input_file', type=click.File('rb'))
 @click.pass_context
-def cli(ctx: click.Context, override: bool, input_file: typing.BinaryIO):
+def cli(ctx: click.Context, override: bool, hold_orphan: bool, input_file: typing.BinaryIO):
     """Manually import a BCHT block into the blockchain database."""
 
     # `input` is a file opened in byte read mode.
@@ -57,22 +61,26 @@ def cli(ctx: click.Context, override: bool, input_file: typing.BinaryIO):
 
     block_hash = block.hash
 
-    if not override:
-        try:
-            _ = storage.get(block_hash)
-        except exceptions.BCHTBlockNotFoundError:
-            pass
-        else:
-            echo(
-                f"Import failed: A block with the hash {block.hexdigest} already exists.", err=True)
-            echo("Use --override to force-import this block.")
-            ctx.exit(2)
+    if not override and storage.contains(block_hash):
+        echo(
+            f"Import failed: A block with the hash {block.hexdigest} already exists.", err=True)
+        echo("Use --override to force-import this block.")
+        ctx.exit(2)
 
     try:
-        import_block.import_block(storage, block)
+        if hold_orphan or next(storage.iter_attrs(ORPHAN_PREFIX), None) is not None:
+            # Through the pool held before, so that the blocks waiting on this one follow
+            imported = BCHTOrphanPool(storage, persist=True).add(block, hold=hold_orphan)
+        else:
+            import_block.import_block(storage, block)
+            imported = (block_hash, )
     except exceptions.BCHTConsensusFailedError as e:
         echo(
             f"Import failed: The block failed the consensus: {e}", err=True)
         ctx.exit(4)
-    echo(block.hexdigest)
+    if not imported:
+        echo(f"Previous block not found, {block.hexdigest} is held until it arrives.",
+             err=True)
+    for imported_hash in imported:
+        echo(imported_hash.hex())
     ctx.exit(0)
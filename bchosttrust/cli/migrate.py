@@ -0,0 +1,96 @@
+# bchosttrust/bchosttrust/cli/migrate.py
+"""bcht migrate: copy the database to another storage backend"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+import time
+import typing
+
+import click
+from click import echo
+
+from ..config import load_config
+from ..storage.meta import BCHTStorageBase
+from ..storage.migrate import migrate
+from ..storage.uri import open_storage, parse_storage_uri
+from .. import exceptions
+
+
+@click.command("migrate")
+@click.option("--from", "source_uri", default=None,
+              help="The storage URI to copy from, by default the configured database.")
+@click.option("--to", "dest_uri", required=True,
+              help="The storage URI to copy to, e.g. sqlite:/srv/bcht.sqlite")
+@click.option("--batch-size", type=int, default=1000, show_default=True,
+              help="The number of blocks or attributes written at once.")
+@click.option("--verify/--no-verify", default=True,
+              help="Whether to compare the blocks and the attributes afterwards.")
+@click.pass_context
+def cli(ctx: click.Context, source_uri: typing.Optional[str], dest_uri: str,
+        batch_size: int, verify: bool):
+    """Copy the blocks and the attributes to another storage backend.
+
+    Run the same command again to resume an interrupted migration.
+    Do not import blocks into the source meanwhile."""
+
+    storage_config = load_config(ctx.obj.get("config_path"))["storage"]
+    configured = (storage_config["backend"], storage_config["path"])
+    if source_uri is None:
+        source_uri = ":".join(configured)
+    if parse_storage_uri(source_uri) == parse_storage_uri(dest_uri):
+        echo("Migrate failed: The source and the destination are the same.", err=True)
+        ctx.exit(1)
+    if parse_storage_uri(source_uri) == configured:
+        # Already opened, and locked, by the main script
+        source: BCHTStorageBase = ctx.obj["storage"]
+    else:
+        source = open_storage(source_uri, storage_config, create_if_missing=False)
+    dest = open_storage(dest_uri, storage_config)
+
+    started = time.monotonic()
+    copied = {"blocks": 0, "attrs": 0}
+
+    def progress(kind: str, count: int):
+        copied[kind] += count
+        elapsed = max(time.monotonic() - started, 1e-9)
+        echo(f"\rCopied {copied['blocks']} blocks ({copied['blocks'] / elapsed:.0f}/s) "
+             f"and {copied['attrs']} attributes", nl=False, err=True)
+
+    try:
+        stats = migrate(source, dest, batch_size, verify, progress)
+    except exceptions.BCHTMigrationError as e:
+        echo(f"\nMigrate failed: {e}", err=True)
+        ctx.exit(2)
+    except exceptions.BCHTOutOfRangeError as e:
+        echo(f"Migrate failed: {e}", err=True)
+        ctx.exit(1)
+    finally:
+        dest.close()
+        if source is not ctx.obj["storage"]:
+            source.close()
+
+    elapsed = time.monotonic() - started
+    if copied["blocks"] or copied["attrs"]:
+        echo(err=True)
+    if stats.resumed:
+        echo("Resumed an interrupted migration.")
+    echo(f"Copied {stats.blocks} blocks and {stats.attrs} attributes "
+         f"to {dest_uri} in {elapsed:.1f}s.")
+    if verify:
+        echo("The destination matches the source.")
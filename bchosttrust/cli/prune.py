@@ -0,0 +1,75 @@
+# bchosttrust/bchosttrust/cli/prune.py
+"""bcht prune: remove stale forks and old blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+import typing
+
+import click
+from click import echo
+
+from ..storage import prune
+from ..storage.meta import BCHTStorageBase
+from .. import exceptions
+
+
+@click.command("prune")
+@click.option("-d", "--depth", type=int, default=100, show_default=True,
+              help="Remove the forks starting this many blocks or more below the best tip.")
+@click.option("--full/--no-full", default=False,
+              help="Whether to check the whole main chain for stale forks, "
+              "instead of only the blocks added since the last run.")
+@click.option("-k", "--keep", type=int, default=None,
+              help="Turn on the pruned mode, keeping only this many main chain blocks "
+              "below the state tip. Older blocks are removed now and on every import.")
+@click.option("--no-pruned-mode", is_flag=True, default=False,
+              help="Turn off the pruned mode. Blocks already removed are not restored.")
+@click.option("--compact/--no-compact", default=True,
+              help="Whether to compact the database afterwards.")
+@click.pass_context
+def cli(  # pylint: disable=too-many-arguments
+        ctx: click.Context, *, depth: int, full: bool, keep: typing.Optional[int],
+        no_pruned_mode: bool, compact: bool):
+    """Remove stale forks and, in the pruned mode, old blocks from the database."""
+
+    storage: BCHTStorageBase = ctx.obj["storage"]
+
+    if keep is not None and no_pruned_mode:
+        echo("--keep and --no-pruned-mode cannot be used together.", err=True)
+        ctx.exit(1)
+
+    try:
+        if no_pruned_mode:
+            prune.set_prune_keep(storage, None)
+        elif keep is not None:
+            prune.set_prune_keep(storage, keep)
+        removed = prune.prune_stale_forks(storage, depth, full=full, compact=False)
+        keep = prune.get_prune_keep(storage)
+        if keep is not None:
+            removed += prune.prune_history(storage, keep, compact=False)
+    except exceptions.BCHTOutOfRangeError as e:
+        echo(f"Prune failed: {e}", err=True)
+        ctx.exit(1)
+
+    if compact and removed:
+        storage.compact()
+    echo(f"Removed {len(removed)} blocks.")
+    height = prune.get_pruned_height(storage)
+    if height > 0:
+        echo(f"Blocks below height {height} are pruned.")
@@ -0,0 +1,73 @@
+# bchosttrust/bchosttrust/cli/reindex.py
+"""bcht reindex: rebuild the indexes from the stored blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+import contextlib
+import time
+
+import click
+from click import echo
+
+from ..storage.reindex import reindex
+from ..storage.meta import BCHTStorageBase
+from .. import exceptions
+
+
+@click.command("reindex")
+@click.option("-w", "--workers", type=int, default=4, show_default=True,
+              help="The number of threads writing the index records.")
+@click.option("--chunk-size", type=int, default=256, show_default=True,
+              help="The number of blocks handed to a thread at once.")
+@click.pass_context
+def cli(ctx: click.Context, workers: int, chunk_size: int):
+    """Rebuild the indexes, the rating state and the current blocks from the stored blocks.
+
+    The database stays readable, with the old indexes, until the new ones are switched to.
+    Pause the imports for the switch, or the blocks imported during it are left out."""
+
+    storage: BCHTStorageBase = ctx.obj["storage"]
+    started = time.monotonic()
+    bars = []
+
+    def show_rate(done):
+        if done is None:
+            return None
+        return f"{done / max(time.monotonic() - started, 1e-9):.0f} blocks/s"
+
+    def progress(done: int, total: int):
+        if not bars:
+            echo(f"Indexing {total} blocks with {workers} workers.", err=True)
+            bars.append(stack.enter_context(click.progressbar(
+                length=total, label="Reindexing", show_eta=True, show_pos=True,
+                item_show_func=show_rate, file=click.get_text_stream("stderr"))))
+        bars[0].update(done - bars[0].pos, done)
+
+    with contextlib.ExitStack() as stack:
+        try:
+            stats = reindex(storage, workers, chunk_size, progress)
+        except (ValueError, exceptions.BCHTOutOfRangeError) as e:
+            echo(f"Reindex failed: {e}", err=True)
+            ctx.exit(1)
+
+    elapsed = time.monotonic() - started
+    echo(f"Indexed {stats.indexed} blocks in {elapsed:.1f}s "
+         f"({stats.indexed / max(elapsed, 1e-9):.0f} blocks/s).")
+    if stats.skipped:
+        echo(f"Left out {stats.skipped} blocks whose previous blocks are missing.", err=True)
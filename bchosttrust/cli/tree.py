@@ -28,7 +28,8 @@ import anytree.render
 from ..storage.import_block import get_curr_blocks
 from ..storage.meta import BCHTStorageBase
 from ..analysis.search import iter_from_block
-from ..analysis.tree import generate_tree
+from ..storage.index import is_fully_indexed, get_main_chain_hash
+from ..analysis.tree import generate_tree_from_headers, generate_tree_from_storage
 
 
 @click.command("tree")
@@ -52,19 +53,28 @@ def cli(ctx: click.Context, style: str):
         case "double":
             style = anytree.render.DoubleStyle
 
-    curr_blocks = get_curr_blocks(storage)
-    if len(curr_blocks) == 0:
-        echo("Create some blocks first.", err=True)
-        ctx.exit(1)
+    # Blocks imported meanwhile would otherwise make the tree inconsistent
+    with storage.snapshot() as snapshot:
+        curr_blocks = get_curr_blocks(snapshot)
+        if len(curr_blocks) == 0:
+            echo("Create some blocks first.", err=True)
+            ctx.exit(1)
 
-    _iter = iter_from_block(storage, curr_blocks[0].hash)
-    try:
-        while True:
-            gen_block = next(_iter)
-    except StopIteration:
-        pass
+        gen_hash = get_main_chain_hash(snapshot, 0)
+        if gen_hash is None:
+            _iter = iter_from_block(snapshot, curr_blocks[0].hash)
+            try:
+                while True:
+                    gen_block = next(_iter)
+            except StopIteration:
+                pass
+            gen_hash = gen_block.hash
 
-    tree = generate_tree(tuple(storage.iter_blocks()), gen_block.hash)
+        if is_fully_indexed(snapshot):
+            tree = generate_tree_from_storage(snapshot, gen_hash)
+        else:  # Forks may be missing from the index, scan every block instead
+            tree = generate_tree_from_headers(
+                snapshot.iter_headers(fill_cache=False), gen_hash)
 
     for pre, _, node in RenderTree(tree, style=style):
         print(f"{pre}{node.name.hex()}")
@@ -0,0 +1,158 @@
+# bchosttrust/bchosttrust/config.py
+"""Loading the configuration of BCHostTrust"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# The configuration file is TOML, by default at <data path>/config.toml
+# (see utils.get_data_path). An example with every key:
+#
+#   [storage]
+#   backend = "leveldb"     # leveldb, sharded, segment, sqlite, memory or dummy
+#   path = "~/.bchosttrust/default.db"
+#   profile = "default"     # See storage.uri.PROFILES
+#   codec = "raw"           # raw or dict, see storage.codec. LevelDB and sharded
+#                           # only. By default the one the database was created with.
+#   known_hashes = false    # Keep a Bloom filter of the hashes of the blocks in memory,
+#                           # built at open, so that most checks of new blocks skip the disk
+#
+#   [storage.leveldb]       # Passed into plyvel.DB, over the profile
+#   lru_cache_size = 67108864
+#   bloom_filter_bits = 10
+#   write_buffer_size = 16777216
+#   compression = "snappy"  # or "none"
+#
+#   [storage.sharded]
+#   shards = 4              # Shards at <path>/shard-0, <path>/shard-1, ...
+#   paths = []              # or the paths of the shards, e.g. on different disks
+#
+#   [storage.sqlite]
+#   secondary_indexes = false
+#
+# These environment variables take precedence over the file:
+#   BCHT_CONFIG             The path to the configuration file.
+#   BCHT_STORAGE            A storage URI, e.g. "sqlite:/srv/bcht.sqlite",
+#                           replacing storage.backend and storage.path.
+#   BCHT_STORAGE_PROFILE    Replaces storage.profile.
+
+import copy
+import os
+import tomllib
+import typing
+
+from typeguard import typechecked
+
+from .utils import get_data_path
+from .storage.uri import parse_storage_uri
+
+DEFAULT_CONFIG = {
+    "storage": {
+        "backend": "leveldb",
+        "path": None,  # <data path>/default.db
+        "profile": "default",
+        "codec": None,  # As the database was created, "raw" for new ones
+        "known_hashes": False,
+        "leveldb": {},
+        "sharded": {"shards": 4, "paths": []},
+        "sqlite": {"secondary_indexes": False},
+    }
+}
+
+
+def _merge(base: dict, override: dict) -> dict:
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+@typechecked
+def get_config_path(environ: typing.Optional[typing.Mapping[str, str]] = None) -> str:
+    """Get the path to the configuration file.
+
+    Parameters
+    ----------
+    environ : Mapping[str, str], optional
+        The environment variables, by default os.environ
+
+    Returns
+    -------
+    str
+        The path in BCHT_CONFIG, or config.toml in the data path.
+    """
+
+    if environ is None:
+        environ = os.environ
+    return environ.get("BCHT_CONFIG") or os.path.join(get_data_path(), "config.toml")
+
+
+@typechecked
+def load_config(
+        path: typing.Optional[str] = None,
+        environ: typing.Optional[typing.Mapping[str, str]] = None) -> dict:
+    """Load the configuration, filling in the defaults and
+    applying the overrides from the environment variables.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the configuration file, by default the one from get_config_path.
+        If it is not given and the default file does not exist, only the defaults are used.
+    environ : Mapping[str, str], optional
+        The environment variables, by default os.environ
+
+    Returns
+    -------
+    dict
+        The configuration, in the structure of DEFAULT_CONFIG.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the given configuration file does not exist.
+    tomllib.TOMLDecodeError
+        If the configuration file is not valid TOML.
+    ValueError
+        If BCHT_STORAGE names an unknown storage backend.
+    """
+
+    if environ is None:
+        environ = os.environ
+    config = copy.deepcopy(DEFAULT_CONFIG)
+
+    if path is None:
+        path = get_config_path(environ)
+        if not os.path.exists(path) and "BCHT_CONFIG" not in environ:
+            path = None
+    if path is not None:
+        with open(path, "rb") as f:
+            _merge(config, tomllib.load(f))
+
+    storage = config["storage"]
+    if storage["path"] is None:
+        storage["path"] = os.path.join(get_data_path(), "default.db")
+    storage["path"] = os.path.expanduser(storage["path"])
+
+    if environ.get("BCHT_STORAGE"):
+        storage["backend"], storage["path"] = parse_storage_uri(environ["BCHT_STORAGE"])
+    if environ.get("BCHT_STORAGE_PROFILE"):
+        storage["profile"] = environ["BCHT_STORAGE_PROFILE"]
+
+    return config
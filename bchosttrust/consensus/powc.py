@@ -33,6 +33,9 @@ ZERO_BYTES = 2
 HASH_TARGET = int.from_bytes(
     (b"\x00" * ZERO_BYTES) + (b"\xFF" * (32 - ZERO_BYTES)))
 
+# Expected number of attempts needed to find a hash under HASH_TARGET
+BLOCK_WORK = (1 << 256) // (HASH_TARGET + 1)
+
 
 @typechecked
 def validate_hash(bhash: bytes) -> bool:
@@ -73,6 +76,28 @@ def validate_block_hash(block: BCHTBlock) -> bool:
     return validate_hash(block.hash)
 
 
+@typechecked
+def get_block_work(block: BCHTBlock) -> int:  # pylint: disable=unused-argument
+    """Get the amount of work represented by the given BCHTBlock.
+
+    The work of a block is the expected number of attempts needed to
+    satisfy its proof-of-work target. As the target is currently fixed,
+    every block represents the same amount of work.
+
+    Parameters
+    ----------
+    block : BCHTBlock
+        The block to be measured
+
+    Returns
+    -------
+    int
+        The work of the block
+    """
+
+    return BLOCK_WORK
+
+
 @typechecked
 def attempt(  # pylint: disable=too-many-arguments
         version: int,
@@ -28,6 +28,10 @@ class BCHTConsensusFailedError(ValueError):
     """Raised when a block fails the consensus check."""
 
 
+class BCHTOrphanBlockError(BCHTConsensusFailedError):
+    """Raised when the previous block of a block to be imported is not found."""
+
+
 class BCHTOutOfRangeError(ValueError):
     """Raised when the value or length of a parameter is out of range."""
 
@@ -52,9 +56,21 @@ class BCHTDatabaseClosedError(RuntimeError):
     """Raised in an attempt to access a closed storage backend."""
 
 
+class BCHTReadOnlyError(RuntimeError):
+    """Raised in an attempt to modify a read-only storage backend, e.g. a snapshot."""
+
+
 class BCHTBlockNotFoundError(KeyError):
     """Raised when the block of the given hash is not found."""
 
 
 class BCHTAttributeNotFoundError(KeyError):
     """Raised when the given attribute is not found."""
+
+
+class BCHTHistoryPrunedError(BCHTBlockNotFoundError):
+    """Raised when the blocks needed were removed in the pruned mode."""
+
+
+class BCHTMigrationError(RuntimeError):
+    """Raised when what was copied to another storage backend does not match the original."""
@@ -21,7 +21,7 @@
 
 import lazy_loader as lazy
 
-from .block import BCHTBlock, BCHTEntry
+from .block import BCHTBlock, BCHTEntry, BCHTBlockHeader
 
 __all__ = ("block", )
 
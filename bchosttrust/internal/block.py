@@ -48,6 +48,9 @@ class BCHTBlockDict(typing.TypedDict):
 
 # Object Classes
 
+# Same layout as the beginning of BCHTEntry.raw
+_ENTRY_HEADER_STRUCT = struct.Struct(">BL")
+
 
 @dataclass(frozen=True)
 @typechecked
@@ -130,8 +133,7 @@ class BCHTEntry:
         if (5 + domain_name_len) != raw_bytes_len:
             raise exceptions.BCHTInvalidEntryError(
                 "Length of BCHT Entry does not match the one in its header")
-        domain_name_bytes = raw_bytes[5:(5 + domain_name_len)]
-        domain_name = domain_name_bytes.decode("ascii")
+        domain_name = str(raw_bytes[5:(5 + domain_name_len)], "ascii")
 
         return cls(domain_name, attitude)
 
@@ -157,22 +159,21 @@ class BCHTEntry:
             If the length of raw bytes chain is invalid
         """
 
-        try:
-            len_entries = len(raw_bytes_chain)
-            pt = 0
-
-            while pt < len_entries:
-                raw_bytes = raw_bytes_chain[pt:pt+5]
+        len_entries = len(raw_bytes_chain)
+        pt = 0
 
-                len_domain = int.from_bytes(raw_bytes[1:5])
-                domain_name_bytes = raw_bytes_chain[pt+5:pt+5+len_domain]
-                raw_bytes += domain_name_bytes
+        while pt < len_entries:
+            if pt + 5 > len_entries:
+                raise exceptions.BCHTInvalidEntryError(
+                    "Length of BCHT Entry must be at least 5 bytes.")
+            # Read in place, so that a memoryview of the chain is not sliced twice per entry
+            attitude, len_domain = _ENTRY_HEADER_STRUCT.unpack_from(raw_bytes_chain, pt)
 
-                pt += 5 + len_domain
-                yield BCHTEntry.from_raw(raw_bytes)
-        except IndexError as e:
-            raise exceptions.BCHTInvalidEntryError(
-                "Invalid length of raw bytes chain") from e
+            pt += 5 + len_domain
+            if pt > len_entries:
+                raise exceptions.BCHTInvalidEntryError(
+                    "Length of BCHT Entry does not match the one in its header")
+            yield cls(str(raw_bytes_chain[pt - len_domain:pt], "ascii"), attitude)
 
     @classmethod
     def from_raw_chain(cls, raw_bytes_chain: bytes) -> tuple[typing.Self, ...]:
@@ -332,10 +333,7 @@ class BCHTBlock:
         if len(raw) < 46:
             raise exceptions.BCHTInvalidBlockError(
                 "BCHTBlock raw format must be longer than 46 bytes")
-        version = int.from_bytes(raw[0:2])
-        prev_hash = raw[2:34]
-        creation_time = int.from_bytes(raw[34:42])
-        nonce = int.from_bytes(raw[42:46])
+        version, prev_hash, creation_time, nonce = _HEADER_STRUCT.unpack_from(raw)
         entries = raw[46:]
 
         entries_list = BCHTEntry.from_raw_chain(entries)
@@ -432,3 +430,54 @@ class BCHTBlock:
             entries=tuple(BCHTEntry.from_dict(entry)
                           for entry in data_dict["entries"])
         )
+
+
+# Same layout as the beginning of BCHTBlock.raw
+_HEADER_STRUCT = struct.Struct(">H32sQL")
+
+
+class BCHTBlockHeader(typing.NamedTuple):
+    """The fixed-size fields of a BCHT Block, i.e. all but the entries.
+    Reading these does not need the entries to be decoded.
+
+    Attributes
+    ----------
+    version : int
+        The version of the block.
+    prev_hash : bytes
+        The SHA3-256 hash of the previous block, in bytes.
+    creation_time : int
+        The creation time in Unix epoch.
+    nonce : int
+        The nonce of the block.
+    """
+
+    version: int
+    prev_hash: bytes
+    creation_time: int
+    nonce: int
+
+    @classmethod
+    def from_raw(cls, raw: bytes) -> typing.Self:
+        """Read the header from a raw BCHT Block, or its first 46 bytes.
+
+        Parameters
+        ----------
+        raw : bytes
+            Raw bytes of the BCHT Block
+
+        Returns
+        -------
+        BCHTBlockHeader
+            The header of the BCHT Block
+
+        Raises
+        ------
+        BCHTInvalidBlockError
+            If raw is shorter than 46 bytes.
+        """
+
+        if len(raw) < 46:
+            raise exceptions.BCHTInvalidBlockError(
+                "BCHTBlock raw format must be longer than 46 bytes")
+        return cls._make(_HEADER_STRUCT.unpack_from(raw))
@@ -19,36 +19,51 @@
 # The legal text of GPLv3 and LGPLv3 can be found at
 # bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
 
-import os
+import typing
 import lazy_loader as lazy
 
 from .meta import BCHTStorageBase
 from .leveldb import BCHTLevelDBStorage
 from .dummy import BCHTDummyStorage
-from ..utils import get_data_path
+from .segment import BCHTSegmentStorage
+from .sqlite import BCHTSQLiteStorage
+from .sharded import BCHTShardedStorage
+from .memory import BCHTMemoryStorage
+from .uri import open_storage
+from .import_block import migrate_curr_hashes
 
-__all__ = ("leveldb", "meta", "dummy")
+__all__ = ("leveldb", "meta", "dummy", "index", "chainstate",
+           "segment", "sqlite", "snapshot", "scan", "sharded", "uri", "orphans",
+           "prune", "reindex", "migrate", "aio", "instrument", "bloom", "memory",
+           "batch")
 
 __getattr__, __dir__, _ = lazy.attach(__name__, __all__)
 
 
-def get_default_storage() -> BCHTStorageBase:
-    r"""The default storage backend.
-    It is hoped that one day we can read user's configuration file
-    and allow users to choose. But anyway, just make it work for now.
+def get_default_storage(config_path: typing.Optional[str] = None) -> BCHTStorageBase:
+    r"""The storage backend chosen in the configuration, see bchosttrust.config.
 
-    The default storage backend is a Level DB located at:
+    Unless configured otherwise, it is a LevelDB located at:
     Windows: %LOCALAPPDATA%\BCHostTrust\default.db
     MacOS/Linux/Others: ~/.bchosttrust/default.db
 
+    Parameters
+    ----------
+    config_path : str, optional
+        The path to the configuration file, by default the one from
+        bchosttrust.config.get_config_path.
+
     Returns
     -------
     BCHTStorageBase
         The storage backend.
     """
 
-    db_path = os.path.join(get_data_path(), "default.db")
-    return BCHTLevelDBStorage.init_db(
-        name=db_path,  # name of the database (directory name)
-        create_if_missing=True,  # whether a new database should be created if needed
-    )
+    # Imported here as bchosttrust.config imports this package
+    from ..config import load_config  # pylint: disable=import-outside-toplevel
+
+    storage_config = load_config(config_path)["storage"]
+    storage = open_storage(
+        f"{storage_config['backend']}:{storage_config['path']}", storage_config)
+    migrate_curr_hashes(storage)
+    return storage
@@ -0,0 +1,334 @@
+# bchosttrust/bchosttrust/storage/aio.py
+"""asyncio facade of the storage backends"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Every call is run on a bounded pool of threads, so that the event loop is
+# never blocked by the backend. Iterators are advanced a batch at a time
+# in the pool, one call after another, so a generator is never run by two
+# threads at once. Concurrent reads of the same block share one call to
+# the backend. Unless the backend is thread_safe (e.g. BCHTSQLiteStorage),
+# the calls to it are run one at a time under _lock: the attribute cache of
+# BCHTStorageBase, the segment files and the dicts of BCHTDummyStorage
+# are not guarded against threads. Calls to the backend made elsewhere
+# meanwhile are not serialized with them.
+
+import asyncio
+import functools
+import itertools
+import threading
+import typing
+from collections import defaultdict
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+
+from typeguard import typechecked
+
+from ..internal import BCHTBlock
+from ..analysis import search
+from .meta import BCHTStorageBase
+
+_T = typing.TypeVar("_T")
+
+
+def _next_batch(iterator: typing.Iterator[_T], size: int) -> list[_T]:
+    return list(itertools.islice(iterator, size))
+
+
+@typechecked
+class BCHTAsyncStorage:
+    """asyncio facade of a storage backend, for event-loop servers.
+    Use it from one event loop.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend calls are passed to.
+    executor : concurrent.futures.ThreadPoolExecutor
+        The pool of threads the calls are run on.
+    batch_size : int
+        The number of blocks read by the async iterators in one call.
+    """
+
+    def __init__(self, backend: BCHTStorageBase, max_workers: int = 4, batch_size: int = 256):
+        """Wrap a storage backend.
+
+        Parameters
+        ----------
+        backend : BCHTStorageBase
+            The storage backend. It is not closed together with this facade.
+        max_workers : int, optional
+            The number of threads the calls are run on, by default 4
+        batch_size : int, optional
+            The number of blocks read by the async iterators in one call, by default 256
+        """
+
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="bcht-aio")
+        self.batch_size = batch_size
+        self._reads: dict[bytes, asyncio.Future] = {}
+        self._lock = None if backend.thread_safe else threading.Lock()
+
+    def __str__(self):
+        return f"<BCHTAsyncStorage, backend={self.backend}>"
+
+    def _call(self, func: typing.Callable[..., _T], *args, **kwargs) -> _T:
+        # Run in the pool
+        if self._lock is None:
+            return func(*args, **kwargs)
+        with self._lock:
+            return func(*args, **kwargs)
+
+    async def run(self, func: typing.Callable[..., _T], *args, **kwargs) -> _T:
+        """Run a blocking function on the pool, e.g. a function of bchosttrust.storage.index.
+        It is run one at a time with the other calls, unless the backend is thread_safe.
+
+        Parameters
+        ----------
+        func : Callable[..., T]
+            The function.
+        *args, **kwargs
+            Passed into func.
+
+        Returns
+        -------
+        T
+            What func returned.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(self._call, func, *args, **kwargs))
+
+    async def aiter(self, iterator: typing.Iterator[_T]) -> typing.AsyncGenerator[_T, None]:
+        """Go through a blocking iterator, advancing it on the pool a batch at a time.
+
+        Parameters
+        ----------
+        iterator : Iterator[T]
+            The iterator, e.g. a generator from the backend. It is closed at the end
+            if it is a generator.
+
+        Yields
+        ------
+        T
+            The items of the iterator.
+        """
+
+        future = None
+        try:
+            while True:
+                future = self.executor.submit(
+                    self._call, _next_batch, iterator, self.batch_size)
+                batch = await asyncio.wrap_future(future)
+                if not batch:
+                    return
+                for item in batch:
+                    yield item
+        finally:
+            if isinstance(iterator, Generator):
+                if future is not None and not future.done():
+                    # Stopped while a batch is being read, e.g. cancelled
+                    future.add_done_callback(lambda _: iterator.close())
+                else:
+                    iterator.close()
+
+    async def aget(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block by its hash, see BCHTStorageBase.get.
+        Concurrent calls for the same hash are served by one read.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        read = self._reads.get(block_hash)
+        if read is None:
+            read = self._reads[block_hash] = asyncio.ensure_future(
+                self.run(self.backend.get, block_hash))
+            read.add_done_callback(lambda _: self._reads.pop(block_hash, None))
+        # A caller cancelled does not cancel the read for the others
+        return await asyncio.shield(read)
+
+    async def aget_many(self, block_hashes: typing.Iterable[bytes]) -> tuple[BCHTBlock, ...]:
+        """Retrieve blocks by their hashes, reading them at the same time.
+
+        Parameters
+        ----------
+        block_hashes : Iterable[bytes]
+            The hashes of the blocks wanted.
+
+        Returns
+        -------
+        tuple[BCHTBlock, ...]
+            The block objects, in the order of block_hashes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If any of the blocks is not found.
+        BCHTInvalidHashError
+            If any of block_hashes is not a valid SHA3-256 hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return tuple(await asyncio.gather(*(self.aget(block_hash) for block_hash in block_hashes)))
+
+    async def aput(self, block_data: BCHTBlock):
+        """Put the given block into the database, see BCHTStorageBase.put.
+
+        Parameters
+        ----------
+        block_data : BCHTBlock
+            The BCHTBlock object to be stored.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        await self.run(self.backend.put, block_data)
+
+    async def aiter_blocks(self) -> typing.AsyncGenerator[BCHTBlock, None]:
+        """Go through the blocks, unordered, see BCHTStorageBase.iter_blocks.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+        """
+
+        async for block in self.aiter(self.backend.iter_blocks()):
+            yield block
+
+    async def aiter_from_block(self, bhash: bytes) -> typing.AsyncGenerator[BCHTBlock, None]:
+        """Go through every block starting from this block,
+        see bchosttrust.analysis.search.iter_from_block.
+
+        Parameters
+        ----------
+        bhash : bytes
+            The hash of the starting block
+
+        Yields
+        ------
+        BCHTBlock
+            The blocks
+        """
+
+        async for block in self.aiter(search.iter_from_block(self.backend, bhash)):
+            yield block
+
+    async def aiter_main_chain_blocks(
+            self,
+            start: int = 0,
+            stop: typing.Optional[int] = None,
+            reverse: bool = False) -> typing.AsyncGenerator[BCHTBlock, None]:
+        """Go through the blocks of the main chain by height,
+        see bchosttrust.analysis.search.iter_main_chain_blocks.
+
+        Parameters
+        ----------
+        start : int, optional
+            The lowest height to be returned (inclusive), by default 0
+        stop : int, optional
+            The height to stop at (exclusive), by default None (the end of the chain)
+        reverse : bool, optional
+            Whether to go from the highest block downwards, by default False
+
+        Yields
+        ------
+        BCHTBlock
+            The blocks
+        """
+
+        async for block in self.aiter(search.iter_main_chain_blocks(
+                self.backend, start, stop, reverse)):
+            yield block
+
+    async def aget_website_votes(
+            self,
+            bhash: bytes,
+            since: typing.Optional[int] = None,
+            until: typing.Optional[int] = None) -> defaultdict[str, defaultdict[int, int]]:
+        """Count the number of votes with different attitudes on websites,
+        see bchosttrust.analysis.search.get_website_votes."""
+
+        return await self.run(search.get_website_votes, self.backend, bhash, since, until)
+
+    async def aget_specific_website_votes(
+            self,
+            bhash: bytes,
+            hostname: str,
+            since: typing.Optional[int] = None,
+            until: typing.Optional[int] = None) -> defaultdict[int, int]:
+        """Get the number of votes with different attitudes on a specific website,
+        see bchosttrust.analysis.search.get_specific_website_votes."""
+
+        return await self.run(search.get_specific_website_votes,
+                              self.backend, bhash, hostname, since, until)
+
+    async def aget_website_rating(
+            self,
+            bhash: bytes,
+            since: typing.Optional[int] = None,
+            until: typing.Optional[int] = None) -> dict[str, int]:
+        """Get the rating of hostnames by their votes,
+        see bchosttrust.analysis.search.get_website_rating."""
+
+        return await self.run(search.get_website_rating, self.backend, bhash, since, until)
+
+    async def aget_specific_website_rating(
+            self,
+            bhash: bytes,
+            hostname: str,
+            since: typing.Optional[int] = None,
+            until: typing.Optional[int] = None) -> int:
+        """Get the rating of a hostname by its votes,
+        see bchosttrust.analysis.search.get_specific_website_rating."""
+
+        return await self.run(search.get_specific_website_rating,
+                              self.backend, bhash, hostname, since, until)
+
+    async def aclose(self):
+        """Wait for the calls running and stop the pool. The backend is left open."""
+
+        await asyncio.to_thread(self.executor.shutdown)
+
+    async def __aenter__(self) -> typing.Self:
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,392 @@
+# bchosttrust/bchosttrust/storage/batch.py
+"""Buffering writes to a storage backend, to be written in one go"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Blocks and attributes written through a BCHTBatchOverlay are kept in memory,
+# with None for those deleted, and read back through it merged with the backend.
+# flush writes the blocks with put_raw_many and the attributes with
+# setattr_many, so that the index records and the tips of a whole batch of
+# blocks cost a few writes, and the attributes changed over and over again
+# (e.g. the current blocks) are written once.
+
+import typing
+from bisect import bisect_left, insort
+
+from typeguard import typechecked
+
+from ..internal import BCHTBlock
+from ..utils import prefix_successor
+from .meta import BCHTStorageBase
+from .. import exceptions
+
+
+@typechecked
+class BCHTBatchOverlay(BCHTStorageBase):  # pylint: disable=abstract-method
+    """View of a storage backend keeping the writes in memory until flushed.
+    The backend should not be written to meanwhile.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend the writes are flushed to.
+    """
+
+    def __init__(self, backend: BCHTStorageBase):
+        """Wrap a storage backend.
+
+        Parameters
+        ----------
+        backend : BCHTStorageBase
+            The storage backend. It is not closed together with this view.
+        """
+
+        self.backend = backend
+        self._blocks: dict[bytes, typing.Optional[BCHTBlock]] = {}
+        self._attrs: dict[bytes, typing.Optional[bytes]] = {}
+        self._attr_names: list[bytes] = []  # Sorted, for iter_attrs
+
+    def __str__(self):
+        return f"<BCHTBatchOverlay, backend={self.backend}>"
+
+    def __len__(self):
+        return len(self._blocks) + len(self._attrs)
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash, written through this view
+        or else from the backend.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found, or was deleted through this view.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if block_hash not in self._blocks:
+            return self.backend.get(block_hash)
+        block = self._blocks[block_hash]
+        if block is None:
+            raise exceptions.BCHTBlockNotFoundError(
+                f"{block_hash} not found in the database.")
+        return block
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form, written through this view
+        or else from the backend.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The block in its bytes form, the same as BCHTBlock.raw.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found, or was deleted through this view.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if block_hash not in self._blocks:
+            return self.backend.get_raw(block_hash)
+        return self.get(block_hash).raw
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        if block_hash not in self._blocks:
+            return self.backend.contains(block_hash)
+        return self._blocks[block_hash] is not None
+
+    def put(self, block_data: BCHTBlock):
+        """Put the given block into this view, to be written into the backend when flushed.
+
+        Parameters
+        ----------
+        block_data : BCHTBlock
+            The BCHTBlock object to be stored.
+        """
+
+        self._blocks[block_data.hash] = block_data
+
+    def delete(self, block_hash: bytes):
+        """Delete a block in the chain by its hash, from the backend when flushed.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block to be deleted.
+
+        Raises
+        ------
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hash.
+        """
+
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        self._blocks[block_hash] = None
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered,
+        those of the backend merged with those written through this view.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for _, block in self.iter_blocks_with_key():
+            yield block
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered, with keys,
+        those of the backend first and then those written through this view.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for block_hash, block in self.backend.iter_blocks_with_key():
+            if block_hash not in self._blocks:
+                yield block_hash, block
+        for block_hash, block in tuple(self._blocks.items()):
+            if block is not None:
+                yield block_hash, block
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute, written through this view or else from the backend.
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist, or was deleted through this view.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if attr_name not in self._attrs:
+            return self.backend.getattr(attr_name)
+        content = self._attrs[attr_name]
+        if content is None:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"Attribute {attr_name} not found.")
+        return content
+
+    def _write_attr(self, attr_name: bytes, content: typing.Optional[bytes]):
+        if attr_name not in self._attrs:
+            insort(self._attr_names, attr_name)
+        self._attrs[attr_name] = content
+        self._cache_attr(attr_name, content)
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute in this view, to be written into the backend when flushed.
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+        content : bytes
+            The content of the attibute
+        """
+
+        self._write_attr(attr_name, content)
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute, from the backend when flushed.
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self.getattr(attr_name)  # As the backends do
+        try:
+            self.backend.getattr(attr_name)
+        except exceptions.BCHTAttributeNotFoundError:
+            # Only written through this view, nothing to delete when flushed
+            del self._attrs[attr_name]
+            del self._attr_names[bisect_left(self._attr_names, attr_name)]
+            self._cache_attr(attr_name, None)
+            return
+        self._write_attr(attr_name, None)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names, those of the backend merged with those written
+        through this view.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+
+        lower = max(prefix, start) if start is not None else prefix
+        upper = prefix_successor(prefix) or None
+        if stop is not None and (upper is None or stop < upper):
+            upper = stop
+        names = self._attr_names
+        end = len(names) if upper is None else bisect_left(names, upper)
+        pending = names[bisect_left(names, lower):end]
+        if reverse:
+            pending.reverse()
+
+        def before(name: bytes, other: bytes) -> bool:
+            return name > other if reverse else name < other
+
+        i = 0
+        for attr_name, content in self.backend.iter_attrs(prefix, start, stop, reverse):
+            while i < len(pending) and before(pending[i], attr_name):
+                if self._attrs[pending[i]] is not None:
+                    yield pending[i], self._attrs[pending[i]]
+                i += 1
+            if i < len(pending) and pending[i] == attr_name:
+                continue  # Written through this view, yielded in the loop above
+            yield attr_name, content
+        for attr_name in pending[i:]:
+            if self._attrs[attr_name] is not None:
+                yield attr_name, self._attrs[attr_name]
+
+    def flush(self):
+        """Write the blocks and then the attributes into the backend, the attributes
+        in one setattr_many call, and forget about them.
+
+        Errors of the backend (e.g. a full disk) are passed on. If it fails partway,
+        nothing is forgotten: the view keeps all its writes and can be flushed
+        again, as writing them twice does no harm, or discarded.
+        Some of the blocks may be in the backend already. The attributes, which
+        are written last, are not, unless the backend sets them one by one
+        (see BCHTStorageBase.setattr_many).
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the backend is read-only.
+        """
+
+        self.backend.put_raw_many((block_hash, block.raw)
+                                  for block_hash, block in self._blocks.items()
+                                  if block is not None)
+        for block_hash, block in self._blocks.items():
+            if block is None:
+                self.backend.delete(block_hash)
+        # In one write, the attributes deleted included as None
+        self.backend.setattr_many(tuple(self._attrs.items()))
+        self.discard()
+
+    def discard(self):
+        """Forget about the blocks and the attributes written through this view."""
+
+        self._blocks.clear()
+        self._attrs.clear()
+        self._attr_names.clear()
+        self._reset_attr_cache()
+
+    def close(self):
+        """Forget about the writes not flushed yet. The backend is left open."""
+
+        self.discard()
+
+    @property
+    def closed(self) -> bool:
+        """Indicates whether the backend is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return self.backend.closed
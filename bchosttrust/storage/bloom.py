@@ -0,0 +1,130 @@
+# bchosttrust/bchosttrust/storage/bloom.py
+"""A Bloom filter of the hashes of blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Block hashes are SHA3-256 digests, so their bytes are uniformly distributed
+# already. The positions of the bits of a hash are taken from its first
+# 16 bytes by double hashing (h1 + i * h2), without hashing it again.
+
+import math
+import threading
+import typing
+from hashlib import blake2b
+
+
+# Not type checked, as the checks would cost more than the lookups
+class BCHTBloomFilter:
+    """A set of hashes answering whether it may contain a hash, in a fixed amount of memory.
+    A hash added is always found, and a hash never added is found with a probability
+    of about error_rate, as long as no more than capacity hashes were added.
+    Hashes cannot be removed.
+
+    Attibutes
+    ---------
+    capacity : int
+        The number of hashes the filter is sized for.
+    error_rate : float
+        The false positive rate at the capacity.
+    size : int
+        The number of bits.
+    num_hashes : int
+        The number of bits set for every hash.
+    count : int
+        The number of hashes added, including duplicates.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """Create an empty Bloom filter.
+
+        Parameters
+        ----------
+        capacity : int
+            The number of hashes to size the filter for. More can be added,
+            with the false positive rate rising beyond error_rate.
+        error_rate : float, optional
+            The false positive rate at the capacity, by default 0.001.
+            About 1.8 bytes per hash are used at 0.001, and 0.6 byte at 0.1.
+
+        Raises
+        ------
+        ValueError
+            If capacity is not positive or error_rate is not between 0 and 1.
+        """
+
+        if capacity < 1:
+            raise ValueError(f"The capacity must be positive, not {capacity}.")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"The error rate must be between 0 and 1, not {error_rate}.")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = (bits + 7) // 8 * 8
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(self.size // 8)
+        # Setting a bit is not atomic, and a lost bit would be a false negative
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, block_hash: bytes) -> range:
+        # The positions are first, first + step, ... modulo size, taken by the callers
+        if len(block_hash) < 16:
+            block_hash = blake2b(block_hash, digest_size=16).digest()
+        first = int.from_bytes(block_hash[:8])
+        step = int.from_bytes(block_hash[8:16]) | 1
+        return range(first, first + self.num_hashes * step, step)
+
+    def add(self, block_hash: bytes):
+        """Add a hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash.
+        """
+
+        bits, size = self._bits, self.size
+        with self._lock:
+            for position in self._positions(block_hash):
+                position %= size
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def update(self, block_hashes: typing.Iterable[bytes]):
+        """Add hashes.
+
+        Parameters
+        ----------
+        block_hashes : Iterable[bytes]
+            The hashes.
+        """
+
+        for block_hash in block_hashes:
+            self.add(block_hash)
+
+    def __contains__(self, block_hash: bytes) -> bool:
+        bits, size = self._bits, self.size
+        for position in self._positions(block_hash):
+            position %= size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
@@ -0,0 +1,347 @@
+# bchosttrust/bchosttrust/storage/chainstate.py
+"""Materialized state of the main chain"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# The state follows the last block with at least one block behind it
+# (the "prev_hash" attribute). When that block moves to another fork,
+# the blocks of the old fork are reverted and the blocks of the new fork
+# are applied, starting from their common ancestor.
+#
+# The blocks of that chain are also listed by height under
+# b"height-" + height as an unsigned 64-bit big-endian integer,
+# so that the chain can be scanned in order.
+
+import struct
+import typing
+from collections import defaultdict
+
+from typeguard import typechecked
+
+from .. import exceptions
+from .meta import BCHTStorageBase
+from .index import (NULL_HASH, HEIGHT_PREFIX, _key,
+                    get_block_meta, get_main_chain_hash)
+
+STATE_TIP = b"state_tip"
+TALLY_PREFIX = b"tally-"
+
+_VOTE = struct.Struct(">BQ")
+
+
+def _pack_votes(votes: dict[int, int]) -> bytes:
+    return b"".join(_VOTE.pack(att, num) for att, num in sorted(votes.items()) if num)
+
+
+def _unpack_votes(raw: bytes) -> defaultdict[int, int]:
+    votes = defaultdict(int)
+    for att, num in _VOTE.iter_unpack(raw):
+        votes[att] = num
+    return votes
+
+
+def _height(backend: BCHTStorageBase, block_hash: bytes) -> int:
+    if block_hash == NULL_HASH:
+        return -1
+    return get_block_meta(backend, block_hash).height
+
+
+def _prev(backend: BCHTStorageBase, block_hash: bytes) -> bytes:
+    return get_block_meta(backend, block_hash).prev_hash
+
+
+@typechecked
+def find_fork(
+        backend: BCHTStorageBase,
+        old_tip: bytes,
+        new_tip: bytes) -> tuple[tuple[bytes, ...], tuple[bytes, ...]]:
+    """Find the path between two indexed blocks through their common ancestor.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    old_tip : bytes
+        The hash of the block to move away from, or 32 null bytes.
+    new_tip : bytes
+        The hash of the block to move to, or 32 null bytes.
+
+    Returns
+    -------
+    tuple[tuple[bytes, ...], tuple[bytes, ...]]
+        The blocks to be reverted, from old_tip downwards,
+        and the blocks to be applied, upwards to new_tip.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If any block on the path is not indexed.
+    """
+
+    revert, apply = [], []
+    old_height = _height(backend, old_tip)
+    new_height = _height(backend, new_tip)
+    while old_height > new_height:
+        revert.append(old_tip)
+        old_tip = _prev(backend, old_tip)
+        old_height -= 1
+    while new_height > old_height:
+        apply.append(new_tip)
+        new_tip = _prev(backend, new_tip)
+        new_height -= 1
+    while old_tip != new_tip:
+        revert.append(old_tip)
+        apply.append(new_tip)
+        old_tip = _prev(backend, old_tip)
+        new_tip = _prev(backend, new_tip)
+    apply.reverse()
+    return tuple(revert), tuple(apply)
+
+
+@typechecked
+def get_state_tip(backend: BCHTStorageBase) -> bytes:
+    """Get the hash of the block the materialized state represents.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Returns
+    -------
+    bytes
+        The hash of the block, or 32 null bytes if the state is empty.
+    """
+
+    try:
+        return backend.getattr_cached(STATE_TIP)
+    except exceptions.BCHTAttributeNotFoundError:
+        return NULL_HASH
+
+
+@typechecked
+def move_state(backend: BCHTStorageBase, new_tip: bytes):
+    """Move the materialized state to another block,
+    reverting and applying only the blocks between them.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    new_tip : bytes
+        The hash of the indexed block to move to, or 32 null bytes to empty the state.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If any block on the way is not indexed.
+    """
+
+    old_tip = get_state_tip(backend)
+    old_height = _height(backend, old_tip)
+    recorded = old_tip == NULL_HASH or _heights_recorded(backend, old_tip, old_height)
+    if old_tip == new_tip and recorded:
+        return
+    if recorded:
+        revert, apply = _find_fork_main(backend, old_height, new_tip)
+    else:  # Heights not recorded yet
+        revert, apply = find_fork(backend, old_tip, new_tip)
+
+    # Sum up the changes first, so that every domain is written only once
+    deltas = defaultdict(lambda: defaultdict(int))
+    for block_hashes, sign in ((revert, -1), (apply, 1)):
+        for block_hash in block_hashes:
+            for entry in backend.get(block_hash).entries:
+                deltas[entry.domain_name][entry.attitude] += sign
+
+    # The tallies, the heights and the tip are written at once,
+    # so that the tallies always match the tip
+    new_height = _height(backend, new_tip)
+    if not recorded:
+        # Written before the heights were, record the whole chain rather than
+        # the blocks applied only, or iter_main_chain would miss the rest of it
+        apply = _chain_to(backend, new_tip)
+        items = [(key, None) for key, _ in backend.iter_attrs(
+            HEIGHT_PREFIX, start=_key(HEIGHT_PREFIX, (new_height + 1).to_bytes(8)))]
+    else:
+        items = [(_key(HEIGHT_PREFIX, height.to_bytes(8)), None)
+                 for height in range(new_height + 1, old_height + 1)]
+    items.extend((_key(HEIGHT_PREFIX, height.to_bytes(8)), block_hash)
+                 for height, block_hash in enumerate(
+                     apply, start=new_height + 1 - len(apply)))
+    items.extend(_tally_items(backend, deltas))
+    items.append((STATE_TIP, new_tip))
+    backend.setattr_many(items)
+
+
+def _heights_recorded(backend: BCHTStorageBase, tip: bytes, height: int) -> bool:
+    # Whether the whole chain up to tip is recorded by height. Before, only the
+    # blocks applied were, so the lowest heights may be missing. The lowest one
+    # recorded is either the genesis block or one whose previous block was pruned.
+    if get_main_chain_hash(backend, height) != tip:
+        return False
+    lowest, lowest_hash = next(iter_main_chain(backend), (0, NULL_HASH))
+    if lowest == 0:
+        return True
+    try:
+        get_block_meta(backend, _prev(backend, lowest_hash))
+    except exceptions.BCHTBlockNotFoundError:
+        return True
+    return False
+
+
+def _chain_to(backend: BCHTStorageBase, block_hash: bytes) -> tuple[bytes, ...]:
+    # The blocks from the genesis block upwards to block_hash
+    chain = []
+    while block_hash != NULL_HASH:
+        chain.append(block_hash)
+        block_hash = _prev(backend, block_hash)
+    chain.reverse()
+    return tuple(chain)
+
+
+def _find_fork_main(
+        backend: BCHTStorageBase,
+        old_height: int,
+        new_tip: bytes) -> tuple[tuple[bytes, ...], tuple[bytes, ...]]:
+    # Same as find_fork(backend, get_state_tip(backend), new_tip),
+    # but only the new branch is walked. The old one is read from the heights.
+    apply = []
+    height = _height(backend, new_tip)
+    while new_tip != NULL_HASH and get_main_chain_hash(backend, height) != new_tip:
+        apply.append(new_tip)
+        new_tip = _prev(backend, new_tip)
+        height -= 1
+    revert = tuple(block_hash for _, block_hash in iter_main_chain(
+        backend, height + 1, old_height + 1, reverse=True))
+    apply.reverse()
+    return revert, tuple(apply)
+
+
+@typechecked
+def iter_main_chain(
+        backend: BCHTStorageBase,
+        start: int = 0,
+        stop: typing.Optional[int] = None,
+        reverse: bool = False) -> typing.Generator[tuple[int, bytes], None, None]:
+    """Go through the blocks of the main chain (i.e. the chain ending at the block
+    returned by get_state_tip) by height, with a sequential scan.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    start : int, optional
+        The lowest height to be returned (inclusive), by default 0
+    stop : int, optional
+        The height to stop at (exclusive), by default None (the end of the chain)
+    reverse : bool, optional
+        Whether to go from the highest block downwards, by default False
+
+    Yields
+    ------
+    tuple[int, bytes]
+        The heights and the hashes of the blocks.
+    """
+
+    start = max(start, 0)
+    if stop is not None and stop <= start:
+        return
+    for key, value in backend.iter_attrs(
+            HEIGHT_PREFIX,
+            start=_key(HEIGHT_PREFIX, start.to_bytes(8)),
+            stop=None if stop is None else _key(HEIGHT_PREFIX, stop.to_bytes(8)),
+            reverse=reverse):
+        yield int.from_bytes(key[len(HEIGHT_PREFIX):]), value
+
+
+def _tally_items(
+        backend: BCHTStorageBase,
+        deltas: dict[str, dict[int, int]]) -> typing.Generator[
+            tuple[bytes, typing.Optional[bytes]], None, None]:
+    # The new tallies, None for those to be deleted
+    for domain_name, delta in deltas.items():
+        votes = get_state_votes(backend, domain_name)
+        for att, num in delta.items():
+            votes[att] += num
+        yield _key(TALLY_PREFIX, domain_name.encode("ascii")), _pack_votes(votes) or None
+
+
+@typechecked
+def sync_state(backend: BCHTStorageBase):
+    """Move the materialized state to the current last block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    """
+
+    try:
+        last_hash = backend.getattr_cached(b"prev_hash")
+    except exceptions.BCHTAttributeNotFoundError:
+        last_hash = NULL_HASH
+    move_state(backend, last_hash)
+
+
+@typechecked
+def get_state_votes(backend: BCHTStorageBase, domain_name: str) -> defaultdict[int, int]:
+    """Get the number of votes with different attitudes on a specific website,
+    as of the block returned by get_state_tip.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    domain_name : str
+        The hostname to be checked.
+
+    Returns
+    -------
+    defaultdict[int, int]
+        A dictionary with attitudes as keys and votes as values.
+    """
+
+    try:
+        raw = backend.getattr(
+            _key(TALLY_PREFIX, domain_name.encode("ascii")))
+    except exceptions.BCHTAttributeNotFoundError:
+        return defaultdict(int)
+    return _unpack_votes(raw)
+
+
+@typechecked
+def iter_state_votes(backend: BCHTStorageBase) \
+        -> typing.Generator[tuple[str, defaultdict[int, int]], None, None]:
+    """Go through the votes on every website,
+    as of the block returned by get_state_tip.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Yields
+    ------
+    tuple[str, defaultdict[int, int]]
+        The domain name, and a dictionary with attitudes as keys and votes as values.
+    """
+
+    for key, value in backend.iter_attrs(TALLY_PREFIX):
+        yield key[len(TALLY_PREFIX):].decode("ascii"), _unpack_votes(value)
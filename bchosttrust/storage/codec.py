@@ -0,0 +1,229 @@
+# bchosttrust/bchosttrust/storage/codec.py
+"""Compact encodings of stored blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# With the "dict" codec, a stored block is one format byte followed by:
+#   FORMAT_RAW:   the raw block, as it is
+#   FORMAT_DICT:  the 46-byte header of the raw block, then for every
+#                 entry its attitude byte and the ID of its domain name
+#                 as an unsigned LEB128 varint
+#
+# The IDs come from a dictionary kept in the database, under the prefix
+#   b"i" + ID as an unsigned 32-bit big-endian integer -> domain name
+#   b"n" + domain name -> ID
+# IDs are never reused or reassigned, so decoding only ever needs the
+# dictionary to grow. New IDs are written in the same batch as the first block
+# using them, which is why encoding and writing must not be interleaved between
+# threads (BCHTLevelDBStorage holds a lock). They are only cached once that
+# batch is written, as a batch given up would leave them cached but unwritten,
+# to be used by later blocks and lost on reopening.
+#
+# As every entry in the raw form is the attitude, the length of the name and
+# the name, the raw block is rebuilt byte for byte.
+
+import contextlib
+import struct
+import typing
+
+CODECS = ("raw", "dict")
+
+FORMAT_RAW = 0
+FORMAT_DICT = 1
+
+_HEADER_SIZE = 46
+_ID = struct.Struct(">L")
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class BCHTDomainDictionaryCodec:
+    """Encoder and decoder of stored blocks, replacing domain names with
+    IDs from a persistent dictionary, used by BCHTLevelDBStorage.
+
+    Attibutes
+    ---------
+    db : plyvel.DB
+        The LevelDB where the dictionary is kept.
+    prefix : bytes
+        The prefix of the keys of the dictionary.
+    """
+
+    def __init__(self, db, prefix: bytes = b"dict-"):
+        self.db = db
+        self.prefix = prefix
+        self._names: dict[int, bytes] = {}
+        self._ids: dict[bytes, int] = {}
+        # The new IDs of the batch being written, see write_batch
+        self._staged: dict[bytes, int] = {}
+        last = next(db.iterator(prefix=prefix + b"i", reverse=True, include_value=False), None)
+        self._next_id = 0 if last is None else _ID.unpack(last[-_ID.size:])[0] + 1
+
+    def _get_id(self, name: bytes, batch) -> int:
+        domain_id = self._ids.get(name)
+        if domain_id is None:
+            domain_id = self._staged.get(name)
+        if domain_id is not None:
+            return domain_id
+        stored = self.db.get(self.prefix + b"n" + name)
+        if stored is None:
+            domain_id = self._staged[name] = self._next_id + len(self._staged)
+            batch.put(self.prefix + b"i" + _ID.pack(domain_id), name)
+            batch.put(self.prefix + b"n" + name, _ID.pack(domain_id))
+            return domain_id
+        domain_id = _ID.unpack(stored)[0]
+        self._ids[name] = domain_id
+        self._names[domain_id] = name
+        return domain_id
+
+    def _get_name(self, domain_id: int) -> bytes:
+        try:
+            return self._names[domain_id]
+        except KeyError:
+            name = self.db.get(self.prefix + b"i" + _ID.pack(domain_id))
+            if name is None:
+                raise ValueError(f"Domain {domain_id} not in the dictionary") from None
+            self._names[domain_id] = name
+            return name
+
+    @contextlib.contextmanager
+    def write_batch(self) -> typing.Generator[typing.Any, None, None]:
+        """Open a batch of writes to db for the blocks encoded with encode,
+        written at the end of the with block. The new IDs are only kept for
+        later blocks if it is written, so an exception in the with block
+        leaves the dictionary as it was.
+
+        Yields
+        ------
+        plyvel.WriteBatch
+            The batch of writes, to be passed into encode.
+        """
+
+        self._staged.clear()
+        try:
+            with self.db.write_batch(transaction=True) as batch:
+                yield batch
+        except BaseException:
+            self._staged.clear()
+            raise
+        for name, domain_id in self._staged.items():
+            self._ids[name] = domain_id
+            self._names[domain_id] = name
+        self._next_id += len(self._staged)
+        self._staged.clear()
+
+    def encode(self, raw: bytes, batch) -> bytes:
+        """Encode a raw block. New domain names are put into the dictionary
+        through batch, which must be written together with the encoded block.
+
+        Parameters
+        ----------
+        raw : bytes
+            The raw block.
+        batch : plyvel.WriteBatch
+            A batch from write_batch.
+
+        Returns
+        -------
+        bytes
+            The encoded block.
+        """
+
+        out = bytearray(raw[:_HEADER_SIZE])
+        pos = _HEADER_SIZE
+        while pos < len(raw):
+            name_len = int.from_bytes(raw[pos + 1:pos + 5])
+            out.append(raw[pos])
+            _write_varint(out, self._get_id(raw[pos + 5:pos + 5 + name_len], batch))
+            pos += 5 + name_len
+        return bytes((FORMAT_DICT, )) + out
+
+    def decode(self, data: bytes) -> bytes:
+        """Rebuild a raw block from its encoded form.
+
+        Parameters
+        ----------
+        data : bytes
+            The encoded block.
+
+        Returns
+        -------
+        bytes
+            The raw block, the same as BCHTBlock.raw of the block stored.
+        """
+
+        if data[0] == FORMAT_RAW:
+            return data[1:]
+
+        parts = [data[1:_HEADER_SIZE + 1]]
+        pos = _HEADER_SIZE + 1
+        while pos < len(data):
+            attitude = data[pos]
+            domain_id, pos = _read_varint(data, pos + 1)
+            name = self._get_name(domain_id)
+            parts.append(bytes((attitude, )) + len(name).to_bytes(4) + name)
+        return b"".join(parts)
+
+
+def get_codec(
+        name: str, db, prefix: bytes = b"dict-") -> typing.Optional[BCHTDomainDictionaryCodec]:
+    """Create the codec of the given name.
+
+    Parameters
+    ----------
+    name : str
+        One of CODECS.
+    db : plyvel.DB
+        The LevelDB where the dictionary is kept.
+    prefix : bytes, optional
+        The prefix of the keys of the dictionary, by default b"dict-"
+
+    Returns
+    -------
+    BCHTDomainDictionaryCodec | None
+        The codec, or None for "raw" (blocks stored as they are).
+
+    Raises
+    ------
+    ValueError
+        If the codec does not exist.
+    """
+
+    match name:
+        case "raw":
+            return None
+        case "dict":
+            return BCHTDomainDictionaryCodec(db, prefix)
+    raise ValueError(f"Unknown codec {name!r}, expected one of {', '.join(CODECS)}")
@@ -25,12 +25,13 @@ import typing
 from typeguard import typechecked
 
 from .meta import BCHTStorageBase
+from .snapshot import BCHTCopyOnWriteMixin
 from .. import exceptions
 from .. import BCHTBlock
 
 
 @typechecked
-class BCHTDummyStorage(BCHTStorageBase):
+class BCHTDummyStorage(BCHTCopyOnWriteMixin, BCHTStorageBase):
     """BCHT in-RAM storage backend"""
 
     def __init__(self):
@@ -75,6 +76,14 @@ class BCHTDummyStorage(BCHTStorageBase):
             raise exceptions.BCHTBlockNotFoundError(
                 f"Block {block_hash} not found in the database.") from e
 
+    def _has_block(self, block_hash: bytes) -> bool:
+        if self.closed:
+            raise exceptions.BCHTDatabaseClosedError("Database is closed.")
+        return block_hash in self.db
+
+    def load_known_hashes(self, error_rate: float = 0.001, headroom: float = 2.0):
+        """Do nothing, as the blocks are all in memory already."""
+
     def put(self, block_data: BCHTBlock):
         """Put the given block into the database.
 
@@ -92,6 +101,7 @@ class BCHTDummyStorage(BCHTStorageBase):
         if self.closed:
             raise exceptions.BCHTDatabaseClosedError("Database is closed.")
         block_hash = block_data.hash
+        self._preserve_block(block_hash)
         self.db[block_hash] = block_data
 
     def delete(self, block_hash: bytes):
@@ -115,6 +125,7 @@ class BCHTDummyStorage(BCHTStorageBase):
         if len(block_hash) != 32:
             raise exceptions.BCHTInvalidHashError(
                 f"{block_hash} is not a valid SHA3-512 hexadecimal hash.")
+        self._preserve_block(block_hash)
         del self.db[block_hash]
 
     def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
@@ -134,7 +145,8 @@ class BCHTDummyStorage(BCHTStorageBase):
         if self.closed:
             raise exceptions.BCHTDatabaseClosedError("Database is closed.")
 
-        for _, value in self.db.items():
+        # Copied so that changes during the iteration are not seen
+        for _, value in tuple(self.db.items()):
             yield value
 
     def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
@@ -154,8 +166,7 @@ class BCHTDummyStorage(BCHTStorageBase):
         if self.closed:
             raise exceptions.BCHTDatabaseClosedError("Database is closed.")
 
-        for key, value in self.db.items():
-            yield key, value
+        yield from tuple(self.db.items())
 
     def getattr(self, attr_name: bytes) -> bytes:
         """Retrieve an attibute from the database
@@ -208,7 +219,9 @@ class BCHTDummyStorage(BCHTStorageBase):
 
         if self.closed:
             raise exceptions.BCHTDatabaseClosedError("Database is closed.")
+        self._preserve_attr(attr_name)
         self.attr_db[attr_name] = content
+        self._cache_attr(attr_name, content)
 
     def delattr(self, attr_name: bytes):
         """Delete an attibute from the database
@@ -228,7 +241,49 @@ class BCHTDummyStorage(BCHTStorageBase):
 
         if self.closed:
             raise exceptions.BCHTDatabaseClosedError("Database is closed.")
+        self._preserve_attr(attr_name)
         del self.attr_db[attr_name]
+        self._cache_attr(attr_name, None)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if self.closed:
+            raise exceptions.BCHTDatabaseClosedError("Database is closed.")
+
+        yield from sorted(((k, v) for k, v in self.attr_db.items()
+                           if k.startswith(prefix)
+                           and (start is None or k >= start)
+                           and (stop is None or k < stop)),
+                          reverse=reverse)
 
     @property
     def closed(self):
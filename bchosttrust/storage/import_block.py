@@ -19,12 +19,151 @@
 # The legal text of GPLv3 and LGPLv3 can be found at
 # bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
 
+import typing
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
 from typeguard import typechecked
 
 from ..internal.block import BCHTBlock
 from ..consensus import validate
 from .. import exceptions
-from . import BCHTStorageBase
+from .meta import BCHTStorageBase
+from .batch import BCHTBatchOverlay
+from .index import (NULL_HASH, INDEX_COMPLETE, BCHTBlockMeta, ensure_indexed,
+                    index_block, unindex_block)
+from .chainstate import sync_state
+
+
+# The current blocks (the tips, i.e. blocks with nothing behind them) are kept
+# as one pair of attributes each:
+#   TIP_PREFIX + sequence number (8 bytes) -> hash
+#   TIP_HASH_PREFIX + hash -> sequence number
+# so that they are enumerated in the order they were added, while adding,
+# removing and checking a tip only touch its own keys. TIP_RANGE holds the
+# lowest sequence number which may still be in use and the next one to be
+# given out (8 bytes each). Enumerating starts from the former, so that the
+# deleted keys of earlier tips are never walked over. Older databases kept
+# the tips concatenated in "curr_hashes", which is migrated on first use.
+TIP_PREFIX = b"tip-"
+TIP_HASH_PREFIX = b"tiphash-"
+TIP_RANGE = b"tip_range"
+LEGACY_CURR_HASHES = b"curr_hashes"
+
+# The block with the most cumulative work (the best tip), followed by its
+# cumulative work as 32 bytes, so that comparing a new block against it needs
+# no lookup. On a tie the block seen first stays. "prev_hash" is its previous
+# block (the last block considered safe), followed by the materialized state.
+BEST_HASH = b"best_hash"
+
+# The statuses of the blocks given to import_blocks
+IMPORTED = "imported"
+DUPLICATE = "duplicate"
+ORPHAN = "orphan"
+INVALID = "invalid"
+
+# Validating fewer blocks than this is not worth starting worker processes
+MIN_PARALLEL_BLOCKS = 256
+
+
+class BCHTImportOutcome(typing.NamedTuple):
+    """The outcome of one of the blocks given to import_blocks.
+
+    Attributes
+    ----------
+    block_hash : bytes
+        The hash of the block.
+    status : str
+        IMPORTED; DUPLICATE if it was in the database already or given before;
+        ORPHAN if its previous block is neither in the database nor imported;
+        or INVALID if it failed the consensus, or its previous block did.
+    reason : str
+        Why it was not imported, or "" if it was.
+    """
+
+    block_hash: bytes
+    status: str
+    reason: str = ""
+
+
+@typechecked
+def migrate_curr_hashes(backend: BCHTStorageBase):
+    """Move the current blocks from the legacy "curr_hashes" attribute
+    into the tip set, if the database still has it.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    """
+
+    try:
+        curr_hashes = backend.getattr_cached(LEGACY_CURR_HASHES)
+    except exceptions.BCHTAttributeNotFoundError:
+        return
+    low, seq = _get_tip_range(backend)
+    # Left by an earlier migration, which was not written in one go
+    known = {tip_hash for _, tip_hash in backend.iter_attrs(
+        TIP_PREFIX, start=TIP_PREFIX + low.to_bytes(8))}
+    items: list[tuple[bytes, typing.Optional[bytes]]] = []
+    for i in range(0, len(curr_hashes), 32):
+        tip_hash = curr_hashes[i:i+32]
+        if tip_hash in known:
+            continue
+        known.add(tip_hash)
+        items.append((TIP_PREFIX + seq.to_bytes(8), tip_hash))
+        items.append((TIP_HASH_PREFIX + tip_hash, seq.to_bytes(8)))
+        seq += 1
+    items.append(_tip_range_item(low, seq))
+    items.append((LEGACY_CURR_HASHES, None))
+    backend.setattr_many(items)
+
+
+def _parse_tip_range(raw: bytes) -> tuple[int, int]:
+    return int.from_bytes(raw[:8]), int.from_bytes(raw[8:])
+
+
+def _get_tip_range(backend: BCHTStorageBase) -> tuple[int, int]:
+    try:
+        return backend.getattr_cached(TIP_RANGE, _parse_tip_range)
+    except exceptions.BCHTAttributeNotFoundError:
+        return 0, 0
+
+
+def _tip_range_item(low: int, end: int) -> tuple[bytes, bytes]:
+    return TIP_RANGE, low.to_bytes(8) + end.to_bytes(8)
+
+
+def _get_tips(backend: BCHTStorageBase) -> tuple[dict[bytes, bytes], tuple[bytes, ...]]:
+    # The current blocks as hash -> sequence number, and their hashes, in the
+    # order they were added. Every change of the tip set writes TIP_RANGE, so
+    # they are only enumerated again after its cached content is replaced.
+    migrate_curr_hashes(backend)
+    try:
+        tip_range = backend.getattr_cached(TIP_RANGE, _parse_tip_range)
+    except exceptions.BCHTAttributeNotFoundError:
+        return {}, ()  # No block imported yet
+    memo = backend.__dict__.get("_tips")
+    if memo is not None and memo[0] is tip_range and backend.cache_attrs:
+        return memo[1]
+    seqs = {tip_hash: key[len(TIP_PREFIX):] for key, tip_hash in backend.iter_attrs(
+        TIP_PREFIX, start=TIP_PREFIX + tip_range[0].to_bytes(8))}
+    tips = seqs, tuple(seqs)
+    if backend.cache_attrs:
+        backend.__dict__["_tips"] = (tip_range, tips)
+    return tips
+
+
+def _add_tip(backend: BCHTStorageBase, new_hash: bytes):
+    seqs, _ = _get_tips(backend)
+    if new_hash in seqs:
+        return
+    low, seq = _get_tip_range(backend)
+    backend.setattr_many((
+        (TIP_PREFIX + seq.to_bytes(8), new_hash),
+        (TIP_HASH_PREFIX + new_hash, seq.to_bytes(8)),
+        _tip_range_item(low if seqs else seq, seq + 1)))
 
 
 @typechecked
@@ -40,27 +179,38 @@ def parse_curr_hashes(backend: BCHTStorageBase) -> tuple[bytes, ...]:
     Returns
     -------
     tuple[bytes]
-        List of SHA3-256 hashes, or an 
-        empty tuple if "curr_hashes" is not found 
-        in the attributes database.
+        List of SHA3-256 hashes in the order they were added, or an 
+        empty tuple if there are no current blocks. The same tuple is
+        returned until they change.
     """
 
-    # 1. Get `curr_hashes` from attribute database (.getattr)
-    #    if KeyError (i.e. the key does not exist), just return a empty tuple
-    # 2. Slice the retrieved byte by the length of SHA3-256 hashes
-    #    Example: https://stackoverflow.com/a/20024864
-    # 3. Return the sliced bytes in tuple
+    return _get_tips(backend)[1]
 
-    try:
-        curr_hashes = backend.getattr(b"curr_hashes")
-    except exceptions.BCHTAttributeNotFoundError:
-        return tuple()
-    return tuple(curr_hashes[i:i+32] for i in range(0, len(curr_hashes), 32))
+
+@typechecked
+def is_current(backend: BCHTStorageBase, block_hash: bytes) -> bool:
+    """Check whether a block is one of the current blocks.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block.
+
+    Returns
+    -------
+    bool
+        Whether it is in the list of current blocks.
+    """
+
+    return block_hash in _get_tips(backend)[0]
 
 
 @typechecked
 def add_hash_to_current(backend: BCHTStorageBase, new_hash: bytes):
-    """Appends a new hash into the list of current blocks
+    """Appends a new hash into the list of current blocks,
+    unless it is already there.
 
     Parameters
     ----------
@@ -78,12 +228,137 @@ def add_hash_to_current(backend: BCHTStorageBase, new_hash: bytes):
     if len(new_hash) != 32:
         raise exceptions.BCHTInvalidHashError(
             f"{new_hash} is not a valid SHA3-512 hexadecimal hash.")
+    _add_tip(backend, new_hash)
+
+
+@typechecked
+def remove_hash_from_current(backend: BCHTStorageBase, block_hash: bytes):
+    """Remove a hash from the list of current blocks, if it is there.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block to be removed.
+    """
+
+    seqs, _ = _get_tips(backend)
+    seq = seqs.get(block_hash)
+    if seq is None:
+        return
+    _, end = _get_tip_range(backend)
+    # Enumerating starts from the earliest tip left
+    rest = (int.from_bytes(other) for other in seqs.values() if other != seq)
+    backend.setattr_many((
+        (TIP_PREFIX + seq, None),
+        (TIP_HASH_PREFIX + block_hash, None),
+        _tip_range_item(next(rest, end), end)))
+
+
+@typechecked
+def set_current(backend: BCHTStorageBase, block_hash: bytes):
+    """Replace the list of current blocks with a single block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the only current block.
+    """
+
+    seqs, _ = _get_tips(backend)
+    _, end = _get_tip_range(backend)
+    items: list[tuple[bytes, typing.Optional[bytes]]] = []
+    for tip_hash, seq in seqs.items():
+        if tip_hash != block_hash:
+            items.append((TIP_PREFIX + seq, None))
+            items.append((TIP_HASH_PREFIX + tip_hash, None))
+    seq = seqs.get(block_hash)
+    if seq is None:
+        seq = end.to_bytes(8)
+        items.append((TIP_PREFIX + seq, block_hash))
+        items.append((TIP_HASH_PREFIX + block_hash, seq))
+        end += 1
+    items.append(_tip_range_item(int.from_bytes(seq), end))
+    backend.setattr_many(items)
+
+
+def _parse_best(raw: bytes) -> tuple[bytes, int]:
+    return raw[:32], int.from_bytes(raw[32:])
+
+
+def _get_best(backend: BCHTStorageBase) -> tuple[bytes, int]:
     try:
-        curr_hashes = backend.getattr(b"curr_hashes")
+        return backend.getattr_cached(BEST_HASH, _parse_best)
     except exceptions.BCHTAttributeNotFoundError:
-        curr_hashes = b""
-    curr_hashes += new_hash
-    backend.setattr(b"curr_hashes", curr_hashes)
+        pass
+    # Databases from before the best tip was recorded, or after it was removed
+    best_hash, best_work = NULL_HASH, -1
+    for tip_hash in parse_curr_hashes(backend):
+        try:
+            work = ensure_indexed(backend, tip_hash).work
+        except exceptions.BCHTBlockNotFoundError:
+            continue
+        if work > best_work:
+            best_hash, best_work = tip_hash, work
+    if best_hash != NULL_HASH:
+        backend.setattr(BEST_HASH, best_hash + best_work.to_bytes(32))
+    return best_hash, best_work
+
+
+@typechecked
+def get_best_hash(backend: BCHTStorageBase) -> bytes:
+    """Get the hash of the best tip, i.e. the block ending the chain
+    with the most cumulative work, maintained as blocks are imported.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Returns
+    -------
+    bytes
+        The hash of the block, or 32 null bytes if there are no blocks.
+    """
+
+    return _get_best(backend)[0]
+
+
+@typechecked
+def update_best_tip(backend: BCHTStorageBase, block: BCHTBlock, meta: BCHTBlockMeta):
+    """Apply the fork choice to a newly stored and indexed block. If its chain has more
+    cumulative work than the best tip, it becomes the best tip, however deep the fork is.
+    Otherwise, it is added to the current blocks if it is a sibling of them.
+    Call sync_state afterwards to move the materialized state along.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block : BCHTBlock
+        The new block.
+    meta : BCHTBlockMeta
+        The metadata of the new block, as returned by index_block.
+    """
+
+    _, best_work = _get_best(backend)
+    try:
+        prev_hash = backend.getattr_cached(b"prev_hash")
+    except exceptions.BCHTAttributeNotFoundError:
+        prev_hash = NULL_HASH  # Special value for first block
+
+    if meta.work > best_work:
+        backend.setattr(BEST_HASH, block.hash + meta.work.to_bytes(32))
+        if block.prev_hash != prev_hash:
+            # Building on a current block, or a fork overtaking the main chain
+            backend.setattr(b"prev_hash", block.prev_hash)
+            set_current(backend, block.hash)
+            return
+    if block.prev_hash == prev_hash:
+        add_hash_to_current(backend, block.hash)
 
 
 @typechecked
@@ -112,7 +387,8 @@ def get_curr_blocks(backend: BCHTStorageBase) -> tuple[BCHTBlock, ...]:
 
 
 @typechecked
-def _import_block(backend: BCHTStorageBase, block: BCHTBlock):
+def _import_block(backend: BCHTStorageBase, block: BCHTBlock,
+                  valid: typing.Optional[bool] = None):
     """Import a block into the BCHT Database
 
     Parameters
@@ -121,33 +397,30 @@ def _import_block(backend: BCHTStorageBase, block: BCHTBlock):
         The storage backend to be used.
     block : BCHTBlock
         The block to be imported.
+    valid : bool, optional
+        What consensus.validate returned for the block, if already known.
+        By default the block is validated here.
 
     Raises
     ------
     BCHTConsensusFailedError
         If the block is invalid
+    BCHTOrphanBlockError
+        If the previous block is not found, see storage.orphans.
     """
 
     try:
-        prev_block = backend.get(block.prev_hash)
+        prev_meta = ensure_indexed(backend, block.prev_hash)
     except exceptions.BCHTBlockNotFoundError as e:
-        raise exceptions.BCHTConsensusFailedError(
+        raise exceptions.BCHTOrphanBlockError(
             "Previous block not found") from e
-    if prev_block.creation_time > block.creation_time:
+    if prev_meta.creation_time > block.creation_time:
         raise exceptions.BCHTConsensusFailedError(
             "Block is earlier than the previous block")
-    if not validate(block):
+    if not (validate(block) if valid is None else valid):
         raise exceptions.BCHTConsensusFailedError("Block validation failed")
     backend.put(block)
-    try:
-        prev_hash = backend.getattr(b"prev_hash")
-    except exceptions.BCHTAttributeNotFoundError:
-        prev_hash = b"\x00" * 32  # Special value for first block
-    if block.prev_hash == prev_hash:
-        add_hash_to_current(backend, block.hash)
-    elif block.prev_hash in parse_curr_hashes(backend):
-        backend.setattr(b"prev_hash", block.prev_hash)
-        backend.setattr(b"curr_hashes", block.hash)
+    update_best_tip(backend, block, index_block(backend, block, prev_meta))
 
 
 @typechecked
@@ -166,16 +439,193 @@ def import_block(backend: BCHTStorageBase, block: BCHTBlock):
     ------
     BCHTConsensusFailedError
         If the block is invalid
+    BCHTOrphanBlockError
+        If the previous block is not found, see storage.orphans.
     """
 
     block_hash = block.prev_hash
 
     if block_hash == (b"\x00" * 32):
-        # This is the genesis block, validation would always fail.
-        # Therefore, we are going to construct the attributes ourself.
-
-        backend.put(block)
-        backend.delattr(b"prev_hash")
-        backend.setattr(b"curr_hashes", block.hash)
+        _import_genesis(backend, block)
     else:
         _import_block(backend, block)
+    sync_state(backend)
+    _auto_prune(backend)
+
+
+def _validate_raw(raw: bytes) -> bool:
+    # Run in the worker processes of import_blocks
+    return validate(BCHTBlock.from_raw(raw))
+
+
+def _topological_order(blocks: dict[bytes, BCHTBlock]) -> list[bytes]:
+    # Previous blocks first, otherwise in the order given
+    children = defaultdict(list)
+    queue = deque()
+    for block_hash, block in blocks.items():
+        if block.prev_hash in blocks:
+            children[block.prev_hash].append(block_hash)
+        else:
+            queue.append(block_hash)
+    order = []
+    while queue:
+        block_hash = queue.popleft()
+        order.append(block_hash)
+        queue.extend(children.pop(block_hash, ()))
+    return order
+
+
+def _import_one(overlay: BCHTBatchOverlay, block: BCHTBlock, valid: bool,
+                outcomes: dict[bytes, BCHTImportOutcome]) -> BCHTImportOutcome:
+    block_hash = block.hash
+    prev_outcome = outcomes.get(block.prev_hash)
+    if prev_outcome is not None and prev_outcome.status != IMPORTED:
+        return BCHTImportOutcome(
+            block_hash, INVALID if prev_outcome.status == INVALID else ORPHAN,
+            f"Previous block {prev_outcome.status}")
+    try:
+        if block.prev_hash == NULL_HASH:
+            _import_genesis(overlay, block)
+        else:
+            _import_block(overlay, block, valid)
+    except exceptions.BCHTOrphanBlockError as e:
+        return BCHTImportOutcome(block_hash, ORPHAN, str(e))
+    except exceptions.BCHTConsensusFailedError as e:
+        return BCHTImportOutcome(block_hash, INVALID, str(e))
+    return BCHTImportOutcome(block_hash, IMPORTED)
+
+
+@typechecked
+def import_blocks(  # pylint: disable=too-many-locals
+        backend: BCHTStorageBase,
+        blocks: typing.Iterable[BCHTBlock],
+        workers: int = 4,
+        batch_size: int = 1000,
+        progress: typing.Optional[typing.Callable[[int, int], typing.Any]] = None
+) -> tuple[BCHTImportOutcome, ...]:
+    """Import many blocks into the BCHT Database at once, e.g. for the initial sync.
+    The blocks can be given in any order, as they are imported previous blocks first.
+    They are validated in worker processes, while the valid ones are imported
+    in batches, each written in a few writes with the tips updated once.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    blocks : Iterable[BCHTBlock]
+        The blocks to be imported.
+    workers : int, optional
+        The number of processes validating blocks, by default 4.
+        With 1, they are validated in this process.
+    batch_size : int, optional
+        The number of blocks imported per batch, by default 1000.
+    progress : Callable[[int, int], Any], optional
+        Called after every batch with the number of blocks gone through and the total.
+
+    Returns
+    -------
+    tuple[BCHTImportOutcome, ...]
+        The outcomes, in the order the blocks were given.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If workers or batch_size is less than 1.
+    BCHTDatabaseClosedError
+        If the database was closed. The batches before were imported.
+    """
+
+    if workers < 1 or batch_size < 1:
+        raise exceptions.BCHTOutOfRangeError(
+            "There must be at least one worker and one block per batch.")
+
+    blocks = tuple(blocks)
+    results: list[typing.Optional[BCHTImportOutcome]] = [None] * len(blocks)
+    pending: dict[bytes, BCHTBlock] = {}
+    positions: dict[bytes, int] = {}
+    for i, block in enumerate(blocks):
+        block_hash = block.hash
+        if block_hash in pending:
+            results[i] = BCHTImportOutcome(block_hash, DUPLICATE, "Given more than once")
+        elif backend.contains(block_hash):
+            results[i] = BCHTImportOutcome(block_hash, DUPLICATE, "Already in the database")
+        else:
+            pending[block_hash] = block
+            positions[block_hash] = i
+    order = _topological_order(pending)
+
+    outcomes: dict[bytes, BCHTImportOutcome] = {}
+    overlay = BCHTBatchOverlay(backend)
+    with ExitStack() as stack:
+        if workers > 1 and len(order) >= MIN_PARALLEL_BLOCKS:
+            executor = stack.enter_context(ProcessPoolExecutor(workers))
+            valid = executor.map(_validate_raw, (pending[h].raw for h in order),
+                                 chunksize=max(1, min(256, len(order) // (workers * 4))))
+        else:
+            valid = (validate(pending[h]) for h in order)
+
+        # Validation goes on in the workers while the batches are imported
+        for done, (block_hash, is_valid) in enumerate(zip(order, valid), 1):
+            outcomes[block_hash] = results[positions[block_hash]] = _import_one(
+                overlay, pending[block_hash], is_valid, outcomes)
+            if done % batch_size == 0 or done == len(order):
+                sync_state(overlay)
+                overlay.flush()
+                if progress is not None:
+                    progress(done, len(order))
+
+    if any(outcome.status == IMPORTED for outcome in outcomes.values()):
+        _auto_prune(backend)
+    return tuple(results)
+
+
+def _import_genesis(backend: BCHTStorageBase, block: BCHTBlock):
+    # This is the genesis block, validation would always fail.
+    # Therefore, we are going to construct the attributes ourself.
+    # Every database with blocks has current blocks
+    fresh = not parse_curr_hashes(backend)
+    backend.put(block)
+    meta = index_block(backend, block)
+    if fresh:
+        backend.setattr(INDEX_COMPLETE, b"1")
+    try:
+        backend.delattr(b"prev_hash")
+    except KeyError:
+        pass  # Nothing to remove on a new database
+    set_current(backend, block.hash)
+    backend.setattr(BEST_HASH, block.hash + meta.work.to_bytes(32))
+
+
+def _auto_prune(backend: BCHTStorageBase):
+    # Imported here as storage.prune imports this module
+    from .prune import get_prune_keep, prune_history  # pylint: disable=import-outside-toplevel,cyclic-import
+    keep = get_prune_keep(backend)
+    if keep is not None:
+        prune_history(backend, keep, compact=False)
+
+
+@typechecked
+def remove_block(backend: BCHTStorageBase, block_hash: bytes):
+    """Delete a block from the BCHT Database,
+    together with its index records and its place in the current blocks.
+    The blocks built on it are not touched.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block to be deleted.
+
+    Raises
+    ------
+    BCHTInvalidHashError
+        If block_hash is not a valid SHA3-256 hash.
+    """
+
+    unindex_block(backend, block_hash)
+    remove_hash_from_current(backend, block_hash)
+    if get_best_hash(backend) == block_hash:
+        # Chosen again from the remaining current blocks when needed
+        backend.delattr(BEST_HASH)
+    backend.delete(block_hash)
@@ -0,0 +1,620 @@
+# bchosttrust/bchosttrust/storage/index.py
+"""Indexes maintained on top of the storage backends"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Every index lives in the attribute database of the backend,
+# under its own prefix (e.g. b"meta-" + block hash). Build the keys
+# with _key(...) so that the layout is defined in only one place.
+
+import struct
+import typing
+from collections import deque
+from dataclasses import dataclass
+
+from typeguard import typechecked
+
+from ..internal.block import BCHTBlock
+from ..consensus.powc import get_block_work
+from .. import exceptions
+from .meta import BCHTStorageBase
+
+NULL_HASH = b"\x00" * 32
+
+META_PREFIX = b"meta-"
+CHILD_PREFIX = b"child-"
+DOMAIN_PREFIX = b"domain-"
+HEIGHT_PREFIX = b"height-"  # Written by chainstate.move_state
+TIME_PREFIX = b"time-"
+# Set when every block is indexed, i.e. on databases indexed since their
+# genesis block was imported, or rebuilt by storage.reindex
+INDEX_COMPLETE = b"index_complete"
+
+
+def _key(prefix: bytes, *parts: bytes) -> bytes:
+    return prefix + b"".join(parts)
+
+
+def _domain_key(domain_name: str, *parts: bytes) -> bytes:
+    # The null byte keeps "example.com" from matching "example.com.hk"
+    return _key(DOMAIN_PREFIX, domain_name.encode("ascii"), b"\x00", *parts)
+
+
+def _check_hash(block_hash: bytes):
+    if len(block_hash) != 32:
+        raise exceptions.BCHTInvalidHashError(
+            f"{block_hash} is not a valid SHA3-256 hash.")
+
+
+@dataclass(frozen=True)
+@typechecked
+class BCHTBlockMeta:
+    """Compact metadata of a stored block.
+
+    Attributes
+    ----------
+    prev_hash : bytes
+        The SHA3-256 hash of the previous block, in bytes.
+    height : int
+        The number of blocks before this block. The genesis block is at height 0.
+    creation_time : int
+        The creation time of the block in Unix epoch.
+    entry_count : int
+        The number of entries in the block.
+    work : int
+        The cumulative work of the chain ending at this block.
+    """
+
+    _STRUCT = struct.Struct(">32sQQL32s")
+
+    prev_hash: bytes
+    height: int
+    creation_time: int
+    entry_count: int
+    work: int
+
+    @classmethod
+    def from_raw(cls, raw: bytes) -> typing.Self:
+        """Turn raw bytes into a BCHTBlockMeta
+
+        Parameters
+        ----------
+        raw : bytes
+            Raw bytes of the metadata
+
+        Returns
+        -------
+        BCHTBlockMeta
+            The metadata in Python object
+
+        Raises
+        ------
+        BCHTInvalidBlockError
+            If the length of the raw bytes is invalid.
+        """
+
+        try:
+            prev_hash, height, creation_time, entry_count, work = \
+                cls._STRUCT.unpack(raw)
+        except struct.error as e:
+            raise exceptions.BCHTInvalidBlockError(
+                "Invalid length of block metadata") from e
+        return cls(prev_hash, height, creation_time, entry_count,
+                   int.from_bytes(work))
+
+    @property
+    def raw(self) -> bytes:
+        """Return the metadata in its bytes form.
+
+        Returns
+        -------
+        bytes
+            The metadata in bytes.
+        """
+
+        return self._STRUCT.pack(
+            self.prev_hash, self.height, self.creation_time,
+            self.entry_count, self.work.to_bytes(32))
+
+
+class BCHTDomainPosting(typing.NamedTuple):
+    """A vote on a domain, as recorded in the domain index.
+
+    Attributes
+    ----------
+    block_hash : bytes
+        The hash of the block containing the vote.
+    height : int
+        The height of that block.
+    attitude : int
+        The attitude of the vote.
+    """
+
+    block_hash: bytes
+    height: int
+    attitude: int
+
+
+@typechecked
+def get_block_meta(backend: BCHTStorageBase, block_hash: bytes) -> BCHTBlockMeta:
+    """Get the metadata of a block without decoding the block itself.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block.
+
+    Returns
+    -------
+    BCHTBlockMeta
+        The metadata of the block.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If the metadata of the block is not indexed.
+    BCHTInvalidHashError
+        If block_hash is not a valid SHA3-256 hash.
+    """
+
+    _check_hash(block_hash)
+    try:
+        raw = backend.getattr(_key(META_PREFIX, block_hash))
+    except exceptions.BCHTAttributeNotFoundError as e:
+        raise exceptions.BCHTBlockNotFoundError(
+            f"Metadata of {block_hash} not found in the database.") from e
+    return BCHTBlockMeta.from_raw(raw)
+
+
+@typechecked
+def has_block_meta(backend: BCHTStorageBase, block_hash: bytes) -> bool:
+    """Check whether a block has been indexed.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block.
+
+    Returns
+    -------
+    bool
+        True if the metadata of the block exists.
+    """
+
+    try:
+        get_block_meta(backend, block_hash)
+    except exceptions.BCHTBlockNotFoundError:
+        return False
+    return True
+
+
+@typechecked
+def is_fully_indexed(backend: BCHTStorageBase) -> bool:
+    """Check whether every block has been indexed. Databases created before the
+    index existed are indexed as their blocks are built on, leaving the other
+    forks out, until storage.reindex is run.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Returns
+    -------
+    bool
+        True if the index can be relied on to find every block.
+    """
+
+    try:
+        backend.getattr(INDEX_COMPLETE)
+    except exceptions.BCHTAttributeNotFoundError:
+        return False
+    return True
+
+
+@typechecked
+def index_block(
+        backend: BCHTStorageBase,
+        block: BCHTBlock,
+        prev_meta: typing.Optional[BCHTBlockMeta] = None) -> BCHTBlockMeta:
+    """Write the index records of a block.
+    The previous block must have been indexed, unless this is a genesis block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block : BCHTBlock
+        The block to be indexed.
+    prev_meta : BCHTBlockMeta, optional
+        The metadata of the previous block, if already known by the caller.
+
+    Returns
+    -------
+    BCHTBlockMeta
+        The metadata of the block.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If the previous block is not indexed.
+    """
+
+    work = get_block_work(block)
+    if block.prev_hash == NULL_HASH:
+        height = 0
+    else:
+        if prev_meta is None:
+            prev_meta = get_block_meta(backend, block.prev_hash)
+        height = prev_meta.height + 1
+        work += prev_meta.work
+
+    block_hash = block.hash
+    meta = BCHTBlockMeta(block.prev_hash, height, block.creation_time,
+                         len(block.entries), work)
+    backend.setattr(_key(META_PREFIX, block_hash), meta.raw)
+    _index_records(backend, block, block_hash, height)
+    return meta
+
+
+def _index_records(backend: BCHTStorageBase, block: BCHTBlock, block_hash: bytes, height: int):
+    # Every index record of a block but its metadata, which needs the previous block
+    backend.setattr(_key(CHILD_PREFIX, block.prev_hash, block_hash), b"")
+    backend.setattr(
+        _key(TIME_PREFIX, block.creation_time.to_bytes(8), block_hash), b"")
+    height_bytes = height.to_bytes(8)
+    for entry in block.entries:
+        backend.setattr(
+            _domain_key(entry.domain_name, height_bytes, block_hash),
+            bytes((entry.attitude, )))
+
+
+@typechecked
+def ensure_indexed(backend: BCHTStorageBase, block_hash: bytes) -> BCHTBlockMeta:
+    """Get the metadata of a block, indexing it and its ancestors if needed.
+    This allows databases created before the index existed to be used.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block.
+
+    Returns
+    -------
+    BCHTBlockMeta
+        The metadata of the block.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If the block or one of its ancestors is not found.
+    """
+
+    # Walk back until an indexed block (or the genesis block) is found,
+    # then index the blocks in between from the oldest one.
+    pending = []
+    bhash = block_hash
+    while True:
+        try:
+            meta = get_block_meta(backend, bhash)
+            break
+        except exceptions.BCHTBlockNotFoundError:
+            pass
+        block = backend.get(bhash)
+        pending.append(block)
+        bhash = block.prev_hash
+        if bhash == NULL_HASH:
+            meta = None
+            break
+
+    for block in reversed(pending):
+        meta = index_block(backend, block, meta)
+    return meta
+
+
+@typechecked
+def unindex_block(backend: BCHTStorageBase, block_hash: bytes):
+    """Remove the index records of a block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the block.
+
+    Raises
+    ------
+    BCHTInvalidHashError
+        If block_hash is not a valid SHA3-256 hash.
+    """
+
+    try:
+        meta = get_block_meta(backend, block_hash)
+    except exceptions.BCHTBlockNotFoundError:
+        return
+    keys = [_key(CHILD_PREFIX, meta.prev_hash, block_hash),
+            _key(TIME_PREFIX, meta.creation_time.to_bytes(8), block_hash),
+            _key(META_PREFIX, block_hash)]
+    try:
+        block = backend.get(block_hash)
+    except exceptions.BCHTBlockNotFoundError:
+        pass  # Postings of a missing block never pass the ancestry check
+    else:
+        height_bytes = meta.height.to_bytes(8)
+        keys.extend(_domain_key(entry.domain_name, height_bytes, block_hash)
+                    for entry in block.entries)
+    for key in keys:
+        try:
+            backend.delattr(key)
+        except KeyError:
+            pass
+
+
+@typechecked
+def get_children(backend: BCHTStorageBase, block_hash: bytes) -> tuple[bytes, ...]:
+    """Get the hashes of the indexed blocks built directly on a block.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the parent block. Use 32 null bytes to get the genesis blocks.
+
+    Returns
+    -------
+    tuple[bytes, ...]
+        The hashes of the children, ordered by hash.
+
+    Raises
+    ------
+    BCHTInvalidHashError
+        If block_hash is not a valid SHA3-256 hash.
+    """
+
+    _check_hash(block_hash)
+    prefix = _key(CHILD_PREFIX, block_hash)
+    return tuple(key[len(prefix):] for key, _ in backend.iter_attrs(prefix))
+
+
+@typechecked
+def iter_descendants(
+        backend: BCHTStorageBase,
+        block_hash: bytes) -> typing.Generator[bytes, None, None]:
+    """Go through the hashes of every indexed block built on top of a block,
+    breadth-first. The starting block itself is not included.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the starting block.
+
+    Yields
+    ------
+    bytes
+        The hashes of the descendants.
+    """
+
+    queue = deque(get_children(backend, block_hash))
+    while queue:
+        child = queue.popleft()
+        yield child
+        queue.extend(get_children(backend, child))
+
+
+@typechecked
+def get_main_chain_hash(backend: BCHTStorageBase, height: int) -> typing.Optional[bytes]:
+    """Get the hash of the block at a height of the main chain,
+    i.e. the chain ending at the block returned by chainstate.get_state_tip.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    height : int
+        The height of the block.
+
+    Returns
+    -------
+    bytes | None
+        The hash of the block, or None if the main chain is not that high.
+    """
+
+    if height < 0:
+        return None
+    try:
+        return backend.getattr(_key(HEIGHT_PREFIX, height.to_bytes(8)))
+    except exceptions.BCHTAttributeNotFoundError:
+        return None
+
+
+@typechecked
+def iter_domain_postings(
+        backend: BCHTStorageBase,
+        domain_name: str,
+        tip_hash: typing.Optional[bytes] = None) -> typing.Generator[BCHTDomainPosting, None, None]:
+    """Go through the votes on a domain, reading only the index of that domain.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    domain_name : str
+        The domain name to be checked.
+    tip_hash : bytes, optional
+        If given, only votes in this block or its ancestors are returned.
+        The block must have been indexed.
+
+    Yields
+    ------
+    BCHTDomainPosting
+        The votes. Without tip_hash, they are ordered by ascending height.
+        Otherwise, they are ordered by descending height.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If tip_hash is given but not indexed.
+    """
+
+    prefix = _domain_key(domain_name)
+    postings = (BCHTDomainPosting(key[-32:], int.from_bytes(key[-40:-32]), value[0])
+                for key, value in backend.iter_attrs(prefix))
+    if tip_hash is None:
+        yield from postings
+        return
+
+    cursor_hash = tip_hash
+    cursor_meta = get_block_meta(backend, tip_hash)
+    if get_main_chain_hash(backend, cursor_meta.height) == tip_hash:
+        # Ancestors of a block in the main chain are in the main chain,
+        # so only one lookup is needed for each posting.
+        for posting in sorted(postings, key=lambda p: p.height, reverse=True):
+            if posting.height <= cursor_meta.height and \
+                    get_main_chain_hash(backend, posting.height) == posting.block_hash:
+                yield posting
+        return
+
+    # Walk down from the tip along the metadata, meeting the postings
+    # from the highest one.
+    for posting in sorted(postings, key=lambda p: p.height, reverse=True):
+        if posting.height > cursor_meta.height:
+            continue
+        while cursor_meta.height > posting.height:
+            cursor_hash = cursor_meta.prev_hash
+            cursor_meta = get_block_meta(backend, cursor_hash)
+        if cursor_hash == posting.block_hash:
+            yield posting
+
+
+@typechecked
+def get_domain_seen(
+        backend: BCHTStorageBase,
+        domain_name: str) -> typing.Optional[tuple[int, int]]:
+    """Get the creation time of the first and the last indexed block voting on a domain.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    domain_name : str
+        The domain name to be checked.
+
+    Returns
+    -------
+    tuple[int, int] | None
+        The creation times of the first-seen and the last-seen block in Unix epoch,
+        or None if the domain was never voted.
+    """
+
+    first = last = None
+    for posting in iter_domain_postings(backend, domain_name):
+        if first is None:
+            first = posting
+        last = posting
+    if first is None:
+        return None
+    return (get_block_meta(backend, first.block_hash).creation_time,
+            get_block_meta(backend, last.block_hash).creation_time)
+
+
+@typechecked
+def is_ancestor(backend: BCHTStorageBase, block_hash: bytes, tip_hash: bytes) -> bool:
+    """Check whether a block is the tip or one of its ancestors.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    block_hash : bytes
+        The hash of the indexed block to be checked.
+    tip_hash : bytes
+        The hash of the indexed tip.
+
+    Returns
+    -------
+    bool
+        True if block_hash is tip_hash or one of its ancestors.
+
+    Raises
+    ------
+    BCHTBlockNotFoundError
+        If either block is not indexed.
+    """
+
+    height = get_block_meta(backend, block_hash).height
+    tip_meta = get_block_meta(backend, tip_hash)
+    if height > tip_meta.height:
+        return False
+    if get_main_chain_hash(backend, tip_meta.height) == tip_hash:
+        return get_main_chain_hash(backend, height) == block_hash
+    while tip_meta.height > height:
+        tip_hash = tip_meta.prev_hash
+        tip_meta = get_block_meta(backend, tip_hash)
+    return tip_hash == block_hash
+
+
+@typechecked
+def iter_blocks_by_time(
+        backend: BCHTStorageBase,
+        since: typing.Optional[int] = None,
+        until: typing.Optional[int] = None,
+        tip_hash: typing.Optional[bytes] = None) -> typing.Generator[bytes, None, None]:
+    """Go through the hashes of the indexed blocks created within a period,
+    ordered by their creation time.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    since : int, optional
+        If given, only blocks created at or after this Unix epoch are returned.
+    until : int, optional
+        If given, only blocks created before this Unix epoch are returned.
+    tip_hash : bytes, optional
+        If given, only this block and its ancestors are returned.
+        The block must have been indexed.
+
+    Yields
+    ------
+    bytes
+        The hashes of the blocks.
+    """
+
+    if since is not None and (since > BCHTBlock.MAX_TIME
+                              or until is not None and since >= until):
+        return
+    for key, _ in backend.iter_attrs(
+            TIME_PREFIX,
+            start=None if since is None else _key(
+                TIME_PREFIX, max(since, 0).to_bytes(8)),
+            stop=None if until is None or until > BCHTBlock.MAX_TIME else _key(
+                TIME_PREFIX, max(until, 0).to_bytes(8))):
+        block_hash = key[-32:]
+        if tip_hash is None or is_ancestor(backend, block_hash, tip_hash):
+            yield block_hash
@@ -0,0 +1,419 @@
+# bchosttrust/bchosttrust/storage/instrument.py
+"""Measuring the calls to storage backends"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Every call is counted, together with the bytes of blocks and attributes read
+# and written. The latency of a sample of the calls is measured as well, into
+# histograms with buckets doubling from 1 microsecond (LATENCY_BUCKETS).
+# Iterators are measured per item, only for the time spent in the backend.
+#
+# Blocks are read in their bytes form and decoded by the wrapper, so that
+# the time spent in BCHTBlock.from_raw is recorded apart from the read (as
+# "decode"). For the backends keeping decoded blocks (e.g. BCHTDummyStorage),
+# this adds the decoding.
+
+import json
+import random
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+from ..internal import BCHTBlock, BCHTBlockHeader
+from .meta import BCHTStorageBase
+
+# The upper bounds of the buckets of the histograms, in seconds (1us to about 8s)
+LATENCY_BUCKETS = tuple(1e-6 * 2 ** i for i in range(24))
+
+_T = typing.TypeVar("_T")
+
+
+def _bucket(seconds: float) -> int:
+    # The first bucket whose bound is not lower, the last one for anything longer
+    micro = int(seconds * 1e6)
+    return min(max(micro - 1, 0).bit_length(), len(LATENCY_BUCKETS) - 1)
+
+
+class _OperationStats:  # pylint: disable=too-few-public-methods
+    __slots__ = ("calls", "sampled", "seconds", "histogram", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.calls = self.sampled = self.bytes_read = self.bytes_written = 0
+        self.seconds = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+    def percentile(self, fraction: float) -> typing.Optional[float]:
+        """The bound of the bucket a percentile of the sampled calls falls into."""
+        if not self.sampled:
+            return None
+        rank = fraction * self.sampled
+        count = 0
+        for bound, num in zip(LATENCY_BUCKETS, self.histogram):
+            count += num
+            if count >= rank:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+
+# Neither class is type checked, as the checks would cost more than most of
+# the calls measured. The arguments are still checked by the backend.
+
+
+class BCHTStorageStats:
+    """Counters and latency histograms of operations, shared between threads.
+
+    Attibutes
+    ---------
+    sample_rate : float
+        The fraction of the calls whose latency is measured.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        """Create empty statistics.
+
+        Parameters
+        ----------
+        sample_rate : float, optional
+            The fraction of the calls whose latency is measured, by default 1.0 (all).
+        """
+
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._operations: dict[str, _OperationStats] = {}
+        self._started = time.time()
+
+    def sample(self) -> bool:
+        """Decide whether to measure the latency of a call.
+
+        Returns
+        -------
+        bool
+            True for a fraction of sample_rate of the calls.
+        """
+
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(
+            self,
+            operation: str,
+            seconds: typing.Optional[float] = None,
+            bytes_read: int = 0,
+            bytes_written: int = 0):
+        """Record a call.
+
+        Parameters
+        ----------
+        operation : str
+            The name of the operation, e.g. "get".
+        seconds : float, optional
+            The latency of the call, if it was measured.
+        bytes_read : int, optional
+            The bytes of blocks and attributes read, by default 0
+        bytes_written : int, optional
+            The bytes of blocks and attributes written, by default 0
+        """
+
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = _OperationStats()
+            stats.calls += 1
+            stats.bytes_read += bytes_read
+            stats.bytes_written += bytes_written
+            if seconds is not None:
+                stats.sampled += 1
+                stats.seconds += seconds
+                stats.histogram[_bucket(seconds)] += 1
+
+    @contextmanager
+    def timer(self, operation: str):
+        """Measure a block of code as an operation, e.g. the analysis on the blocks read.
+
+        Parameters
+        ----------
+        operation : str
+            The name of the operation.
+        """
+
+        if not self.sample():
+            self.record(operation)
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, time.perf_counter() - started)
+
+    def reset(self):
+        """Forget everything recorded."""
+
+        with self._lock:
+            self._operations.clear()
+            self._started = time.time()
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """Take a snapshot of the statistics.
+
+        Returns
+        -------
+        dict[str, Any]
+            "since" (the Unix epoch the statistics started at), "sample_rate"
+            and "operations", with for every operation its "calls", "sampled" calls,
+            "seconds" (in total, sampled calls only), "mean", "p50", "p90" and "p99"
+            latencies in seconds (None if no call was sampled), "bytes_read",
+            "bytes_written" and "histogram", the number of sampled calls in every
+            bucket of LATENCY_BUCKETS, up to the last non-empty one.
+        """
+
+        with self._lock:
+            operations = {}
+            for operation, stats in sorted(self._operations.items()):
+                histogram = list(stats.histogram)
+                while histogram and not histogram[-1]:
+                    histogram.pop()
+                operations[operation] = {
+                    "calls": stats.calls,
+                    "sampled": stats.sampled,
+                    "seconds": stats.seconds,
+                    "mean": stats.seconds / stats.sampled if stats.sampled else None,
+                    "p50": stats.percentile(0.5),
+                    "p90": stats.percentile(0.9),
+                    "p99": stats.percentile(0.99),
+                    "bytes_read": stats.bytes_read,
+                    "bytes_written": stats.bytes_written,
+                    "histogram": histogram,
+                }
+            return {"since": self._started, "sample_rate": self.sample_rate,
+                    "operations": operations}
+
+    def to_json(self, **kwargs) -> str:
+        """Take a snapshot of the statistics as JSON, see to_dict.
+
+        Parameters
+        ----------
+        **kwargs
+            Passed into json.dumps, e.g. indent.
+
+        Returns
+        -------
+        str
+            The JSON document.
+        """
+
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class BCHTInstrumentedStorage(BCHTStorageBase):  # pylint: disable=too-many-public-methods
+    """Wrapper of a storage backend recording its calls into BCHTStorageStats.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend the calls are passed to.
+    stats : BCHTStorageStats
+        Where the calls are recorded.
+    """
+
+    # Read through the backend, which caches the attributes itself
+    cache_attrs = False
+
+    @property
+    def thread_safe(self) -> bool:  # pylint: disable=invalid-overridden-method
+        """Whether the backend may be called from several threads at once,
+        the stats being recorded under a lock."""
+        return self.backend.thread_safe
+
+    def __init__(self, backend: BCHTStorageBase, stats: typing.Optional[BCHTStorageStats] = None):
+        """Wrap a storage backend.
+
+        Parameters
+        ----------
+        backend : BCHTStorageBase
+            The storage backend. Closing the wrapper closes it.
+        stats : BCHTStorageStats, optional
+            Where the calls are recorded, by default new statistics measuring every call.
+        """
+
+        self.backend = backend
+        self.stats = BCHTStorageStats() if stats is None else stats
+
+    def __str__(self):
+        return f"<BCHTInstrumentedStorage, backend={self.backend}>"
+
+    def _call(self, operation: str, func: typing.Callable[..., _T], *args,
+              size: typing.Callable[[_T], tuple[int, int]] = lambda _: (0, 0)) -> _T:
+        if not self.stats.sample():
+            result = func(*args)
+            self.stats.record(operation, None, *size(result))
+            return result
+        started = time.perf_counter()
+        result = func(*args)
+        self.stats.record(operation, time.perf_counter() - started, *size(result))
+        return result
+
+    def _iter(self, operation: str, iterator: typing.Iterator[_T],
+              size: typing.Callable[[_T], int] = lambda _: 0) -> typing.Generator[_T, None, None]:
+        # Every item is a call, so that the consumer is not measured
+        while True:
+            sampled = self.stats.sample()
+            started = time.perf_counter() if sampled else 0.0
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.stats.record(operation, time.perf_counter() - started if sampled else None,
+                              size(item))
+            yield item
+
+    def _decode(self, raw: bytes) -> BCHTBlock:
+        return self._call("decode", BCHTBlock.from_raw, raw)
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block by its hash, see BCHTStorageBase.get.
+        The reading and the decoding are recorded as "get_raw" and "decode"."""
+        return self._decode(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, see BCHTStorageBase.get_raw."""
+        return self._call("get_raw", self.backend.get_raw, block_hash,
+                          size=lambda raw: (len(raw), 0))
+
+    def contains(self, block_hash: bytes) -> bool:
+        """Check whether a block is in the database, see BCHTStorageBase.contains."""
+        return self._call("contains", self.backend.contains, block_hash)
+
+    def load_known_hashes(self, error_rate: float = 0.001, headroom: float = 2.0):
+        """Build the Bloom filter of the backend, see BCHTStorageBase.load_known_hashes."""
+        self._call("load_known_hashes", self.backend.load_known_hashes, error_rate, headroom)
+
+    def put(self, block_data: BCHTBlock):
+        """Put the given block into the database, see BCHTStorageBase.put."""
+        self._call("put", self.backend.put, block_data,
+                   size=lambda _: (0, len(block_data.raw)))
+
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database,
+        see BCHTStorageBase.put_raw_many."""
+        items = tuple(items)
+        self._call("put_raw_many", self.backend.put_raw_many, items,
+                   size=lambda _: (0, sum(len(raw) for _, raw in items)))
+
+    def delete(self, block_hash: bytes):
+        """Delete a block by its hash, see BCHTStorageBase.delete."""
+        self._call("delete", self.backend.delete, block_hash)
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Go through the blocks, unordered, see BCHTStorageBase.iter_blocks."""
+        for _, block in self.iter_blocks_with_key():
+            yield block
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Go through the blocks with their hashes, see BCHTStorageBase.iter_blocks_with_key.
+        The reading and the decoding are recorded as "iter_raw_blocks" and "decode"."""
+        for block_hash, raw in self.iter_raw_blocks():
+            yield block_hash, self._decode(raw)
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Go through the blocks in their bytes form, see BCHTStorageBase.iter_raw_blocks."""
+        yield from self._iter("iter_raw_blocks",
+                              self.backend.iter_raw_blocks(start, stop, fill_cache),
+                              lambda item: len(item[1]))
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Go through the headers of the blocks, see BCHTStorageBase.iter_headers."""
+        yield from self._iter("iter_headers",
+                              self.backend.iter_headers(start, stop, fill_cache))
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute, see BCHTStorageBase.getattr."""
+        return self._call("getattr", self.backend.getattr, attr_name,
+                          size=lambda content: (len(content), 0))
+
+    def getattr_cached(
+            self,
+            attr_name: bytes,
+            parser: typing.Optional[typing.Callable[[bytes], typing.Any]] = None) -> typing.Any:
+        """Retrieve an attibute through the cache of the backend,
+        see BCHTStorageBase.getattr_cached."""
+        return self._call("getattr_cached", self.backend.getattr_cached, attr_name, parser)
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute, see BCHTStorageBase.setattr."""
+        self._call("setattr", self.backend.setattr, attr_name, content,
+                   size=lambda _: (0, len(content)))
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes, see BCHTStorageBase.setattr_many."""
+        items = tuple(items)
+        self._call("setattr_many", self.backend.setattr_many, items,
+                   size=lambda _: (0, sum(len(content or b"") for _, content in items)))
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute, see BCHTStorageBase.delattr."""
+        self._call("delattr", self.backend.delattr, attr_name)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Go through the attributes, see BCHTStorageBase.iter_attrs."""
+        yield from self._iter("iter_attrs",
+                              self.backend.iter_attrs(prefix, start, stop, reverse),
+                              lambda item: len(item[1]))
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace attributes by those under a prefix, see BCHTStorageBase.swap_attrs."""
+        self._call("swap_attrs", self.backend.swap_attrs, shadow_prefix, tuple(prefixes))
+
+    def compact(self):
+        """Compact the database, see BCHTStorageBase.compact."""
+        self._call("compact", self.backend.compact)
+
+    def snapshot(self) -> "BCHTInstrumentedStorage":
+        """Return a read-only view of the database pinned to this moment,
+        recording into the same statistics, see BCHTStorageBase.snapshot."""
+        return BCHTInstrumentedStorage(self._call("snapshot", self.backend.snapshot), self.stats)
+
+    def close(self):
+        """Close the backend."""
+        self.backend.close()
+
+    @property
+    def closed(self) -> bool:
+        """Indicates whether the backend is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return self.backend.closed
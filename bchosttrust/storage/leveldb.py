@@ -19,15 +19,60 @@
 # The legal text of GPLv3 and LGPLv3 can be found at
 # bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
 
+import threading
 import typing
 from plyvel import DB as LDB
 from typeguard import typechecked
 
 from .meta import BCHTStorageBase
+from .codec import CODECS, get_codec
+from ..utils import prefix_successor
 from .. import exceptions
 from .. import BCHTBlock
 
 
+def _bounds(
+        prefix: bytes,
+        start: typing.Optional[bytes],
+        stop: typing.Optional[bytes]) -> tuple[bytes, typing.Optional[bytes]]:
+    # The range of keys starting with prefix, narrowed down to [start, stop)
+    lower = prefix if start is None else max(start, prefix)
+    upper = prefix_successor(prefix) or None
+    if stop is not None and (upper is None or stop < upper):
+        upper = stop
+    return lower, upper
+
+
+def _iter_reverse(
+        db, lower: bytes,
+        upper: typing.Optional[bytes]) -> typing.Generator[tuple[bytes, bytes], None, None]:
+    # The keys in [lower, upper) in descending order. Not done with
+    # iterator(reverse=True), as plyvel 1.5.0 returns nothing from it if only
+    # one key is in the range and some key follows it.
+    it = db.raw_iterator()
+    try:
+        if upper is None:
+            it.seek_to_last()
+        else:
+            it.seek(upper)
+            if it.valid():
+                it.prev()
+            else:
+                it.seek_to_last()
+        while it.valid():
+            key = it.key()
+            if key < lower:
+                break
+            yield key, it.value()
+            it.prev()
+    finally:
+        it.close()
+
+
+# The codec the blocks are stored with, see storage.codec. Blocks are stored raw if missing.
+CODEC_KEY = b"codec"
+
+
 @typechecked
 class BCHTLevelDBStorage(BCHTStorageBase):
     """BCHT LevelDB Storage backend
@@ -39,29 +84,68 @@ class BCHTLevelDBStorage(BCHTStorageBase):
         The LevelDB object this backend is working on. This can be passed into __init__, 
         or created with the init_db classmethod.
         See https://plyvel.readthedocs.io/en/latest/api.html#DB for more usages.
+    codec : BCHTDomainDictionaryCodec | None
+        The codec the blocks are stored with, or None if they are stored raw.
     """
 
-    def __init__(self, db: LDB):
+    def __init__(self, db: LDB, codec: typing.Optional[str] = None):
+        """Use a LevelDB as a storage backend.
+
+        Parameters
+        ----------
+        db : plyvel.DB
+            The LevelDB.
+        codec : str, optional
+            One of storage.codec.CODECS. By default the one the database was created with.
+            A database cannot be switched between "raw" and "dict" once it has blocks.
+
+        Raises
+        ------
+        ValueError
+            If the codec does not exist or cannot be switched to.
+        """
+
         self.db = db
         self.db_block = db.prefixed_db(b'block-')
         self.db_attr = db.prefixed_db(b'attr-')
+        self._write_lock = threading.Lock()
+
+        stored = db.get(CODEC_KEY)
+        current = "raw" if stored is None else stored.decode("ascii")
+        if codec is None:
+            codec = current
+        elif codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {', '.join(CODECS)}")
+        if (codec == "raw") != (current == "raw") and next(
+                self.db_block.iterator(include_value=False), None) is not None:
+            raise ValueError(
+                f"The blocks in the database are stored with the {current!r} codec, "
+                f"which cannot be switched to {codec!r}.")
+        if codec != current:
+            db.put(CODEC_KEY, codec.encode("ascii"))
+        self.codec = get_codec(codec, db)
 
     def __str__(self):
         return f"<BCHTLevelDBStorage, db={self.db.__str__()}>"
 
     @classmethod
-    def init_db(cls, *args, **kwargs) -> typing.Self:
+    def init_db(cls, *args, codec: typing.Optional[str] = None, **kwargs) -> typing.Self:
         """Create a BCHT LevelDB Storage backend with parameters 
         passed into a plyvel.DB constructor.
         See https://plyvel.readthedocs.io/en/latest/api.html#DB.__init__ 
         for what to pass into this function.
 
+        Parameters
+        ----------
+        codec : str, optional
+            The codec the blocks are stored with, see __init__.
+
         Returns
         -------
         BCHTLevelDBStorage
             The storage backend object.
         """
-        return cls(LDB(*args, **kwargs))
+        return cls(LDB(*args, **kwargs), codec=codec)
 
     def put(self, block_data: BCHTBlock):
         """Put the given block into the database.
@@ -79,12 +163,54 @@ class BCHTLevelDBStorage(BCHTStorageBase):
 
         block_hash = block_data.hash
         raw_block_data = block_data.raw
+        if self.codec is not None:
+            self._write_raw(((block_hash, raw_block_data), ))
+            return
+        self._add_known_hash(block_hash)
         try:
             self.db_block.put(block_hash, raw_block_data)
         except RuntimeError as e:
             raise exceptions.BCHTDatabaseClosedError(
                 "LevelDB backend closed.") from e
 
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database, in one batch,
+        without decoding them.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes]]
+            The hashes and the raw blocks. The hashes are trusted to match the blocks.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._write_raw(items)
+
+    def _write_raw(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        # Write (hash, raw block) pairs in one batch, together with the new
+        # entries in the domain dictionary if the blocks are encoded.
+        try:
+            if self.codec is None:
+                with self.db_block.write_batch() as batch:
+                    for block_hash, raw in items:
+                        self._add_known_hash(block_hash)
+                        batch.put(block_hash, raw)
+                return
+            with self._write_lock, self.codec.write_batch() as batch:
+                for block_hash, raw in items:
+                    self._add_known_hash(block_hash)
+                    batch.put(b"block-" + block_hash, self.codec.encode(raw, batch))
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+
+    def _decode(self, stored: bytes) -> bytes:
+        return stored if self.codec is None else self.codec.decode(stored)
+
     def get(self, block_hash: bytes) -> BCHTBlock:
         """Retrieve a block in the chain by its hash.
 
@@ -108,6 +234,31 @@ class BCHTLevelDBStorage(BCHTStorageBase):
             If the database was closed.
         """
 
+        return BCHTBlock.from_raw(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
         if len(block_hash) != 32:
             raise exceptions.BCHTInvalidHashError(
                 f"{block_hash} is not a valid SHA3-512 hexadecimal hash.")
@@ -119,7 +270,24 @@ class BCHTLevelDBStorage(BCHTStorageBase):
         if get_result is None:  # i.e. not found
             raise exceptions.BCHTBlockNotFoundError(
                 f"{block_hash} not found in the database.")
-        return BCHTBlock.from_raw(get_result)
+        return self._decode(get_result)
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        # LevelDB has no lookup of keys alone, but a key-only iterator
+        # seeks to the hash without copying or decoding the stored block
+        try:
+            with self.db_block.iterator(start=block_hash, include_value=False) as it:
+                return next(it, None) == block_hash
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+
+    def _iter_hashes(self) -> typing.Generator[bytes, None, None]:
+        try:
+            yield from self.db_block.iterator(include_value=False, fill_cache=False)
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
 
     def delete(self, block_hash: bytes):
         """Delete a block in the chain by its hash.
@@ -162,7 +330,7 @@ class BCHTLevelDBStorage(BCHTStorageBase):
 
         try:
             for raw in self.db_block.iterator(include_key=False):
-                yield BCHTBlock.from_raw(raw)
+                yield BCHTBlock.from_raw(self._decode(raw))
         except RuntimeError as e:
             raise exceptions.BCHTDatabaseClosedError(
                 "LevelDB backend closed.") from e
@@ -183,7 +351,49 @@ class BCHTLevelDBStorage(BCHTStorageBase):
 
         try:
             for key, value in self.db_block:
-                yield key, BCHTBlock.from_raw(value)
+                yield key, BCHTBlock.from_raw(self._decode(value))
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True. Turn this off for full scans, so that they do not
+            push the frequently used blocks out of the cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        try:
+            if self.codec is None:
+                yield from self.db_block.iterator(
+                    start=start, stop=stop, fill_cache=fill_cache)
+                return
+            for key, value in self.db_block.iterator(
+                    start=start, stop=stop, fill_cache=fill_cache):
+                yield key, self.codec.decode(value)
         except RuntimeError as e:
             raise exceptions.BCHTDatabaseClosedError(
                 "LevelDB backend closed.") from e
@@ -244,6 +454,7 @@ class BCHTLevelDBStorage(BCHTStorageBase):
         except RuntimeError as e:
             raise exceptions.BCHTDatabaseClosedError(
                 "LevelDB backend closed.") from e
+        self._cache_attr(attr_name, content)
 
     def delattr(self, attr_name: bytes):
         """Delete an attibute from the database
@@ -266,6 +477,152 @@ class BCHTLevelDBStorage(BCHTStorageBase):
         except RuntimeError as e:
             raise exceptions.BCHTDatabaseClosedError(
                 "LevelDB backend closed.") from e
+        self._cache_attr(attr_name, None)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        try:
+            if reverse:
+                lower, upper = _bounds(b"attr-" + prefix, start and b"attr-" + start,
+                                       stop and b"attr-" + stop)
+                for key, value in _iter_reverse(self.db, lower, upper):
+                    yield key[5:], value
+            elif start is None and stop is None:
+                yield from self.db_attr.iterator(prefix=prefix)
+            else:
+                # plyvel does not accept prefix together with start and stop
+                lower, upper = _bounds(prefix, start, stop)
+                yield from self.db_attr.iterator(start=lower, stop=upper)
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes into the database in one batch.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes | None]]
+            The names and the contents of the attributes,
+            None for the attributes to be deleted if they exist.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        items = tuple(items)
+        try:
+            with self.db_attr.write_batch() as batch:
+                for attr_name, content in items:
+                    if content is None:
+                        batch.delete(attr_name)
+                    else:
+                        batch.put(attr_name, content)
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+        for attr_name, content in items:
+            self._cache_attr(attr_name, content)
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace the attributes whose names start with any of prefixes by those
+        whose names start with shadow_prefix + that prefix, with shadow_prefix taken off,
+        in one write. Readers see either the old or the new attributes.
+
+        Parameters
+        ----------
+        shadow_prefix : bytes
+            The prefix the new attributes were written under.
+        prefixes : Iterable[bytes]
+            The prefixes of the names of the attributes to be replaced.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        try:
+            # Later writes in a batch take precedence, so stale names are
+            # deleted first and then the new ones are put over them.
+            with self._write_lock, self.db_attr.write_batch(transaction=True) as batch:
+                for prefix in prefixes:
+                    for key in self.db_attr.iterator(prefix=prefix, include_value=False):
+                        batch.delete(key)
+                    for key, content in self.db_attr.iterator(prefix=shadow_prefix + prefix):
+                        batch.delete(key)
+                        batch.put(key[len(shadow_prefix):], content)
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+        self._reset_attr_cache()
+
+    def snapshot(self) -> "BCHTLevelDBSnapshot":
+        """Return a read-only view of the database pinned to this moment,
+        backed by a LevelDB snapshot. Later changes to the database are not seen through it.
+
+        Returns
+        -------
+        BCHTLevelDBSnapshot
+            The read-only view. Close it when done with it.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        try:
+            return BCHTLevelDBSnapshot(self, self.db.snapshot())
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
+
+    def compact(self):
+        """Compact the whole LevelDB, dropping deleted blocks and attributes.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        try:
+            self.db.compact_range()
+        except RuntimeError as e:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB backend closed.") from e
 
     def close(self):
         """Closes the LevelDB."""
@@ -287,3 +644,299 @@ class BCHTLevelDBStorage(BCHTStorageBase):
         """
 
         return self.db.closed
+
+
+@typechecked
+# Snapshots of snapshots are not supported
+class BCHTLevelDBSnapshot(BCHTStorageBase):  # pylint: disable=abstract-method
+    """Read-only view of a BCHT LevelDB Storage backend, returned by
+    BCHTLevelDBStorage.snapshot.
+
+    Attibutes
+    ---------
+    backend : BCHTLevelDBStorage
+        The storage backend this view is taken from.
+    snapshot_db : plyvel.Snapshot
+        The LevelDB snapshot this view is reading from.
+        See https://plyvel.readthedocs.io/en/latest/api.html#Snapshot for more usages.
+    """
+
+    def __init__(self, backend: BCHTLevelDBStorage, snapshot_db):
+        self.backend = backend
+        self.snapshot_db = snapshot_db
+        self._closed = False
+
+    def __str__(self):
+        return f"<BCHTLevelDBSnapshot, db={self.backend.db.__str__()}>"
+
+    def _check_open(self):
+        if self.closed:
+            raise exceptions.BCHTDatabaseClosedError(
+                "LevelDB snapshot closed.")
+
+    def put(self, block_data: BCHTBlock):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        return BCHTBlock.from_raw(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-512 hexadecimal hash.")
+        get_result = self.snapshot_db.get(b"block-" + block_hash)
+        if get_result is None:  # i.e. not found
+            raise exceptions.BCHTBlockNotFoundError(
+                f"{block_hash} not found in the database.")
+        return self.backend._decode(get_result)  # pylint: disable=protected-access
+
+    def delete(self, block_hash: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        for _, raw in self.iter_raw_blocks():
+            yield BCHTBlock.from_raw(raw)
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered, with keys.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        for key, raw in self.iter_raw_blocks():
+            yield key, BCHTBlock.from_raw(raw)
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True. Turn this off for full scans, so that they do not
+            push the frequently used blocks out of the cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        lower = b"block-" if start is None else b"block-" + start
+        upper = prefix_successor(b"block-") if stop is None else b"block-" + stop
+        # The domain dictionary only ever grows, so it is read from the database itself
+        decode = self.backend._decode  # pylint: disable=protected-access
+        for key, value in self.snapshot_db.iterator(
+                start=lower, stop=upper, fill_cache=fill_cache):
+            yield key[6:], decode(value)
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        rtn = self.snapshot_db.get(b"attr-" + attr_name)
+        if rtn is None:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"{attr_name} not found in the database.")
+        return rtn
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def delattr(self, attr_name: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        lower, upper = _bounds(b"attr-" + prefix, start and b"attr-" + start,
+                               stop and b"attr-" + stop)
+        if reverse:
+            items = _iter_reverse(self.snapshot_db, lower, upper)
+        else:
+            items = self.snapshot_db.iterator(start=lower, stop=upper)
+        for key, value in items:
+            yield key[5:], value
+
+    def close(self):
+        """Release the LevelDB snapshot. The database is left open."""
+
+        if not self._closed:
+            self._closed = True
+            self.snapshot_db.close()
+
+    @property
+    def closed(self):
+        """Indicates whether the snapshot or its database is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the snapshot is no longer usable.
+        """
+
+        return self._closed or self.backend.closed
@@ -0,0 +1,681 @@
+# bchosttrust/bchosttrust/storage/memory.py
+"""In-memory storage backend keeping blocks in their bytes form"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Blocks and attributes are kept in _BCHTLayers: a stack of dicts, of which
+# only the top one is written. Cloning freezes the top layer and starts an
+# empty one on both sides, so the layers below are shared and never changed
+# again. Deletions over frozen layers are written as None. The sorted list of
+# the keys is kept up to date as keys are added and removed. It is shared with
+# the clones, so it is copied on the first change after cloning.
+
+import sys
+import threading
+import typing
+from bisect import bisect_left, insort
+
+from typeguard import typechecked
+
+from ..internal import BCHTBlock, BCHTBlockHeader
+from ..utils import prefix_successor
+from .meta import BCHTStorageBase
+from .. import exceptions
+
+# Beyond this many frozen layers, they are merged into one when cloning
+MAX_LAYERS = 16
+
+
+class _BCHTLayers:
+    __slots__ = ("top", "frozen", "count", "_sorted", "_shared")
+
+    def __init__(self):
+        self.top: dict[bytes, typing.Optional[bytes]] = {}
+        self.frozen: tuple[dict[bytes, typing.Optional[bytes]], ...] = ()
+        self.count = 0
+        self._sorted: list[bytes] = []
+        # Whether _sorted is shared with clones, and must be copied before changing it
+        self._shared = False
+
+    def get(self, key: bytes) -> typing.Optional[bytes]:
+        """The value of a key, or None if missing."""
+        value = self.top.get(key)
+        if value is not None or key in self.top:
+            return value
+        for layer in self.frozen:
+            if key in layer:
+                return layer[key]
+        return None
+
+    def set(self, key: bytes, value: bytes):
+        """Set a key in the top layer."""
+        if self.get(key) is None:
+            self.count += 1
+            insort(self._own_sorted(), key)
+        self.top[key] = value
+
+    def delete(self, key: bytes):
+        """Delete a key if it exists."""
+        if self.get(key) is None:
+            return
+        self.count -= 1
+        keys = self._own_sorted()
+        del keys[bisect_left(keys, key)]
+        if self.frozen:
+            self.top[key] = None
+        else:
+            del self.top[key]
+
+    def _own_sorted(self) -> list[bytes]:
+        if self._shared:
+            self._sorted = list(self._sorted)
+            self._shared = False
+        return self._sorted
+
+    def keys(self) -> list[bytes]:
+        """The keys in order. Do not change the list, which changes with the layers."""
+        return self._sorted
+
+    def range(self, lower: bytes, upper: typing.Optional[bytes]) -> list[bytes]:
+        """The keys in [lower, upper) in order, upper being None for no bound."""
+        keys = self.keys()
+        end = len(keys) if upper is None else bisect_left(keys, upper)
+        return keys[bisect_left(keys, lower):end]
+
+    def clone(self) -> "_BCHTLayers":
+        """An independent copy sharing the layers, which are frozen."""
+        if self.top:
+            self.frozen = (self.top, ) + self.frozen
+            self.top = {}
+            if len(self.frozen) > MAX_LAYERS:
+                self.frozen = (self.merged(), )
+        other = _BCHTLayers()
+        other.frozen = self.frozen
+        other.count = self.count
+        other._sorted = self._sorted  # pylint: disable=protected-access
+        other._shared = self._shared = True  # pylint: disable=protected-access
+        return other
+
+    def merged(self) -> dict[bytes, bytes]:
+        """All the layers merged into one, without the deletions."""
+        merged = {}
+        for layer in reversed((self.top, ) + self.frozen):
+            merged.update(layer)
+        return {key: value for key, value in merged.items() if value is not None}
+
+    def memory_usage(self) -> int:
+        """An estimate of the bytes used by the layers."""
+        layers = (self.top, ) + self.frozen
+        size = sys.getsizeof(self._sorted) + sum(sys.getsizeof(layer) for layer in layers)
+        for layer in layers:
+            size += sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in layer.items())
+        return size
+
+
+@typechecked
+class BCHTMemoryStorage(BCHTStorageBase):  # pylint: disable=too-many-public-methods
+    """BCHT in-memory storage backend keeping blocks in their bytes form.
+    Blocks are iterated in the order of their hashes, as with LevelDB.
+    Clones and snapshots share everything written before them, so taking
+    them does not copy the database.
+
+    Attibutes
+    ---------
+    read_only : bool
+        Whether writes are refused, as for snapshots.
+    """
+
+    def __init__(self, read_only: bool = False):
+        """Create an empty in-memory database.
+
+        Parameters
+        ----------
+        read_only : bool, optional
+            Whether writes are refused, by default False
+        """
+
+        self.read_only = read_only
+        self._blocks = _BCHTLayers()
+        self._attrs = _BCHTLayers()
+        self._lock = threading.RLock()
+        self._closed = False
+
+    def __str__(self):
+        return f"<BCHTMemoryStorage, blocks={self._blocks.count}>"
+
+    def _check_open(self):
+        if self._closed:
+            raise exceptions.BCHTDatabaseClosedError(
+                "Memory backend closed.")
+
+    def _check_writable(self):
+        self._check_open()
+        if self.read_only:
+            raise exceptions.BCHTReadOnlyError(
+                "Memory backend is read-only.")
+
+    def put(self, block_data: BCHTBlock):
+        """Put the given block into the database.
+
+        Parameters
+        ----------
+        block_data : BCHTBlock
+            The BCHTBlock object to be stored.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            self._blocks.set(block_data.hash, block_data.raw)
+
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database, without decoding them.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes]]
+            The hashes and the raw blocks. The hashes are trusted to match the blocks.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            for block_hash, raw in items:
+                self._blocks.set(block_hash, bytes(raw))
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return BCHTBlock.from_raw(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        raw = self._blocks.get(block_hash)
+        if raw is None:
+            raise exceptions.BCHTBlockNotFoundError(
+                f"{block_hash} not found in the database.")
+        return raw
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        self._check_open()
+        return self._blocks.get(block_hash) is not None
+
+    def load_known_hashes(self, error_rate: float = 0.001, headroom: float = 2.0):
+        """Do nothing, as the blocks are all in memory already."""
+
+    def delete(self, block_hash: bytes):
+        """Delete a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : str
+            The hexadecimal hash of the block wanted.
+
+        Raises
+        ------
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        with self._lock:
+            self._blocks.delete(block_hash)
+
+    def _iter_range(
+            self,
+            layers: _BCHTLayers,
+            lower: bytes,
+            upper: typing.Optional[bytes],
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        self._check_open()
+        with self._lock:
+            keys = layers.range(lower, upper)
+        for key in reversed(keys) if reverse else keys:
+            value = layers.get(key)
+            if value is not None:  # Unless deleted since
+                yield key, value
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks in the database.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        for _, raw in self._iter_range(self._blocks, b"", None):
+            yield BCHTBlock.from_raw(raw)
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes,
+        with keys.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        for block_hash, raw in self._iter_range(self._blocks, b"", None):
+            yield block_hash, BCHTBlock.from_raw(raw)
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Ignored, as there is no cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        yield from self._iter_range(self._blocks, b"" if start is None else start, stop)
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Return a iterable returning the headers of blocks, ordered by their hashes,
+        without decoding the entries.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Ignored, as there is no cache.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlockHeader]
+            hash as keys, the headers as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for block_hash, raw in self._iter_range(
+                self._blocks, b"" if start is None else start, stop):
+            yield block_hash, BCHTBlockHeader.from_raw(raw)
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        content = self._attrs.get(attr_name)
+        if content is None:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"Attribute {attr_name} not found.")
+        return content
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute into the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+        content : bytes
+            Contents to be stored
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            self._attrs.set(attr_name, bytes(content))
+            self._cache_attr(attr_name, content)
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            self._attrs.delete(attr_name)
+            self._cache_attr(attr_name, None)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        lower = max(prefix, start) if start is not None else prefix
+        upper = prefix_successor(prefix) or None
+        if stop is not None and (upper is None or stop < upper):
+            upper = stop
+        yield from self._iter_range(self._attrs, lower, upper, reverse)
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes into the database.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes | None]]
+            The names and the contents of the attributes,
+            None for the attributes to be deleted if they exist.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            for attr_name, content in items:
+                if content is None:
+                    self._attrs.delete(attr_name)
+                else:
+                    self._attrs.set(attr_name, bytes(content))
+                self._cache_attr(attr_name, content)
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace the attributes whose names start with any of prefixes by those
+        whose names start with shadow_prefix + that prefix, with shadow_prefix taken off.
+        Readers see either the old or the new attributes.
+
+        Parameters
+        ----------
+        shadow_prefix : bytes
+            The prefix the new attributes were written under.
+        prefixes : Iterable[bytes]
+            The prefixes of the names of the attributes to be replaced.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database is read-only.
+        """
+
+        self._check_writable()
+        with self._lock:
+            # Written into a clone, swapped in at the end
+            attrs = self._attrs.clone()
+            for prefix in prefixes:
+                shadow = shadow_prefix + prefix
+                for key in attrs.range(prefix, prefix_successor(prefix) or None):
+                    attrs.delete(key)
+                for key in attrs.range(shadow, prefix_successor(shadow) or None):
+                    attrs.set(key[len(shadow_prefix):], attrs.get(key))
+                    attrs.delete(key)
+            self._attrs = attrs
+            self._reset_attr_cache()
+
+    def clone(self, read_only: bool = False) -> "BCHTMemoryStorage":
+        """Return a copy of the database, without copying the blocks or the attributes.
+        The two are independent afterwards: changes to either are not seen in the other.
+        Use this to share a database built once between tests or benchmarks.
+
+        Parameters
+        ----------
+        read_only : bool, optional
+            Whether the copy refuses writes, by default False
+
+        Returns
+        -------
+        BCHTMemoryStorage
+            The copy.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        other = BCHTMemoryStorage(read_only)
+        with self._lock:
+            other._blocks = self._blocks.clone()  # pylint: disable=protected-access
+            other._attrs = self._attrs.clone()  # pylint: disable=protected-access
+        return other
+
+    def snapshot(self) -> "BCHTMemoryStorage":
+        """Return a read-only view of the database pinned to this moment.
+        Later changes to the database are not seen through it. This is a
+        read-only clone, see clone.
+
+        Returns
+        -------
+        BCHTMemoryStorage
+            The read-only view. Close it when done with it.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return self.clone(read_only=True)
+
+    def compact(self):
+        """Merge the layers left by clones and snapshots into one, dropping the deleted
+        blocks and attributes. The layers stay in memory as long as a clone uses them.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        with self._lock:
+            for layers in (self._blocks, self._attrs):
+                merged = layers.merged()
+                layers.top, layers.frozen = merged, ()
+
+    def memory_usage(self) -> int:
+        """Estimate the memory used by the database, including what is shared with
+        clones. It goes through every block, so it takes time on large databases.
+
+        Returns
+        -------
+        int
+            The number of bytes.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        with self._lock:
+            return self._blocks.memory_usage() + self._attrs.memory_usage()
+
+    def close(self):
+        """Close the database. Clones keep what they share with it."""
+
+        self._closed = True
+        self._blocks = self._attrs = _BCHTLayers()
+
+    @property
+    def closed(self):
+        """Indicates whether the database is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return self._closed
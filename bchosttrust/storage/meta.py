@@ -24,11 +24,36 @@
 import typing
 from abc import abstractmethod, ABCMeta
 
-from ..internal import BCHTBlock
+from ..internal import BCHTBlock, BCHTBlockHeader
+from .. import exceptions
+from .bloom import BCHTBloomFilter
 
+# Entries of the cache of attributes are [content, {parser: parsed content}],
+# with _MISSING as the content of attributes known not to exist. Only
+# attributes read with getattr_cached are ever cached, and setattr and delattr
+# of backends call _cache_attr to update them, so the cache stays small.
+_MISSING = object()
 
-class BCHTStorageBase(metaclass=ABCMeta):
-    """Base class of storage backends"""
+
+class BCHTStorageBase(metaclass=ABCMeta):  # pylint: disable=too-many-public-methods
+    """Base class of storage backends
+
+    Attibutes
+    ---------
+    cache_attrs : bool
+        Whether getattr_cached may keep attributes in memory. Backends whose
+        database can be changed from elsewhere (e.g. other processes) turn this off.
+    thread_safe : bool
+        Whether the backend may be called from several threads at once.
+        Backends locking every call themselves turn this on.
+    """
+
+    cache_attrs: bool = True
+    thread_safe: bool = False
+
+    # The filter built by load_known_hashes, to which backends add the blocks
+    # they put with _add_known_hash
+    _known_hashes: typing.Optional[BCHTBloomFilter] = None
 
     @abstractmethod
     def get(self, block_hash: bytes) -> BCHTBlock:
@@ -176,6 +201,38 @@ class BCHTStorageBase(metaclass=ABCMeta):
             If the database was closed.
         """
 
+    @abstractmethod
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
     @abstractmethod
     def close(self):
         """Close the database."""
@@ -190,3 +247,352 @@ class BCHTStorageBase(metaclass=ABCMeta):
         bool
             If False, the backend is no longer usable.
         """
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return self.get(block_hash).raw
+
+    def contains(self, block_hash: bytes) -> bool:
+        """Check whether a block is in the database, looking up its hash
+        without reading or decoding the block. If load_known_hashes was called,
+        most hashes not in the database are answered from memory.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block.
+
+        Returns
+        -------
+        bool
+            Whether the block is in the database.
+
+        Raises
+        ------
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        known = self._known_hashes
+        if known is not None and block_hash not in known:
+            return False
+        return self._has_block(block_hash)
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        # The lookup behind contains.
+        # Backends able to do better should override this
+        try:
+            self.get_raw(block_hash)
+        except exceptions.BCHTBlockNotFoundError:
+            return False
+        return True
+
+    def _iter_hashes(self) -> typing.Generator[bytes, None, None]:
+        # The hashes of all the blocks, for load_known_hashes.
+        # Backends able to do better should override this
+        for block_hash, _ in self.iter_raw_blocks(fill_cache=False):
+            yield block_hash
+
+    def _add_known_hash(self, block_hash: bytes):
+        # Called by backends for every block they put
+        known = self._known_hashes
+        if known is not None:
+            known.add(block_hash)
+
+    def load_known_hashes(self, error_rate: float = 0.001, headroom: float = 2.0):
+        """Build an in-memory Bloom filter of the hashes of all the blocks,
+        so that contains answers most hashes not in the database without a lookup.
+        The blocks put through this object afterwards are added to it, so call
+        this before sharing the backend between threads. Blocks put by other
+        processes are not seen.
+
+        Parameters
+        ----------
+        error_rate : float, optional
+            The rate of hashes not in the database still looked up, by default 0.001.
+        headroom : float, optional
+            How many times the current number of blocks the filter is sized for,
+            by default 2.0. Beyond that, more hashes are looked up.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        # The hashes are gone through twice rather than kept in memory,
+        # to size the filter first
+        count = sum(1 for _ in self._iter_hashes())
+        known = BCHTBloomFilter(max(int(count * headroom), 1024), error_rate)
+        known.update(self._iter_hashes())
+        self._known_hashes = known
+
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database, without decoding
+        them where the backend can, e.g. when copying blocks from another backend.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes]]
+            The hashes and the raw blocks. The hashes are trusted to match the blocks.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        # Backends able to do better should override this
+        for _, raw in items:
+            self.put(BCHTBlock.from_raw(raw))
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True. Turn this off for full scans, so that they do not
+            push the frequently used blocks out of the cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        # Backends able to do better should override this
+        for key, block in sorted(self.iter_blocks_with_key(), key=lambda item: item[0]):
+            if (start is None or key >= start) and (stop is None or key < stop):
+                yield key, block.raw
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Return a iterable returning the headers of blocks, ordered by their hashes,
+        without decoding the entries.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlockHeader]
+            hash as keys, headers of BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for key, raw in self.iter_raw_blocks(start, stop, fill_cache):
+            yield key, BCHTBlockHeader.from_raw(raw)
+
+    def getattr_cached(
+            self,
+            attr_name: bytes,
+            parser: typing.Optional[typing.Callable[[bytes], typing.Any]] = None) -> typing.Any:
+        """Retrieve an attibute through the cache of attributes, for those read
+        over and over again, e.g. the current blocks. Optionally, the parsed
+        content is cached as well, so that it is only parsed once after each change.
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+        parser : Callable[[bytes], Any], optional
+            The function parsing the content. The result is cached per function,
+            so pass in the same function every time. By default None (not parsed)
+
+        Returns
+        -------
+        Any
+            The content of the attibute, or what parser returned.
+            Do not change it, as the same object is returned every time.
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if not self.cache_attrs:
+            content = self.getattr(attr_name)
+            return content if parser is None else parser(content)
+
+        cache = self.__dict__.setdefault("_attr_cache", {})
+        entry = cache.get(attr_name)
+        if entry is None:
+            try:
+                content = self.getattr(attr_name)
+            except exceptions.BCHTAttributeNotFoundError:
+                content = _MISSING
+            entry = cache[attr_name] = [content, {}]
+        content, parsed = entry
+        if content is _MISSING:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"{attr_name} not found in the database.")
+        if parser is None:
+            return content
+        try:
+            return parsed[parser]
+        except KeyError:
+            value = parsed[parser] = parser(content)
+            return value
+
+    def _cache_attr(self, attr_name: bytes, content: typing.Optional[bytes]):
+        # Write through to the cache of attributes, after setattr (content)
+        # or delattr (None). Backends call this on every change of an attribute.
+        cache = self.__dict__.get("_attr_cache")
+        if cache is not None and attr_name in cache:
+            cache[attr_name] = [_MISSING if content is None else content, {}]
+
+    def _reset_attr_cache(self):
+        # Forget every cached attribute, after changing many of them at once
+        self.__dict__.pop("_attr_cache", None)
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes into the database, e.g. when copying them from another backend.
+        By default they are set one by one.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes | None]]
+            The names and the contents of the attributes,
+            None for the attributes to be deleted if they exist.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for attr_name, content in items:
+            if content is not None:
+                self.setattr(attr_name, content)
+                continue
+            try:
+                self.delattr(attr_name)
+            except KeyError:
+                pass
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace the attributes whose names start with any of prefixes by those
+        whose names start with shadow_prefix + that prefix, with shadow_prefix taken off.
+        The attributes under shadow_prefix are removed afterwards.
+
+        By default the attributes are replaced one by one. Backends able to
+        replace all of them at once, so that readers see either the old or the new
+        attributes but never a mix of them, should override this.
+
+        Parameters
+        ----------
+        shadow_prefix : bytes
+            The prefix the new attributes were written under.
+        prefixes : Iterable[bytes]
+            The prefixes of the names of the attributes to be replaced.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for prefix in prefixes:
+            stale = [key for key, _ in self.iter_attrs(prefix)]
+            fresh = set()
+            for key, content in tuple(self.iter_attrs(shadow_prefix + prefix)):
+                fresh.add(key[len(shadow_prefix):])
+                self.setattr(key[len(shadow_prefix):], content)
+                self.delattr(key)
+            for key in stale:
+                if key not in fresh:
+                    self.delattr(key)
+
+    def compact(self):
+        """Reclaim the space left by deleted blocks and attributes,
+        for backends which do not do so by themselves. By default nothing is done.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+    def snapshot(self) -> "BCHTStorageBase":
+        """Return a read-only view of the database pinned to this moment.
+        Later changes to the database are not seen through it.
+
+        Returns
+        -------
+        BCHTStorageBase
+            The read-only view. Close it when done with it.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        NotImplementedError
+            If the backend does not support snapshots.
+        """
+
+        raise NotImplementedError(f"{self} does not support snapshots.")
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,210 @@
+# bchosttrust/bchosttrust/storage/migrate.py
+"""Copying a database to another storage backend"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# The blocks are copied in their bytes form, in batches and in the order of
+# their hashes, then the attributes in the order of their names. After every
+# batch, the last hash or name copied is recorded in the destination under
+# MIGRATE_CURSOR (b"b" or b"a" followed by it), so that an interrupted migration
+# resumes after it. Writing a batch again is harmless, so the cursor only has
+# to be written after its batch. The source must not be changed meanwhile.
+
+import itertools
+import typing
+from hashlib import sha3_256
+
+from typeguard import typechecked
+
+from .. import exceptions
+from .meta import BCHTStorageBase
+from .sharded import SHARD_COUNT
+
+MIGRATE_CURSOR = b"migrate_cursor"
+
+# Attributes describing the backend rather than the chain, never copied
+LOCAL_ATTRS = (MIGRATE_CURSOR, SHARD_COUNT)
+
+_BLOCKS = b"b"
+_ATTRS = b"a"
+_DONE = b"d"
+
+
+class BCHTMigrateStats(typing.NamedTuple):
+    """The outcome of migrate.
+
+    Attributes
+    ----------
+    blocks : int
+        The number of blocks copied by this call.
+    attrs : int
+        The number of attributes copied by this call.
+    resumed : bool
+        Whether an interrupted migration was resumed.
+    """
+
+    blocks: int
+    attrs: int
+    resumed: bool
+
+
+def _get_cursor(dest: BCHTStorageBase) -> tuple[bytes, typing.Optional[bytes]]:
+    try:
+        cursor = dest.getattr(MIGRATE_CURSOR)
+    except exceptions.BCHTAttributeNotFoundError:
+        return _BLOCKS, None
+    return cursor[:1], cursor[1:]
+
+
+def _batches(iterable: typing.Iterable, size: int) -> typing.Generator[list, None, None]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+@typechecked
+def migrate(
+        source: BCHTStorageBase,
+        dest: BCHTStorageBase,
+        batch_size: int = 1000,
+        verify: bool = True,
+        progress: typing.Optional[typing.Callable[[str, int], typing.Any]] = None) \
+        -> BCHTMigrateStats:
+    """Copy the blocks and the attributes of a database to another storage backend,
+    resuming an interrupted migration to the same destination.
+
+    Parameters
+    ----------
+    source : BCHTStorageBase
+        The storage backend to be copied from. It must not be changed meanwhile.
+    dest : BCHTStorageBase
+        The storage backend to be copied to.
+    batch_size : int, optional
+        The number of blocks or attributes written at once, by default 1000
+    verify : bool, optional
+        Whether to check afterwards that the destination has the same blocks,
+        under hashes matching their contents, and the same attributes. By default True
+    progress : Callable[[str, int], Any], optional
+        Called with "blocks" or "attrs" and the number of them just copied,
+        after every batch. By default None
+
+    Returns
+    -------
+    BCHTMigrateStats
+        The numbers of blocks and attributes copied.
+
+    Raises
+    ------
+    BCHTMigrationError
+        If the destination does not match the source when verified.
+    BCHTOutOfRangeError
+        If batch_size is less than 1.
+    """
+
+    if batch_size < 1:
+        raise exceptions.BCHTOutOfRangeError("The batch size must be at least 1.")
+    stage, last = _get_cursor(dest)
+    resumed = last is not None
+    # The lowest key after the last one copied
+    start = None if last is None else last + b"\x00"
+
+    blocks = 0
+    if stage == _BLOCKS:
+        for batch in _batches(source.iter_raw_blocks(start, fill_cache=False), batch_size):
+            dest.put_raw_many(batch)
+            dest.setattr(MIGRATE_CURSOR, _BLOCKS + batch[-1][0])
+            blocks += len(batch)
+            if progress is not None:
+                progress("blocks", len(batch))
+        stage, start = _ATTRS, None
+
+    attrs = 0
+    if stage == _ATTRS:
+        items = ((name, content) for name, content in source.iter_attrs(start=start)
+                 if name not in LOCAL_ATTRS)
+        for batch in _batches(items, batch_size):
+            dest.setattr_many(batch)
+            dest.setattr(MIGRATE_CURSOR, _ATTRS + batch[-1][0])
+            attrs += len(batch)
+            if progress is not None:
+                progress("attrs", len(batch))
+        dest.setattr(MIGRATE_CURSOR, _DONE)
+
+    if verify:
+        verify_migration(source, dest)
+    dest.delattr(MIGRATE_CURSOR)
+    return BCHTMigrateStats(blocks, attrs, resumed)
+
+
+@typechecked
+def verify_migration(source: BCHTStorageBase, dest: BCHTStorageBase):
+    """Check that two databases have the same blocks and attributes (but LOCAL_ATTRS),
+    and that the blocks of the second one are stored under the hashes of their contents.
+
+    Parameters
+    ----------
+    source : BCHTStorageBase
+        The storage backend copied from.
+    dest : BCHTStorageBase
+        The storage backend copied to.
+
+    Raises
+    ------
+    BCHTMigrationError
+        If they do not match.
+    """
+
+    _verify_blocks(source, dest)
+    _verify_attrs(source, dest)
+
+
+def _verify_blocks(source: BCHTStorageBase, dest: BCHTStorageBase):
+    # Both go through the blocks in the order of their hashes
+    source_count = dest_count = 0
+    source_hashes = (key for key, _ in source.iter_raw_blocks(fill_cache=False))
+    for source_hash, item in itertools.zip_longest(
+            source_hashes, dest.iter_raw_blocks(fill_cache=False)):
+        if source_hash is not None:
+            source_count += 1
+        if item is None:
+            continue
+        dest_count += 1
+        block_hash, raw = item
+        if sha3_256(raw).digest() != block_hash:
+            raise exceptions.BCHTMigrationError(
+                f"Block {block_hash.hex()} does not match its hash in the destination.")
+        if source_hash is not None and source_hash != block_hash:
+            lower = min(source_hash, block_hash)
+            side = "destination" if lower == source_hash else "source"
+            raise exceptions.BCHTMigrationError(
+                f"Block {lower.hex()} is missing from the {side}.")
+    if source_count != dest_count:
+        raise exceptions.BCHTMigrationError(
+            f"{source_count} blocks in the source, but {dest_count} in the destination.")
+
+
+def _verify_attrs(source: BCHTStorageBase, dest: BCHTStorageBase):
+    source_attrs = ((name, content) for name, content in source.iter_attrs()
+                    if name not in LOCAL_ATTRS)
+    dest_attrs = ((name, content) for name, content in dest.iter_attrs()
+                  if name not in LOCAL_ATTRS)
+    for source_attr, dest_attr in itertools.zip_longest(source_attrs, dest_attrs):
+        if source_attr != dest_attr:
+            name = min(attr[0] for attr in (source_attr, dest_attr) if attr is not None)
+            raise exceptions.BCHTMigrationError(f"Attribute {name} differs in the destination.")
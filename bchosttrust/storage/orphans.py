@@ -0,0 +1,227 @@
+# bchosttrust/bchosttrust/storage/orphans.py
+"""Holding blocks which arrive before their previous blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# A persisted pool keeps its blocks in the attribute database, under
+#   ORPHAN_PREFIX + hash -> arrival time (8 bytes, Unix epoch) + raw block
+# so that they survive between runs, e.g. of `bcht import`.
+
+import threading
+import time
+import typing
+from collections import OrderedDict, defaultdict, deque
+
+from typeguard import typechecked
+
+from ..internal.block import BCHTBlock
+from .. import exceptions
+from .meta import BCHTStorageBase
+from .batch import BCHTBatchOverlay
+from .import_block import _import_block, _auto_prune, import_block
+from .chainstate import sync_state
+
+ORPHAN_PREFIX = b"orphan-"
+
+
+@typechecked
+class BCHTOrphanPool:  # pylint: disable=too-many-instance-attributes
+    """Imports blocks in whatever order they arrive. Blocks whose previous
+    block is not found yet are held, and imported together with every block
+    waiting on them once it arrives. It is safe to add blocks from multiple threads.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend the blocks are imported into.
+    max_blocks : int
+        The most blocks held. The oldest ones are evicted first.
+    max_age : float
+        The number of seconds a block is held for at most.
+    persist : bool
+        Whether the blocks held are kept in the attribute database.
+    """
+
+    def __init__(self, backend: BCHTStorageBase,
+                 max_blocks: int = 10000,
+                 max_age: float = 3600.0,
+                 persist: bool = False,
+                 clock: typing.Callable[[], float] = time.time):
+        """Create an orphan pool, loading the blocks held before if persisted.
+
+        Parameters
+        ----------
+        backend : BCHTStorageBase
+            The storage backend the blocks are imported into.
+        max_blocks : int, optional
+            The most blocks held, by default 10000
+        max_age : float, optional
+            The number of seconds a block is held for at most, by default 3600.0
+        persist : bool, optional
+            Whether the blocks held are kept in the attribute database, by default False
+        clock : Callable[[], float], optional
+            The current time in seconds, by default time.time
+        """
+
+        self.backend = backend
+        self.max_blocks = max_blocks
+        self.max_age = max_age
+        self.persist = persist
+        self._clock = clock
+        self._lock = threading.RLock()
+        # Ordered by arrival, so that the oldest blocks come first
+        self._blocks: OrderedDict[bytes, tuple[BCHTBlock, float]] = OrderedDict()
+        self._children: defaultdict[bytes, set[bytes]] = defaultdict(set)
+
+        if persist:
+            loaded = []
+            for key, value in backend.iter_attrs(ORPHAN_PREFIX):
+                loaded.append((int.from_bytes(value[:8]), key[len(ORPHAN_PREFIX):],
+                               BCHTBlock.from_raw(value[8:])))
+            for arrival, block_hash, block in sorted(loaded, key=lambda item: item[0]):
+                self._hold(block_hash, block, float(arrival), write=False)
+            self.expire()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, block_hash: bytes) -> bool:
+        return block_hash in self._blocks
+
+    def _hold(self, block_hash: bytes, block: BCHTBlock, arrival: float, write: bool = True):
+        self._blocks[block_hash] = (block, arrival)
+        self._children[block.prev_hash].add(block_hash)
+        if write and self.persist:
+            self.backend.setattr(ORPHAN_PREFIX + block_hash,
+                                 int(arrival).to_bytes(8) + block.raw)
+
+    def _drop(self, block_hash: bytes,
+              target: typing.Optional[BCHTStorageBase] = None) -> BCHTBlock:
+        # target is where the persisted block is deleted from, by default the backend
+        block, _ = self._blocks.pop(block_hash)
+        siblings = self._children[block.prev_hash]
+        siblings.discard(block_hash)
+        if not siblings:
+            del self._children[block.prev_hash]
+        if self.persist:
+            try:
+                (self.backend if target is None else target).delattr(ORPHAN_PREFIX + block_hash)
+            except KeyError:
+                pass
+        return block
+
+    def expire(self) -> int:
+        """Evict the blocks held for longer than max_age, then the oldest
+        blocks until at most max_blocks are held.
+
+        Returns
+        -------
+        int
+            The number of blocks evicted.
+        """
+
+        with self._lock:
+            evicted = 0
+            deadline = self._clock() - self.max_age
+            while self._blocks:
+                block_hash, (_, arrival) = next(iter(self._blocks.items()))
+                if arrival >= deadline and len(self._blocks) <= self.max_blocks:
+                    break
+                self._drop(block_hash)
+                evicted += 1
+            return evicted
+
+    def add(self, block: BCHTBlock, hold: bool = True) -> tuple[bytes, ...]:
+        """Import a block, or hold it if its previous block is not found yet.
+        If it is imported, the blocks waiting on it are imported as well.
+
+        Parameters
+        ----------
+        block : BCHTBlock
+            The block to be imported.
+        hold : bool, optional
+            Whether to hold the block if its previous block is not found yet,
+            by default True. If False, BCHTOrphanBlockError is raised instead.
+
+        Returns
+        -------
+        tuple[bytes, ...]
+            The hashes of the blocks imported, in the order they were imported.
+            Empty if the block is held.
+
+        Raises
+        ------
+        BCHTConsensusFailedError
+            If the block is invalid. The blocks waiting on it are dropped.
+        BCHTOrphanBlockError
+            If the previous block is not found yet and hold is False.
+        """
+
+        block_hash = block.hash
+        with self._lock:
+            if block_hash in self._blocks:
+                return tuple()
+            try:
+                import_block(self.backend, block)
+            except exceptions.BCHTOrphanBlockError:
+                if not hold:
+                    raise
+                self._hold(block_hash, block, self._clock())
+                self.expire()
+                return tuple()
+            except exceptions.BCHTConsensusFailedError:
+                self._drop_descendants(block_hash)
+                raise
+            return (block_hash, ) + self._release(block_hash)
+
+    def _release(self, parent_hash: bytes) -> tuple[bytes, ...]:
+        # Import the subtree waiting on a newly imported block breadth first
+        # through a BCHTBatchOverlay, together with the removal of the blocks
+        # persisted, moving the materialized state once at the end and writing
+        # everything in one flush, as import_blocks does
+        if parent_hash not in self._children:
+            return tuple()
+        overlay = BCHTBatchOverlay(self.backend)
+        imported = []
+        queue = deque((parent_hash, ))
+        while queue:
+            for block_hash in tuple(self._children.get(queue.popleft(), ())):
+                block = self._drop(block_hash, overlay)
+                try:
+                    _import_block(overlay, block)
+                except exceptions.BCHTConsensusFailedError:
+                    self._drop_descendants(block_hash, overlay)
+                    continue
+                imported.append(block_hash)
+                queue.append(block_hash)
+        if imported:
+            sync_state(overlay)
+        overlay.flush()
+        if imported:
+            _auto_prune(self.backend)
+        return tuple(imported)
+
+    def _drop_descendants(self, block_hash: bytes,
+                          target: typing.Optional[BCHTStorageBase] = None):
+        # Blocks built on an invalid block can never be imported
+        queue = deque((block_hash, ))
+        while queue:
+            for child_hash in tuple(self._children.get(queue.popleft(), ())):
+                self._drop(child_hash, target)
+                queue.append(child_hash)
@@ -0,0 +1,251 @@
+# bchosttrust/bchosttrust/storage/prune.py
+"""Removing stale forks and old blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# A stale fork forks off the main chain at height h if its first block is at h
+# but is not the main chain block there. Both kinds of pruning walk the main
+# chain by height from where they stopped last time (recorded in the attributes
+# below), so running them after every import only costs the new heights.
+#
+# In the pruned mode (PRUNE_KEEP set), import_block removes the main chain
+# blocks more than PRUNE_KEEP blocks below the state tip, together with the
+# forks off them. The materialized state (see chainstate) is what remains of
+# them, so unbounded queries at the state tip still cover the whole chain,
+# while walks along the chain and queries by period only cover the blocks kept.
+# A fork off a removed block can never be imported, as its previous block is gone.
+
+import typing
+
+from typeguard import typechecked
+
+from .. import exceptions
+from .meta import BCHTStorageBase
+from .index import (NULL_HASH, HEIGHT_PREFIX, _key, get_block_meta,
+                    get_children, iter_descendants)
+from .chainstate import get_state_tip, iter_main_chain
+from .import_block import get_best_hash, remove_block
+
+# The lowest height of the main chain not checked for stale forks yet
+STALE_CHECKED_HEIGHT = b"prune_stale_height"
+# The lowest height of the main chain still stored
+PRUNED_HEIGHT = b"prune_height"
+# The number of main chain blocks kept in the pruned mode
+PRUNE_KEEP = b"prune_keep"
+
+
+def _get_int(backend: BCHTStorageBase, attr_name: bytes) -> typing.Optional[int]:
+    try:
+        return backend.getattr_cached(attr_name, int.from_bytes)
+    except exceptions.BCHTAttributeNotFoundError:
+        return None
+
+
+def _remove_fork(backend: BCHTStorageBase, block_hash: bytes) -> list[bytes]:
+    # Remove a block with every block built on it, the newest blocks first
+    hashes = [block_hash]
+    hashes.extend(iter_descendants(backend, block_hash))
+    for fork_hash in reversed(hashes):
+        remove_block(backend, fork_hash)
+    return hashes
+
+
+@typechecked
+def get_pruned_height(backend: BCHTStorageBase) -> int:
+    """Get the lowest height of the main chain still stored.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Returns
+    -------
+    int
+        The height, 0 if the old blocks were never pruned.
+    """
+
+    return _get_int(backend, PRUNED_HEIGHT) or 0
+
+
+@typechecked
+def get_prune_keep(backend: BCHTStorageBase) -> typing.Optional[int]:
+    """Get the number of main chain blocks kept in the pruned mode.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+
+    Returns
+    -------
+    int | None
+        The number of blocks, or None if the database is not in the pruned mode.
+    """
+
+    return _get_int(backend, PRUNE_KEEP)
+
+
+@typechecked
+def set_prune_keep(backend: BCHTStorageBase, keep: typing.Optional[int]):
+    """Turn the pruned mode on or off. Turning it on does not prune
+    until the next import, see prune_history to prune at once.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    keep : int | None
+        The number of main chain blocks to be kept below the state tip (inclusive),
+        or None to turn the pruned mode off. Blocks already removed are not restored.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If keep is less than 1.
+    """
+
+    if keep is None:
+        try:
+            backend.delattr(PRUNE_KEEP)
+        except KeyError:
+            pass
+        return
+    if keep < 1:
+        raise exceptions.BCHTOutOfRangeError("At least one block must be kept.")
+    backend.setattr(PRUNE_KEEP, keep.to_bytes(8))
+
+
+@typechecked
+def prune_stale_forks(
+        backend: BCHTStorageBase,
+        depth: int = 100,
+        full: bool = False,
+        compact: bool = True) -> tuple[bytes, ...]:
+    """Remove the forks off the main chain more than depth blocks below the best tip,
+    together with their index records.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    depth : int, optional
+        How far below the best tip a fork must start to be removed, by default 100
+    full : bool, optional
+        Whether to check the whole main chain, instead of only the heights not
+        checked before. Forks arriving late, i.e. after their height was checked,
+        are only found this way. By default False
+    compact : bool, optional
+        Whether to compact the database afterwards, by default True
+
+    Returns
+    -------
+    tuple[bytes, ...]
+        The hashes of the blocks removed.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If depth is less than 1.
+    """
+
+    if depth < 1:
+        raise exceptions.BCHTOutOfRangeError("The depth must be at least 1.")
+    best_hash = get_best_hash(backend)
+    if best_hash == NULL_HASH:
+        return tuple()
+    stop = get_block_meta(backend, best_hash).height - depth + 1
+    start = 0 if full else _get_int(backend, STALE_CHECKED_HEIGHT) or 0
+    pruned_height = get_pruned_height(backend)
+    if pruned_height > 0:
+        # The forks off removed blocks were removed with them
+        start = max(start, pruned_height + 1)
+
+    removed = []
+    main = dict(iter_main_chain(backend, start - 1, stop))
+    for height in range(start, stop):
+        parent = NULL_HASH if height == 0 else main[height - 1]
+        for child in get_children(backend, parent):
+            if child != main[height]:
+                removed.extend(_remove_fork(backend, child))
+    if stop > start:
+        backend.setattr(STALE_CHECKED_HEIGHT, stop.to_bytes(8))
+
+    if compact and removed:
+        backend.compact()
+    return tuple(removed)
+
+
+@typechecked
+def prune_history(
+        backend: BCHTStorageBase,
+        keep: int,
+        compact: bool = True) -> tuple[bytes, ...]:
+    """Remove the main chain blocks more than keep blocks below the state tip,
+    together with their index records and the forks off them.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    keep : int
+        The number of main chain blocks to be kept below the state tip (inclusive).
+    compact : bool, optional
+        Whether to compact the database afterwards, by default True
+
+    Returns
+    -------
+    tuple[bytes, ...]
+        The hashes of the blocks removed.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If keep is less than 1.
+    """
+
+    if keep < 1:
+        raise exceptions.BCHTOutOfRangeError("At least one block must be kept.")
+    state_tip = get_state_tip(backend)
+    if state_tip == NULL_HASH:
+        return tuple()
+    stop = get_block_meta(backend, state_tip).height - keep + 1
+    start = get_pruned_height(backend)
+    if stop <= start:
+        return tuple()
+
+    removed = []
+    main = dict(iter_main_chain(backend, start, stop + 1))
+    if start == 0:
+        # Other genesis blocks
+        for child in get_children(backend, NULL_HASH):
+            if child != main[0]:
+                removed.extend(_remove_fork(backend, child))
+    for height in range(start, stop):
+        for child in get_children(backend, main[height]):
+            if child != main[height + 1]:
+                removed.extend(_remove_fork(backend, child))
+        remove_block(backend, main[height])
+        backend.delattr(_key(HEIGHT_PREFIX, height.to_bytes(8)))
+        removed.append(main[height])
+    backend.setattr(PRUNED_HEIGHT, stop.to_bytes(8))
+
+    if compact:
+        backend.compact()
+    return tuple(removed)
@@ -0,0 +1,384 @@
+# bchosttrust/bchosttrust/storage/reindex.py
+"""Rebuilding the indexes from the stored blocks"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Everything derived from the blocks (the index records, the materialized
+# state, the current blocks and the best tip) is rebuilt under SHADOW_PREFIX,
+# through a BCHTShadowStorage, while readers keep using the old attributes.
+# BCHTStorageBase.swap_attrs then replaces the old attributes at the end,
+# in one write for the backends able to do so.
+#
+# The blocks are read in two passes. The first one reads only the headers,
+# to find the height of every block. In the second one, a pool of workers
+# writes the records of the blocks as they are read, and the metadata
+# (which needs the cumulative work of the previous block) is written after it.
+# Blocks imported meanwhile are caught up with before switching over,
+# but imports should be paused for the switch itself, or the blocks imported
+# during it are left out until they are built on.
+
+import typing
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from typeguard import typechecked
+
+from .. import exceptions
+from .. import BCHTBlock
+from ..internal import BCHTBlockHeader
+from ..consensus.powc import get_block_work
+from .meta import BCHTStorageBase
+from .index import (NULL_HASH, META_PREFIX, CHILD_PREFIX, DOMAIN_PREFIX, HEIGHT_PREFIX,
+                    TIME_PREFIX, INDEX_COMPLETE, BCHTBlockMeta, _key, _index_records,
+                    ensure_indexed)
+from .chainstate import STATE_TIP, TALLY_PREFIX, sync_state
+from .import_block import (TIP_PREFIX, TIP_HASH_PREFIX, TIP_RANGE, LEGACY_CURR_HASHES,
+                           BEST_HASH, get_best_hash, update_best_tip)
+from .prune import STALE_CHECKED_HEIGHT, get_pruned_height
+
+SHADOW_PREFIX = b"reindex-"
+
+# The prefixes of the attributes rebuilt
+INDEX_PREFIXES = (META_PREFIX, CHILD_PREFIX, DOMAIN_PREFIX, HEIGHT_PREFIX, TIME_PREFIX,
+                  STATE_TIP, TALLY_PREFIX, b"prev_hash", TIP_PREFIX, TIP_HASH_PREFIX,
+                  TIP_RANGE, LEGACY_CURR_HASHES, BEST_HASH, STALE_CHECKED_HEIGHT,
+                  INDEX_COMPLETE)
+
+
+class BCHTReindexStats(typing.NamedTuple):
+    """The outcome of reindex.
+
+    Attributes
+    ----------
+    indexed : int
+        The number of blocks indexed.
+    skipped : int
+        The number of blocks left out, as their previous blocks are missing.
+    """
+
+    indexed: int
+    skipped: int
+
+
+@typechecked
+class BCHTShadowStorage(BCHTStorageBase):  # pylint: disable=abstract-method
+    """View of a storage backend reading its blocks, but keeping
+    its own attributes under a prefix of the attributes of the backend.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend the blocks are read from.
+    prefix : bytes
+        The prefix of the names of the attributes of this view.
+    """
+
+    # The attributes are changed behind the backend
+    cache_attrs = False
+
+    def __init__(self, backend: BCHTStorageBase, prefix: bytes = SHADOW_PREFIX):
+        self.backend = backend
+        self.prefix = prefix
+
+    def __str__(self):
+        return f"<BCHTShadowStorage, backend={self.backend}, prefix={self.prefix}>"
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block from the backend, see BCHTStorageBase.get."""
+        return self.backend.get(block_hash)
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form from the backend, see BCHTStorageBase.get_raw."""
+        return self.backend.get_raw(block_hash)
+
+    def put(self, block_data: BCHTBlock):
+        """Not supported, as the blocks are read-only through this view.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Blocks are read-only through shadow views.")
+
+    def delete(self, block_hash: bytes):
+        """Not supported, as the blocks are read-only through this view.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Blocks are read-only through shadow views.")
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Go through the blocks of the backend, see BCHTStorageBase.iter_blocks."""
+        yield from self.backend.iter_blocks()
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Go through the blocks of the backend, see BCHTStorageBase.iter_blocks_with_key."""
+        yield from self.backend.iter_blocks_with_key()
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Go through the blocks of the backend in their bytes form,
+        see BCHTStorageBase.iter_raw_blocks."""
+        yield from self.backend.iter_raw_blocks(start, stop, fill_cache)
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Go through the headers of the blocks of the backend,
+        see BCHTStorageBase.iter_headers."""
+        yield from self.backend.iter_headers(start, stop, fill_cache)
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute of this view, see BCHTStorageBase.getattr."""
+        return self.backend.getattr(self.prefix + attr_name)
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute of this view, see BCHTStorageBase.setattr."""
+        self.backend.setattr(self.prefix + attr_name, content)
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute of this view, see BCHTStorageBase.delattr."""
+        self.backend.delattr(self.prefix + attr_name)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Go through the attributes of this view, see BCHTStorageBase.iter_attrs."""
+        for key, content in self.backend.iter_attrs(
+                self.prefix + prefix,
+                None if start is None else self.prefix + start,
+                None if stop is None else self.prefix + stop,
+                reverse):
+            yield key[len(self.prefix):], content
+
+    def close(self):
+        """Nothing to be done, as the backend is not owned by this view."""
+
+    @property
+    def closed(self) -> bool:
+        """Indicates whether the backend is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return self.backend.closed
+
+
+def _find_heights(backend: BCHTStorageBase) \
+        -> tuple[dict[bytes, BCHTBlockHeader], defaultdict[bytes, list], dict[bytes, int]]:
+    # Read the headers, and find the height of every block reachable
+    # from the genesis blocks. The heights are in order, parents before children.
+    headers: dict[bytes, BCHTBlockHeader] = {}
+    children = defaultdict(list)
+    for block_hash, header in backend.iter_headers(fill_cache=False):
+        headers[block_hash] = header
+        children[header.prev_hash].append(block_hash)
+    heights: dict[bytes, int] = {}
+    generation, height = children[NULL_HASH], 0
+    while generation:
+        for block_hash in generation:
+            heights[block_hash] = height
+        generation = [child for block_hash in generation for child in children[block_hash]]
+        height += 1
+    return headers, children, heights
+
+
+def _index_chunk(
+        view: BCHTShadowStorage,
+        chunk: list[tuple[bytes, BCHTBlock]],
+        heights: dict[bytes, int]) -> list[tuple[bytes, int, int]]:
+    # Run by the workers, returning what the metadata needs from the blocks
+    for block_hash, block in chunk:
+        _index_records(view, block, block_hash, heights[block_hash])
+    return [(block_hash, len(block.entries), get_block_work(block)) for block_hash, block in chunk]
+
+
+def _index_blocks(
+        view: BCHTShadowStorage,
+        heights: dict[bytes, int],
+        workers: int,
+        chunk_size: int,
+        progress: typing.Optional[typing.Callable[[int, int], typing.Any]]) \
+        -> dict[bytes, tuple[int, int]]:
+    # Write the records while reading the blocks,
+    # returning the entry count and the work of every block
+    found: dict[bytes, tuple[int, int]] = {}
+
+    def collect(future: Future):
+        for block_hash, entry_count, block_work in future.result():
+            found[block_hash] = entry_count, block_work
+        if progress is not None:
+            progress(len(found), len(heights))
+
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque()
+        chunk = []
+        for block_hash, block in view.iter_blocks_with_key():
+            if block_hash not in heights:
+                continue
+            chunk.append((block_hash, block))
+            if len(chunk) >= chunk_size:
+                pending.append(executor.submit(_index_chunk, view, chunk, heights))
+                chunk = []
+                # Keep the blocks read ahead of the workers bounded
+                while len(pending) > 2 * workers:
+                    collect(pending.popleft())
+        if chunk:
+            pending.append(executor.submit(_index_chunk, view, chunk, heights))
+        while pending:
+            collect(pending.popleft())
+    return found
+
+
+def _index_metas(
+        view: BCHTShadowStorage,
+        headers: dict[bytes, BCHTBlockHeader],
+        heights: dict[bytes, int],
+        found: dict[bytes, tuple[int, int]]) -> dict[bytes, int]:
+    # Write the metadata, accumulating the work from the genesis blocks,
+    # and return the cumulative work of every block indexed
+    works = {NULL_HASH: 0}
+    for block_hash in heights:
+        header = headers[block_hash]
+        if block_hash not in found or header.prev_hash not in works:
+            continue  # Deleted meanwhile
+        entry_count, block_work = found[block_hash]
+        works[block_hash] = works[header.prev_hash] + block_work
+        meta = BCHTBlockMeta(header.prev_hash, heights[block_hash], header.creation_time,
+                             entry_count, works[block_hash])
+        view.setattr(_key(META_PREFIX, block_hash), meta.raw)
+    del works[NULL_HASH]
+    return works
+
+
+def _catch_up(
+        backend: BCHTStorageBase,
+        view: BCHTShadowStorage,
+        works: dict[bytes, int]) -> tuple[int, int]:
+    # Index the blocks imported meanwhile, returning their number
+    # and the number of blocks whose previous blocks are missing
+    skipped = 0
+    late = []
+    for block_hash, _ in backend.iter_headers(fill_cache=False):
+        if block_hash in works:
+            continue
+        try:
+            late.append((ensure_indexed(view, block_hash), block_hash))
+        except exceptions.BCHTBlockNotFoundError:
+            skipped += 1
+    late.sort(key=lambda item: item[0].height)
+    for meta, block_hash in late:
+        update_best_tip(view, backend.get(block_hash), meta)
+    return len(late), skipped
+
+
+def _set_tips(
+        backend: BCHTStorageBase,
+        view: BCHTShadowStorage,
+        works: dict[bytes, int],
+        heights: dict[bytes, int],
+        siblings: typing.Callable[[bytes], list[bytes]]):
+    # The same best tip unless another one has more work, and the blocks
+    # on the same previous block as it are the current blocks
+    best_work = max(works.values())
+    best_hash = get_best_hash(backend)
+    if works.get(best_hash) != best_work:
+        best_hash = next(h for h in heights if works.get(h) == best_work)
+    for block_hash in [best_hash] + [h for h in siblings(best_hash) if h != best_hash]:
+        if block_hash in works:
+            update_best_tip(view, backend.get(block_hash), ensure_indexed(view, block_hash))
+
+
+@typechecked
+def reindex(
+        backend: BCHTStorageBase,
+        workers: int = 4,
+        chunk_size: int = 256,
+        progress: typing.Optional[typing.Callable[[int, int], typing.Any]] = None) \
+        -> BCHTReindexStats:
+    """Rebuild everything derived from the blocks (the index records, the materialized
+    state, the current blocks and the best tip) and switch over to it at the end.
+    Until then, readers are served from the old attributes.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    workers : int, optional
+        The number of threads writing the index records, by default 4
+    chunk_size : int, optional
+        The number of blocks handed to a worker at once, by default 256
+    progress : Callable[[int, int], Any], optional
+        Called with the number of blocks indexed so far and the number of
+        blocks to be indexed, after every chunk. By default None
+
+    Returns
+    -------
+    BCHTReindexStats
+        The numbers of blocks indexed and left out.
+
+    Raises
+    ------
+    ValueError
+        If old blocks were pruned, as the state cannot be rebuilt without them.
+    BCHTOutOfRangeError
+        If workers or chunk_size is less than 1.
+    """
+
+    if workers < 1 or chunk_size < 1:
+        raise exceptions.BCHTOutOfRangeError(
+            "There must be at least one worker and one block per chunk.")
+    if get_pruned_height(backend) > 0:
+        raise ValueError(
+            "The database was pruned, and the state cannot be rebuilt without the old blocks.")
+
+    # Leftovers of an interrupted run
+    for key, _ in tuple(backend.iter_attrs(SHADOW_PREFIX)):
+        backend.delattr(key)
+    view = BCHTShadowStorage(backend, SHADOW_PREFIX)
+
+    headers, children, heights = _find_heights(backend)
+    found = _index_blocks(view, heights, workers, chunk_size, progress)
+    works = _index_metas(view, headers, heights, found)
+    if works:
+        _set_tips(backend, view, works, heights,
+                  lambda block_hash: children[headers[block_hash].prev_hash])
+
+    late, skipped = _catch_up(backend, view, works)
+    sync_state(view)
+    view.setattr(INDEX_COMPLETE, b"1")
+    backend.swap_attrs(SHADOW_PREFIX, INDEX_PREFIXES)
+    return BCHTReindexStats(len(works) + late, skipped)
@@ -0,0 +1,135 @@
+# bchosttrust/bchosttrust/storage/scan.py
+"""Paginated scans over the blocks of a storage backend"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Blocks are scanned in the order of their hashes. A cursor is the lowest
+# hash the next page may start from, i.e. the last hash returned plus a null
+# byte, so it stays valid even if blocks are added or removed in between.
+
+import itertools
+import typing
+
+from typeguard import typechecked
+
+from .meta import BCHTStorageBase
+from .. import exceptions
+
+
+class BCHTScanPage(typing.NamedTuple):
+    """A page of a scan over the blocks.
+
+    Attributes
+    ----------
+    items : tuple
+        The hashes of the blocks with their bytes forms or headers.
+    cursor : bytes | None
+        The cursor to be passed in to get the next page,
+        or None if this is the last page.
+    """
+
+    items: tuple
+    cursor: typing.Optional[bytes]
+
+
+def _check_limit(limit: int):
+    if limit < 1:
+        raise exceptions.BCHTOutOfRangeError(
+            f"The limit must be at least 1, not {limit}.")
+
+
+def _page(items: typing.Iterator[tuple[bytes, typing.Any]], limit: int) -> BCHTScanPage:
+    page = tuple(itertools.islice(items, limit))
+    if len(page) < limit:
+        return BCHTScanPage(page, None)
+    return BCHTScanPage(page, page[-1][0] + b"\x00")
+
+
+@typechecked
+def scan_raw_blocks(
+        backend: BCHTStorageBase,
+        cursor: typing.Optional[bytes] = None,
+        limit: int = 1000,
+        stop: typing.Optional[bytes] = None,
+        fill_cache: bool = False) -> BCHTScanPage:
+    """Get a page of blocks in their bytes form, ordered by their hashes.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    cursor : bytes, optional
+        The cursor returned with the previous page, by default None (the first page)
+    limit : int, optional
+        The maximum number of blocks in the page, by default 1000
+    stop : bytes, optional
+        If given, only hashes lower than it are returned (exclusive).
+    fill_cache : bool, optional
+        Whether the blocks read should be kept in the cache of the backend, by default False
+
+    Returns
+    -------
+    BCHTScanPage
+        The page, with (hash, raw block) items.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If limit is less than 1.
+    """
+
+    _check_limit(limit)
+    return _page(backend.iter_raw_blocks(cursor, stop, fill_cache), limit)
+
+
+@typechecked
+def scan_headers(
+        backend: BCHTStorageBase,
+        cursor: typing.Optional[bytes] = None,
+        limit: int = 1000,
+        stop: typing.Optional[bytes] = None,
+        fill_cache: bool = False) -> BCHTScanPage:
+    """Get a page of block headers, ordered by the hashes of the blocks.
+
+    Parameters
+    ----------
+    backend : BCHTStorageBase
+        The storage backend to be used.
+    cursor : bytes, optional
+        The cursor returned with the previous page, by default None (the first page)
+    limit : int, optional
+        The maximum number of blocks in the page, by default 1000
+    stop : bytes, optional
+        If given, only hashes lower than it are returned (exclusive).
+    fill_cache : bool, optional
+        Whether the blocks read should be kept in the cache of the backend, by default False
+
+    Returns
+    -------
+    BCHTScanPage
+        The page, with (hash, BCHTBlockHeader) items.
+
+    Raises
+    ------
+    BCHTOutOfRangeError
+        If limit is less than 1.
+    """
+
+    _check_limit(limit)
+    return _page(backend.iter_headers(cursor, stop, fill_cache), limit)
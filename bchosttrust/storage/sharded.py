@@ -0,0 +1,563 @@
+# bchosttrust/bchosttrust/storage/sharded.py
+"""Storage backend spreading blocks over several LevelDBs"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Blocks are routed by the first byte of their hashes: shard i of n holds the
+# hashes from i * 256 // n up to (i + 1) * 256 // n. As every shard holds a
+# contiguous range of hashes, going through the shards one after another
+# returns the blocks ordered by their hashes, like a single LevelDB would.
+#
+# The attributes are all kept in one shard (by default the first one),
+# which also records the number of shards, so that a database is not
+# accidentally opened with blocks routed to the wrong shards.
+
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha3_256
+
+from typeguard import typechecked
+
+from .meta import BCHTStorageBase
+from .leveldb import BCHTLevelDBStorage
+from .snapshot import BCHTCopyOnWriteMixin
+from .. import exceptions
+from .. import BCHTBlock
+from ..internal import BCHTBlockHeader
+
+SHARD_COUNT = b"shard_count"
+
+
+@typechecked
+class BCHTShardedStorage(BCHTCopyOnWriteMixin, BCHTStorageBase):  # pylint: disable=too-many-public-methods
+    """BCHT sharded LevelDB storage backend
+
+    Writes to different shards do not wait for each other, and every shard
+    is compacted on its own, possibly on a different disk.
+
+    Attibutes
+    ---------
+    shards : tuple[BCHTLevelDBStorage, ...]
+        The LevelDB backends holding the blocks, in the order of their hash ranges.
+    attr_shard : int
+        The index of the shard holding the attributes.
+    """
+
+    def __init__(self, shards: typing.Sequence[BCHTLevelDBStorage], attr_shard: int = 0):
+        if not 1 <= len(shards) <= 256:
+            raise exceptions.BCHTOutOfRangeError(
+                "The number of shards must be within the range of 1 to 256.")
+        self.shards = tuple(shards)
+        self.attr_shard = attr_shard
+        self._attrs = self.shards[attr_shard]
+
+        try:
+            count = int(self._attrs.getattr(SHARD_COUNT))
+        except exceptions.BCHTAttributeNotFoundError:
+            count = None
+        if count is None:
+            if any(True for shard in self.shards for _ in shard.iter_raw_blocks()):
+                raise ValueError(
+                    "The attribute shard does not record the number of shards.")
+            self._attrs.setattr(SHARD_COUNT, str(len(self.shards)).encode("ascii"))
+        elif count != len(self.shards):
+            raise ValueError(
+                f"The database has {count} shards, but {len(self.shards)} are given.")
+
+    def __str__(self):
+        return f"<BCHTShardedStorage, shards={len(self.shards)}>"
+
+    @classmethod
+    def init_db(cls, names: typing.Sequence[str], attr_shard: int = 0, **kwargs) -> typing.Self:
+        """Create a BCHT sharded storage backend with one LevelDB per name,
+        opened with the other parameters passed into BCHTLevelDBStorage.init_db,
+        i.e. codec and those of the plyvel.DB constructor.
+        See https://plyvel.readthedocs.io/en/latest/api.html#DB.__init__
+        for what to pass into this function.
+
+        Parameters
+        ----------
+        names : Sequence[str]
+            The names (directory names) of the LevelDBs, one per shard.
+        attr_shard : int, optional
+            The index of the shard holding the attributes, by default 0
+
+        Returns
+        -------
+        BCHTShardedStorage
+            The storage backend object.
+        """
+
+        return cls(tuple(BCHTLevelDBStorage.init_db(name=name, **kwargs) for name in names),
+                   attr_shard=attr_shard)
+
+    def _shard_index(self, block_hash: bytes) -> int:
+        return block_hash[0] * len(self.shards) // 256
+
+    def _shard(self, block_hash: bytes) -> BCHTLevelDBStorage:
+        return self.shards[self._shard_index(block_hash)]
+
+    def put(self, block_data: BCHTBlock):
+        """Put the given block into the database.
+
+        Parameters
+        ----------
+        block_data : BCHTBlock
+            The BCHTBlock object to be stored.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        raw = block_data.raw
+        block_hash = sha3_256(raw).digest()
+        self._preserve_block(block_hash)
+        self._shard(block_hash)._write_raw(  # pylint: disable=protected-access
+            ((block_hash, raw), ))
+
+    def put_many(self, blocks: typing.Iterable[BCHTBlock]):
+        """Put the given blocks into the database,
+        writing to all the shards at the same time.
+
+        Parameters
+        ----------
+        blocks : Iterable[BCHTBlock]
+            The BCHTBlock objects to be stored.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        raws = (block.raw for block in blocks)
+        self.put_raw_many((sha3_256(raw).digest(), raw) for raw in raws)
+
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database, without decoding
+        them, writing to all the shards at the same time.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes]]
+            The hashes and the raw blocks. The hashes are trusted to match the blocks.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        groups = tuple([] for _ in self.shards)
+        for block_hash, raw in items:
+            self._preserve_block(block_hash)
+            groups[self._shard_index(block_hash)].append((block_hash, raw))
+
+        with ThreadPoolExecutor(len(self.shards)) as executor:
+            # plyvel lets go of the GIL while writing, so the shards are written in parallel
+            for future in tuple(executor.submit(shard._write_raw, group)  # pylint: disable=protected-access
+                                for shard, group in zip(self.shards, groups) if group):
+                future.result()
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return BCHTBlock.from_raw(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        return self._shard(block_hash).get_raw(block_hash)
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        # Through the filter of the shard, see load_known_hashes
+        return self._shard(block_hash).contains(block_hash)
+
+    def load_known_hashes(self, error_rate: float = 0.001, headroom: float = 2.0):
+        """Build an in-memory Bloom filter of the hashes of the blocks in every shard,
+        see BCHTStorageBase.load_known_hashes. The shards keep them up to date.
+
+        Parameters
+        ----------
+        error_rate : float, optional
+            The rate of hashes not in the database still looked up, by default 0.001.
+        headroom : float, optional
+            How many times the current number of blocks the filters are sized for,
+            by default 2.0.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for shard in self.shards:
+            shard.load_known_hashes(error_rate, headroom)
+
+    def delete(self, block_hash: bytes):
+        """Delete a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : str
+            The hexadecimal hash of the block wanted.
+
+        Raises
+        ------
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        self._preserve_block(block_hash)
+        self._shard(block_hash).delete(block_hash)
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        for _, raw in self.iter_raw_blocks():
+            yield BCHTBlock.from_raw(raw)
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes,
+        with keys.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        for key, raw in self.iter_raw_blocks():
+            yield key, BCHTBlock.from_raw(raw)
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True. Turn this off for full scans, so that they do not
+            push the frequently used blocks out of the cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        if stop == b"":
+            return
+        # Only the shards whose ranges overlap [start, stop) are visited
+        first = 0 if not start else self._shard_index(start)
+        last = len(self.shards) - 1 if stop is None else self._shard_index(stop)
+        for shard in self.shards[first:last + 1]:
+            yield from shard.iter_raw_blocks(start, stop, fill_cache)
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Return a iterable returning the headers of blocks, ordered by their hashes,
+        without decoding the entries.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlockHeader]
+            hash as keys, headers of BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for key, raw in self.iter_raw_blocks(start, stop, fill_cache):
+            yield key, BCHTBlockHeader.from_raw(raw)
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return self._attrs.getattr(attr_name)
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute into the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+        content : bytes
+            Contents to be stored
+
+        Raises
+        ------
+        ValueError
+            If the data or key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._preserve_attr(attr_name)
+        self._attrs.setattr(attr_name, content)
+        self._cache_attr(attr_name, content)
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Raises
+        ------
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._preserve_attr(attr_name)
+        self._attrs.delattr(attr_name)
+        self._cache_attr(attr_name, None)
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        yield from self._attrs.iter_attrs(prefix, start, stop, reverse)
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes into the database in one batch.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes | None]]
+            The names and the contents of the attributes,
+            None for the attributes to be deleted if they exist.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        items = tuple(items)
+        for attr_name, _ in items:
+            self._preserve_attr(attr_name)
+        self._attrs.setattr_many(items)
+        for attr_name, content in items:
+            self._cache_attr(attr_name, content)
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace the attributes whose names start with any of prefixes by those
+        whose names start with shadow_prefix + that prefix, with shadow_prefix taken off,
+        in one write. Readers see either the old or the new attributes.
+
+        Parameters
+        ----------
+        shadow_prefix : bytes
+            The prefix the new attributes were written under.
+        prefixes : Iterable[bytes]
+            The prefixes of the names of the attributes to be replaced.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        prefixes = tuple(prefixes)
+        for prefix in prefixes:
+            for key, _ in self._attrs.iter_attrs(prefix):
+                self._preserve_attr(key)
+            for key, _ in self._attrs.iter_attrs(shadow_prefix + prefix):
+                self._preserve_attr(key[len(shadow_prefix):])
+        self._attrs.swap_attrs(shadow_prefix, prefixes)
+        self._reset_attr_cache()
+
+    def compact(self):
+        """Compact all the shards at the same time.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        with ThreadPoolExecutor(len(self.shards)) as executor:
+            for future in tuple(executor.submit(shard.compact) for shard in self.shards):
+                future.result()
+
+    def close(self):
+        """Close all the shards."""
+
+        for shard in self.shards:
+            shard.close()
+
+    @property
+    def closed(self):
+        """Indicates whether the database is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return any(shard.closed for shard in self.shards)
@@ -0,0 +1,342 @@
+# bchosttrust/bchosttrust/storage/snapshot.py
+"""Copy-on-write read-only views of storage backends"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# A view reads through to its backend, except for the blocks and attributes
+# changed since the view was taken. Right before changing one of them,
+# the backend hands its old version (or _MISSING if it did not exist)
+# to every open view, so that only what gets changed is ever copied.
+
+import heapq
+import typing
+import weakref
+
+from typeguard import typechecked
+
+from .meta import BCHTStorageBase
+from .. import exceptions
+from .. import BCHTBlock
+
+_MISSING = None
+
+
+class BCHTCopyOnWriteMixin:  # pylint: disable=too-few-public-methods
+    """Mixin providing BCHTStorageBase.snapshot with copy-on-write views.
+    Backends using it must call _preserve_block and _preserve_attr
+    right before changing a block or an attribute."""
+
+    def snapshot(self) -> "BCHTCopyOnWriteSnapshot":
+        """Return a read-only view of the database pinned to this moment.
+        Later changes to the database are not seen through it.
+
+        Returns
+        -------
+        BCHTCopyOnWriteSnapshot
+            The read-only view. Close it when done with it.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        snapshot = BCHTCopyOnWriteSnapshot(self)
+        self.__dict__.setdefault("_snapshots", weakref.WeakSet()).add(snapshot)
+        return snapshot
+
+    def _preserve_block(self, block_hash: bytes):
+        for snapshot in tuple(self.__dict__.get("_snapshots", ())):
+            snapshot.preserve_block(block_hash)
+
+    def _preserve_attr(self, attr_name: bytes):
+        for snapshot in tuple(self.__dict__.get("_snapshots", ())):
+            snapshot.preserve_attr(attr_name)
+
+
+@typechecked
+# Snapshots of snapshots are not supported
+class BCHTCopyOnWriteSnapshot(BCHTStorageBase):  # pylint: disable=abstract-method
+    """Read-only view of a storage backend as of the moment it was taken,
+    returned by BCHTCopyOnWriteMixin.snapshot.
+
+    Attibutes
+    ---------
+    backend : BCHTStorageBase
+        The storage backend this view is taken from.
+    """
+
+    def __init__(self, backend: BCHTStorageBase):
+        if backend.closed:
+            raise exceptions.BCHTDatabaseClosedError("Database is closed.")
+        self.backend = backend
+        self._blocks: dict[bytes, typing.Optional[BCHTBlock]] = {}
+        self._attrs: dict[bytes, typing.Optional[bytes]] = {}
+        self._closed = False
+
+    def __str__(self):
+        return f"<BCHTCopyOnWriteSnapshot, backend={self.backend}>"
+
+    def preserve_block(self, block_hash: bytes):
+        """Keep the current version of a block, which is about to be changed.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hash of the block.
+        """
+
+        if self._closed or block_hash in self._blocks:
+            return
+        try:
+            self._blocks[block_hash] = self.backend.get(block_hash)
+        except exceptions.BCHTBlockNotFoundError:
+            self._blocks[block_hash] = _MISSING
+
+    def preserve_attr(self, attr_name: bytes):
+        """Keep the current version of an attribute, which is about to be changed.
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attribute.
+        """
+
+        if self._closed or attr_name in self._attrs:
+            return
+        try:
+            self._attrs[attr_name] = self.backend.getattr(attr_name)
+        except exceptions.BCHTAttributeNotFoundError:
+            self._attrs[attr_name] = _MISSING
+
+    def _check_open(self):
+        if self.closed:
+            raise exceptions.BCHTDatabaseClosedError("Snapshot is closed.")
+
+    def put(self, block_data: BCHTBlock):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        if block_hash not in self._blocks:
+            return self.backend.get(block_hash)
+        block = self._blocks[block_hash]
+        if block is _MISSING:
+            raise exceptions.BCHTBlockNotFoundError(
+                f"{block_hash} not found in the database.")
+        return block
+
+    def delete(self, block_hash: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        for _, block in self.iter_blocks_with_key():
+            yield block
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, unordered, with keys.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        # Iterations over the backends do not see changes made after they start,
+        # so everything changed after this point is still the same as in the view.
+        preserved = dict(self._blocks)
+        for key, block in self.backend.iter_blocks_with_key():
+            if key not in preserved:
+                yield key, block
+        for key, block in preserved.items():
+            if block is not _MISSING:
+                yield key, block
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        if attr_name not in self._attrs:
+            return self.backend.getattr(attr_name)
+        content = self._attrs[attr_name]
+        if content is _MISSING:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"{attr_name} not found in the database.")
+        return content
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def delattr(self, attr_name: bytes):
+        """Not supported, as snapshots are read-only.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            Always.
+        """
+
+        raise exceptions.BCHTReadOnlyError("Snapshots are read-only.")
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the snapshot or the database was closed.
+        """
+
+        self._check_open()
+        preserved = dict(self._attrs)  # See iter_blocks_with_key
+        live = (item for item in self.backend.iter_attrs(prefix, start, stop, reverse)
+                if item[0] not in preserved)
+        kept = sorted(((k, v) for k, v in preserved.items()
+                       if v is not _MISSING
+                       and k.startswith(prefix)
+                       and (start is None or k >= start)
+                       and (stop is None or k < stop)),
+                      reverse=reverse)
+        yield from heapq.merge(live, kept, key=lambda item: item[0], reverse=reverse)
+
+    def close(self):
+        """Release the snapshot. The database is left open."""
+
+        self._closed = True
+        self._blocks = {}
+        self._attrs = {}
+
+    @property
+    def closed(self):
+        """Indicates whether the snapshot or its database is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the snapshot is no longer usable.
+        """
+
+        return self._closed or self.backend.closed
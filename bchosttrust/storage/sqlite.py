@@ -0,0 +1,757 @@
+# bchosttrust/bchosttrust/storage/sqlite.py
+"""SQLite storage backend"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Schema:
+#   blocks(hash BLOB PRIMARY KEY, raw BLOB)
+#   attrs(name BLOB PRIMARY KEY, value BLOB)
+# and, if the secondary indexes are enabled:
+#   block_index(hash BLOB PRIMARY KEY, prev_hash BLOB, height INTEGER, creation_time INTEGER)
+#   domain_votes(domain TEXT, hash BLOB, attitude INTEGER)
+#
+# The secondary index tables are not used by BCHostTrust itself. They are
+# kept up to date with the blocks table so that ad-hoc SQL can be run
+# against the database, e.g. from the sqlite3 shell:
+#   SELECT attitude, COUNT(*) FROM domain_votes WHERE domain = 'www.example.com'
+#       GROUP BY attitude;
+# height is NULL for blocks put before their previous block.
+#
+# The database is in WAL mode, so any number of readers (in other processes,
+# possibly with read_only=True) can work alongside one writer.
+#
+# The connection is shared by the threads using the backend. A lock keeps the
+# other threads from writing in the middle of a transaction, or from starting
+# one of their own, which SQLite refuses on the same connection. Statements are
+# stepped only under the lock: iterators read _PAGE_SIZE rows at a time, each
+# page a query of its own continuing after the last key of the previous one,
+# as a statement still running on the connection sees the writes made in
+# between and may return a row twice.
+
+import contextlib
+import sqlite3
+import threading
+import typing
+from hashlib import sha3_256
+from urllib.parse import quote
+
+from typeguard import typechecked
+
+from .meta import BCHTStorageBase
+from ..utils import prefix_successor
+from .. import exceptions
+from .. import BCHTBlock
+from ..internal import BCHTBlockHeader
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS blocks "
+    "(hash BLOB PRIMARY KEY, raw BLOB NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS attrs "
+    "(name BLOB PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID",
+)
+
+_INDEX_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS block_index "
+    "(hash BLOB PRIMARY KEY, prev_hash BLOB NOT NULL, "
+    "height INTEGER, creation_time INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS block_index_prev ON block_index (prev_hash)",
+    "CREATE INDEX IF NOT EXISTS block_index_height ON block_index (height)",
+    "CREATE INDEX IF NOT EXISTS block_index_time ON block_index (creation_time)",
+    "CREATE TABLE IF NOT EXISTS domain_votes "
+    "(domain TEXT NOT NULL, hash BLOB NOT NULL, attitude INTEGER NOT NULL, "
+    "PRIMARY KEY (domain, hash)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS domain_votes_hash ON domain_votes (hash)",
+)
+
+_PAGE_SIZE = 256
+
+
+@typechecked
+class BCHTSQLiteStorage(BCHTStorageBase):
+    """BCHT SQLite storage backend
+
+    Unlike the LevelDB backend, the database is not locked exclusively,
+    so other processes can read it while blocks are being imported.
+
+    Attibutes
+    ---------
+    path : str
+        The path to the database file.
+    conn : sqlite3.Connection
+        The connection this backend is working on.
+    secondary_indexes : bool
+        Whether the block_index and domain_votes tables are maintained.
+    read_only : bool
+        Whether changes to the database are refused.
+    """
+
+    # Other processes may change the attributes
+    cache_attrs = False
+    # Every statement, the reads included, is stepped under _lock
+    thread_safe = True
+
+    def __init__(self, path: str,
+                 secondary_indexes: bool = False,
+                 read_only: bool = False,
+                 timeout: float = 30.0):
+        """Open or create an SQLite database.
+
+        Parameters
+        ----------
+        path : str
+            The path to the database file.
+        secondary_indexes : bool, optional
+            Whether to create and maintain the secondary index tables, by default False.
+            They are always maintained if they already exist in the database.
+        read_only : bool, optional
+            Whether to open the database in read only mode, by default False
+        timeout : float, optional
+            Seconds to wait for another connection to release its lock, by default 30.0
+        """
+
+        self.path = path
+        self.read_only = read_only
+        self._closed = True  # Until everything is opened
+        self._lock = threading.RLock()
+        if read_only:
+            self.conn = sqlite3.connect(
+                f"file:{quote(path)}?mode=ro", uri=True, timeout=timeout,
+                isolation_level=None, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(
+                path, timeout=timeout,
+                isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                self.conn.execute(statement)
+        has_indexes = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'block_index'"
+        ).fetchone() is not None
+        if secondary_indexes and not has_indexes and not read_only:
+            self._create_indexes()
+            has_indexes = True
+        self.secondary_indexes = has_indexes
+        self._closed = False
+
+    def __str__(self):
+        return f"<BCHTSQLiteStorage, path={self.path}>"
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        # A single statement, not run in the middle of a transaction of another thread
+        with self._lock:
+            self.conn.execute(sql, params)
+
+    def _fetchone(self, sql: str, params: tuple = ()) -> typing.Optional[tuple]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def _select_pages(self, table: str, columns: str,
+                      lower: bytes, upper: typing.Optional[bytes] = None,
+                      reverse: bool = False) -> typing.Generator[tuple, None, None]:
+        # The rows of table with the key, the first of columns, in [lower, upper),
+        # read a page at a time, see the top of this file
+        key = columns.split(",", 1)[0]
+        lower_op = ">="
+        while True:
+            query = f"SELECT {columns} FROM {table} WHERE {key} {lower_op} ?"
+            params = [lower]
+            if upper is not None:
+                query += f" AND {key} < ?"
+                params.append(upper)
+            query += f" ORDER BY {key}{' DESC' if reverse else ''} LIMIT {_PAGE_SIZE}"
+            with self._lock:
+                self._check_open()
+                rows = self.conn.execute(query, params).fetchall()
+            yield from rows
+            if len(rows) < _PAGE_SIZE:
+                return
+            if reverse:
+                upper = rows[-1][0]
+            else:
+                lower, lower_op = rows[-1][0], ">"
+
+    def _check_open(self):
+        if self._closed:
+            raise exceptions.BCHTDatabaseClosedError(
+                "SQLite backend closed.")
+
+    def _check_writable(self):
+        self._check_open()
+        if self.read_only:
+            raise exceptions.BCHTReadOnlyError(
+                "SQLite backend opened read-only.")
+
+    def _create_indexes(self):
+        with self._transaction():
+            for statement in _INDEX_SCHEMA:
+                self.conn.execute(statement)
+            blocks = {
+                block_hash: BCHTBlock.from_raw(raw)
+                for block_hash, raw in self.conn.execute("SELECT hash, raw FROM blocks")}
+
+            heights = {}
+            for block_hash in blocks:
+                path = []
+                while block_hash in blocks and block_hash not in heights:
+                    path.append(block_hash)
+                    block_hash = blocks[block_hash].prev_hash
+                if block_hash in heights:
+                    height = heights[block_hash]
+                elif block_hash == b"\x00" * 32:
+                    height = -1
+                else:
+                    height = None
+                for path_hash in reversed(path):
+                    if height is not None:
+                        height += 1
+                    heights[path_hash] = height
+
+            for block_hash, block in blocks.items():
+                self._index_block(block_hash, block, heights[block_hash])
+
+    def _index_block(self, block_hash: bytes, block: BCHTBlock,
+                     height: typing.Optional[int]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO block_index VALUES (?, ?, ?, ?)",
+            (block_hash, block.prev_hash, height, block.creation_time))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO domain_votes VALUES (?, ?, ?)",
+            ((entry.domain_name, block_hash, entry.attitude) for entry in block.entries))
+
+    def put(self, block_data: BCHTBlock):
+        """Put the given block into the database.
+
+        Parameters
+        ----------
+        block_data : BCHTBlock
+            The BCHTBlock object to be stored.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        raw = block_data.raw
+        block_hash = sha3_256(raw).digest()
+        self._add_known_hash(block_hash)
+        if not self.secondary_indexes:
+            self._execute("INSERT OR REPLACE INTO blocks VALUES (?, ?)", (block_hash, raw))
+            return
+
+        with self._transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blocks VALUES (?, ?)", (block_hash, raw))
+            if block_data.prev_hash == b"\x00" * 32:
+                height = 0
+            else:
+                row = self.conn.execute(
+                    "SELECT height + 1 FROM block_index WHERE hash = ?",
+                    (block_data.prev_hash, )).fetchone()
+                height = None if row is None else row[0]
+            self._index_block(block_hash, block_data, height)
+
+    def put_raw_many(self, items: typing.Iterable[tuple[bytes, bytes]]):
+        """Put blocks given in their bytes form into the database, in one transaction.
+        They are only decoded if the secondary indexes are kept.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes]]
+            The hashes and the raw blocks. The hashes are trusted to match the blocks.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        if self.secondary_indexes:
+            super().put_raw_many(items)
+            return
+        items = tuple(items)
+        for block_hash, _ in items:
+            self._add_known_hash(block_hash)
+        with self._transaction():
+            self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?)", items)
+
+    def get(self, block_hash: bytes) -> BCHTBlock:
+        """Retrieve a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        BCHTBlock
+            The block object
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        return BCHTBlock.from_raw(self.get_raw(block_hash))
+
+    def get_raw(self, block_hash: bytes) -> bytes:
+        """Retrieve a block in its bytes form by its hash, without decoding it.
+
+        Parameters
+        ----------
+        block_hash : bytes
+            The hexadecimal hash of the block wanted.
+
+        Returns
+        -------
+        bytes
+            The BCHT Block in bytes.
+
+        Raises
+        ------
+        BCHTBlockNotFoundError
+            If the block with the given hash is not found.
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        row = self._fetchone("SELECT raw FROM blocks WHERE hash = ?", (block_hash, ))
+        if row is None:
+            raise exceptions.BCHTBlockNotFoundError(
+                f"{block_hash} not found in the database.")
+        return row[0]
+
+    def _has_block(self, block_hash: bytes) -> bool:
+        self._check_open()
+        return self._fetchone(
+            "SELECT 1 FROM blocks WHERE hash = ?", (block_hash, )) is not None
+
+    def _iter_hashes(self) -> typing.Generator[bytes, None, None]:
+        self._check_open()
+        for (block_hash, ) in self._select_pages("blocks", "hash", b""):
+            yield block_hash
+
+    def delete(self, block_hash: bytes):
+        """Delete a block in the chain by its hash.
+
+        Parameters
+        ----------
+        block_hash : str
+            The hexadecimal hash of the block wanted.
+
+        Raises
+        ------
+        BCHTInvalidHashError
+            If block_hash is not a valid SHA3-256 hexadecimal hash.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        if len(block_hash) != 32:
+            raise exceptions.BCHTInvalidHashError(
+                f"{block_hash} is not a valid SHA3-256 hexadecimal hash.")
+        if not self.secondary_indexes:
+            self._execute("DELETE FROM blocks WHERE hash = ?", (block_hash, ))
+            return
+
+        with self._transaction():
+            for table in ("blocks", "block_index", "domain_votes"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE hash = ?", (block_hash, ))
+
+    def iter_blocks(self) -> typing.Generator[BCHTBlock, None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes.
+
+        Yields
+        ------
+        BCHTBlock
+            BCHT Blocks
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        for _, block in self.iter_blocks_with_key():
+            yield block
+
+    def iter_blocks_with_key(self) -> typing.Generator[tuple[bytes, BCHTBlock], None, None]:
+        """Return a iterable returning of BCHT Blocks, in the order of their hashes,
+        with keys.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlock]
+            hash as keys, BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed
+        """
+
+        self._check_open()
+        for block_hash, raw in self._select_pages("blocks", "hash, raw", b""):
+            yield block_hash, BCHTBlock.from_raw(raw)
+
+    def iter_raw_blocks(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning blocks in their bytes form, ordered by their hashes,
+        without decoding them.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True. Turn this off for full scans, so that they do not
+            push the frequently used blocks out of the cache.
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            hash as keys, BCHT Blocks in bytes as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        yield from self._select_blocks("raw", start, stop)
+
+    def iter_headers(
+            self,
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            fill_cache: bool = True) -> typing.Generator[tuple[bytes, BCHTBlockHeader], None, None]:
+        """Return a iterable returning the headers of blocks, ordered by their hashes,
+        without decoding the entries.
+
+        Parameters
+        ----------
+        start : bytes, optional
+            If given, only hashes not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only hashes lower than it are returned (exclusive).
+        fill_cache : bool, optional
+            Whether the blocks read should be kept in the cache of the backend,
+            by default True.
+
+        Yields
+        ------
+        tuple[bytes, BCHTBlockHeader]
+            hash as keys, headers of BCHT Blocks as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        for key, raw in self._select_blocks("substr(raw, 1, 46)", start, stop):
+            yield key, BCHTBlockHeader.from_raw(raw)
+
+    def _select_blocks(self, column: str,
+                       start: typing.Optional[bytes],
+                       stop: typing.Optional[bytes]) -> typing.Generator[tuple, None, None]:
+        self._check_open()
+        return self._select_pages(
+            "blocks", f"hash, {column}", b"" if start is None else start, stop)
+
+    def getattr(self, attr_name: bytes) -> bytes:
+        """Retrieve an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Returns
+        -------
+        bytes
+            The content of the attibute
+
+        Raises
+        ------
+        BCHTAttributeNotFoundError
+            If that attibute does not exist.
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        row = self._fetchone("SELECT value FROM attrs WHERE name = ?", (attr_name, ))
+        if row is None:
+            raise exceptions.BCHTAttributeNotFoundError(
+                f"{attr_name} not found in the database.")
+        return row[0]
+
+    def setattr(self, attr_name: bytes, content: bytes):
+        """Set an attibute into the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+        content : bytes
+            Contents to be stored
+
+        Raises
+        ------
+        ValueError
+            If the data or key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        self._execute("INSERT OR REPLACE INTO attrs VALUES (?, ?)", (attr_name, content))
+
+    def delattr(self, attr_name: bytes):
+        """Delete an attibute from the database
+
+        Parameters
+        ----------
+        attr_name : bytes
+            The name of the attibute
+
+        Raises
+        ------
+        ValueError
+            If the key is not bytes, or if not accepted by the backend.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        self._execute("DELETE FROM attrs WHERE name = ?", (attr_name, ))
+
+    def iter_attrs(
+            self,
+            prefix: bytes = b"",
+            start: typing.Optional[bytes] = None,
+            stop: typing.Optional[bytes] = None,
+            reverse: bool = False) -> typing.Generator[tuple[bytes, bytes], None, None]:
+        """Return a iterable returning attributes whose names start with prefix,
+        ordered by their names.
+
+        Parameters
+        ----------
+        prefix : bytes, optional
+            The prefix of the names of the attributes, by default b"" (all attributes)
+        start : bytes, optional
+            If given, only names not lower than it are returned (inclusive).
+        stop : bytes, optional
+            If given, only names lower than it are returned (exclusive).
+        reverse : bool, optional
+            Whether to return the attributes in descending order, by default False
+
+        Yields
+        ------
+        tuple[bytes, bytes]
+            names of attributes as keys, contents as values.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        lower = max(prefix, start) if start is not None else prefix
+        upper = prefix_successor(prefix)
+        if stop is not None and (not upper or stop < upper):
+            upper = stop
+
+        yield from self._select_pages("attrs", "name, value", lower, upper or None, reverse)
+
+    def snapshot(self) -> "BCHTSQLiteStorage":
+        """Return a read-only view of the database pinned to this moment.
+        Later changes to the database are not seen through it.
+
+        This is a new read-only connection holding a read transaction open,
+        so the writer keeps the old pages in the WAL for it until it is closed.
+
+        Returns
+        -------
+        BCHTSQLiteStorage
+            The read-only view. Close it when done with it.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_open()
+        view = BCHTSQLiteStorage(self.path, read_only=True)
+        view.conn.execute("BEGIN")
+        # The transaction only takes its snapshot at the first read
+        view.conn.execute("SELECT 1 FROM blocks LIMIT 1").fetchall()
+        return view
+
+    def setattr_many(self, items: typing.Iterable[tuple[bytes, typing.Optional[bytes]]]):
+        """Set attributes into the database in one transaction.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[bytes, bytes | None]]
+            The names and the contents of the attributes,
+            None for the attributes to be deleted if they exist.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        with self._transaction():
+            for attr_name, content in items:
+                if content is None:
+                    self.conn.execute("DELETE FROM attrs WHERE name = ?", (attr_name, ))
+                else:
+                    self.conn.execute("INSERT OR REPLACE INTO attrs VALUES (?, ?)",
+                                      (attr_name, content))
+
+    def swap_attrs(self, shadow_prefix: bytes, prefixes: typing.Iterable[bytes]):
+        """Replace the attributes whose names start with any of prefixes by those
+        whose names start with shadow_prefix + that prefix, with shadow_prefix taken off,
+        in one transaction. Readers see either the old or the new attributes.
+
+        Parameters
+        ----------
+        shadow_prefix : bytes
+            The prefix the new attributes were written under.
+        prefixes : Iterable[bytes]
+            The prefixes of the names of the attributes to be replaced.
+
+        Raises
+        ------
+        BCHTDatabaseClosedError
+            If the database was closed.
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        """
+
+        self._check_writable()
+        with self._transaction():
+            for prefix in prefixes:
+                shadow = shadow_prefix + prefix
+                self.conn.execute(
+                    "DELETE FROM attrs WHERE name >= ? AND name < ?",
+                    (prefix, prefix_successor(prefix)))
+                self.conn.execute(
+                    "INSERT INTO attrs SELECT substr(name, ?), value FROM attrs "
+                    "WHERE name >= ? AND name < ?",
+                    (len(shadow_prefix) + 1, shadow, prefix_successor(shadow)))
+                self.conn.execute(
+                    "DELETE FROM attrs WHERE name >= ? AND name < ?",
+                    (shadow, prefix_successor(shadow)))
+
+    def compact(self):
+        """Rebuild the database file without the space left by deleted rows,
+        and truncate the write-ahead log.
+
+        Raises
+        ------
+        BCHTReadOnlyError
+            If the database was opened read-only.
+        BCHTDatabaseClosedError
+            If the database was closed.
+        """
+
+        self._check_writable()
+        with self._lock:
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Close the database."""
+
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self.conn.close()
+
+    def __del__(self):
+        if not getattr(self, "_closed", True):
+            self.close()
+
+    @property
+    def closed(self):
+        """Indicates whether the database is closed, i.e. not avaliable.
+
+        Returns
+        -------
+        bool
+            If False, the backend is no longer usable.
+        """
+
+        return self._closed
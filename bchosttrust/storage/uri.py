@@ -0,0 +1,199 @@
+# bchosttrust/bchosttrust/storage/uri.py
+"""Opening storage backends by URI"""
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# A storage URI is <backend>:<path>, e.g. "sqlite:/srv/bcht.sqlite" or
+# "sharded:~/bcht-shards". "<backend>://<path>" is accepted as well.
+# Anything without a scheme in front is the path to a LevelDB. A single letter
+# is a Windows drive, not a scheme; paths containing a colon otherwise need
+# "leveldb:" in front, so that a mistyped backend is not taken for a path.
+
+import os
+import re
+import typing
+
+from typeguard import typechecked
+
+from .meta import BCHTStorageBase
+from .leveldb import BCHTLevelDBStorage
+from .dummy import BCHTDummyStorage
+from .segment import BCHTSegmentStorage
+from .sqlite import BCHTSQLiteStorage
+from .sharded import BCHTShardedStorage
+from .memory import BCHTMemoryStorage
+
+BACKENDS = ("leveldb", "sharded", "segment", "sqlite", "memory", "dummy")
+
+# Options passed into plyvel.DB, see https://plyvel.readthedocs.io/en/latest/api.html#DB
+PROFILES: dict[str, dict[str, typing.Any]] = {
+    # The defaults of LevelDB (8 MiB block cache, 4 MiB write buffer, no bloom filter)
+    "default": {},
+    # Lookups by hash, e.g. walking chains for analysis
+    "read-heavy": {
+        "lru_cache_size": 256 * 1024 * 1024,
+        "bloom_filter_bits": 10,
+    },
+    # Importing many blocks at once. Bigger write buffers mean fewer compactions.
+    "bulk-import": {
+        "lru_cache_size": 32 * 1024 * 1024,
+        "bloom_filter_bits": 10,
+        "write_buffer_size": 64 * 1024 * 1024,
+    },
+    # Small machines
+    "low-memory": {
+        "lru_cache_size": 2 * 1024 * 1024,
+        "write_buffer_size": 1024 * 1024,
+        "max_open_files": 64,
+    },
+}
+
+
+@typechecked
+def parse_storage_uri(uri: str) -> tuple[str, str]:
+    """Split a storage URI into the backend and the path.
+
+    Parameters
+    ----------
+    uri : str
+        The storage URI, or just a path to a LevelDB.
+
+    Returns
+    -------
+    tuple[str, str]
+        The name of the backend (one of BACKENDS) and the path, with ~ expanded.
+
+    Raises
+    ------
+    ValueError
+        If the backend in front is not one of BACKENDS.
+    """
+
+    match = re.fullmatch(r"([A-Za-z][A-Za-z0-9+.-]+):(?://)?(.*)", uri, re.DOTALL)
+    if match is None:
+        return "leveldb", os.path.expanduser(uri)
+    backend = match.group(1).lower()
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown storage backend {match.group(1)!r} in {uri!r}, "
+            f"expected one of {', '.join(BACKENDS)}")
+    return backend, os.path.expanduser(match.group(2))
+
+
+@typechecked
+def get_leveldb_options(storage_config: typing.Mapping[str, typing.Any]) -> dict[str, typing.Any]:
+    """Get the options to be passed into plyvel.DB, from the profile
+    and the [storage.leveldb] table of the configuration.
+
+    Parameters
+    ----------
+    storage_config : Mapping[str, Any]
+        The storage table of the configuration, see bchosttrust.config.
+
+    Returns
+    -------
+    dict[str, Any]
+        The keyword arguments.
+
+    Raises
+    ------
+    ValueError
+        If the profile does not exist.
+    """
+
+    profile = storage_config.get("profile", "default")
+    try:
+        options = dict(PROFILES[profile])
+    except KeyError as e:
+        raise ValueError(
+            f"Unknown storage profile {profile!r}, "
+            f"expected one of {', '.join(PROFILES)}") from e
+    options.update(storage_config.get("leveldb", {}))
+    if options.get("compression") == "none":
+        options["compression"] = None
+    return options
+
+
+@typechecked
+def open_storage(
+        uri: str,
+        storage_config: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+        create_if_missing: bool = True) -> BCHTStorageBase:
+    """Open the storage backend at a storage URI.
+
+    Parameters
+    ----------
+    uri : str
+        The storage URI, e.g. "sqlite:/srv/bcht.sqlite".
+    storage_config : Mapping[str, Any], optional
+        The storage table of the configuration, see bchosttrust.config,
+        for the profile and the options of the backends. By default the defaults.
+    create_if_missing : bool, optional
+        Whether a new database should be created if needed, by default True
+
+    Returns
+    -------
+    BCHTStorageBase
+        The storage backend.
+
+    Raises
+    ------
+    ValueError
+        If the profile or the codec does not exist, or the codec cannot be switched to.
+    """
+
+    if storage_config is None:
+        storage_config = {}
+    backend, path = parse_storage_uri(uri)
+
+    match backend:
+        case "leveldb":
+            storage = BCHTLevelDBStorage.init_db(
+                name=path,  # name of the database (directory name)
+                create_if_missing=create_if_missing,
+                codec=storage_config.get("codec"),
+                **get_leveldb_options(storage_config))
+        case "sharded":
+            sharded_config = storage_config.get("sharded", {})
+            paths = sharded_config.get("paths") or tuple(
+                os.path.join(path, f"shard-{i}") for i in range(sharded_config.get("shards", 4)))
+            if create_if_missing:
+                for shard_path in paths:
+                    os.makedirs(os.path.dirname(os.path.abspath(shard_path)), exist_ok=True)
+            storage = BCHTShardedStorage.init_db(
+                names=tuple(os.path.expanduser(p) for p in paths),
+                create_if_missing=create_if_missing,
+                codec=storage_config.get("codec"),
+                **get_leveldb_options(storage_config))
+        case "segment":
+            storage = BCHTSegmentStorage(path, create_if_missing=create_if_missing)
+        case "sqlite":
+            if not create_if_missing and not os.path.exists(path):
+                raise FileNotFoundError(f"{path} does not exist")
+            storage = BCHTSQLiteStorage(
+                path, secondary_indexes=storage_config.get("sqlite", {}).get(
+                    "secondary_indexes", False))
+        case "memory":
+            storage = BCHTMemoryStorage()
+        case _:  # "dummy"
+            storage = BCHTDummyStorage()
+
+    if storage_config.get("known_hashes"):
+        storage.load_known_hashes()
+    return storage
@@ -95,6 +95,26 @@ def get_cache_path() -> os.PathLike:
     return cache_dir
 
 
+def prefix_successor(prefix: bytes) -> bytes:
+    """Return the lowest key greater than every key starting with prefix.
+
+    Parameters
+    ----------
+    prefix : bytes
+        The prefix of the keys.
+
+    Returns
+    -------
+    bytes
+        The key, or b"" if there is no such key (i.e. prefix is empty or all 0xFF).
+    """
+
+    prefix = prefix.rstrip(b"\xff")
+    if not prefix:
+        return b""
+    return prefix[:-1] + bytes((prefix[-1] + 1, ))
+
+
 class HashParamType(click.ParamType):  # pylint: disable=too-few-public-methods
     """click.ParamType accepting a SHA3-256 hash, optionally prefixed with 0x."""
 
@@ -0,0 +1,127 @@
+# bchosttrust/benchmarks/fork_choice.py
+# Measure fork choice: importing a chain raced by rival forks, and finding the best tip
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+
+# Usage (with BCHostTrust installed, e.g. pip install --editable .):
+#   python benchmarks/fork_choice.py [--blocks N] [--fork-rate R] [--seed S]
+# Blocks are synthetic and do not satisfy the proof-of-work, so they go through
+# the steps of import_block after validation (put, index_block, update_best_tip,
+# sync_state). Run with python -O to leave out the typeguard checks, which
+# otherwise dominate the timings.
+
+# pylint: disable=missing-module-docstring
+
+import os
+import random
+import tempfile
+import time
+
+import click
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust import attitudes
+from bchosttrust.storage import BCHTLevelDBStorage
+from bchosttrust.storage.index import NULL_HASH, index_block, get_block_meta
+from bchosttrust.storage.import_block import get_best_hash, update_best_tip
+from bchosttrust.storage.chainstate import find_fork, sync_state
+
+
+def import_chain(backend, num: int, fork_rate: float, rng: random.Random) -> tuple[int, int]:
+    """Import a chain where a rival chain races against the main chain, taking
+    the given fraction of the blocks, and is restarted from time to time.
+    Returns the number of reorganizations and the deepest one."""
+
+    metas = {}
+    rival = NULL_HASH
+    reorgs = max_depth = 0
+    for i in range(num):
+        best = get_best_hash(backend)
+        if best == NULL_HASH or rng.random() >= fork_rate:
+            prev_hash = best
+        else:
+            if rival in (NULL_HASH, best) or rng.random() < 0.01:
+                # A new rival, from a block up to 10 blocks behind the best tip
+                rival = best
+                for _ in range(rng.randrange(1, 10)):
+                    if metas[rival].prev_hash == NULL_HASH:
+                        break
+                    rival = metas[rival].prev_hash
+            prev_hash = rival
+
+        block = BCHTBlock(1, prev_hash, i, i, tuple(
+            BCHTEntry(f"www.example{rng.randrange(1000)}.com", attitudes.UPVOTE)
+            for _ in range(1 + i % 5)))
+        block_hash = block.hash
+        backend.put(block)
+        metas[block_hash] = index_block(
+            backend, block, None if prev_hash == NULL_HASH else metas[prev_hash])
+        update_best_tip(backend, block, metas[block_hash])
+        sync_state(backend)
+
+        new_best = get_best_hash(backend)
+        if prev_hash == rival:
+            rival = block_hash
+        if new_best == rival:  # The rival has overtaken, the old main chain is the rival now
+            rival = best
+        if best not in (NULL_HASH, new_best, prev_hash):
+            reorgs += 1
+            max_depth = max(max_depth, len(find_fork(backend, best, new_best)[0]))
+    return reorgs, max_depth
+
+
+@click.command()
+@click.option("--blocks", "num_blocks", type=int, default=5000,
+              help="Number of blocks to be generated")
+@click.option("--fork-rate", type=float, default=0.5,
+              help="Fraction of blocks not built on the best tip")
+@click.option("--seed", type=int, default=0, help="Seed of the random generator")
+def main(num_blocks: int, fork_rate: float, seed: int):
+    """Measure importing a chain with many forks, and looking up the best tip"""
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backend = BCHTLevelDBStorage.init_db(
+            name=os.path.join(temp_dir, "bench.db"), create_if_missing=True)
+
+        start = time.perf_counter()
+        reorgs, max_depth = import_chain(backend, num_blocks, fork_rate, random.Random(seed))
+        import_time = time.perf_counter() - start
+        click.echo(f"import: {num_blocks / import_time:10.0f} blocks/s, "
+                   f"{reorgs} reorganizations, the deepest reverting {max_depth} blocks")
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            best = get_best_hash(backend)
+        lookup_time = (time.perf_counter() - start) / 1000
+        click.echo(f"best tip lookup: {lookup_time * 1e6:10.2f} us")
+
+        # What it would take without the best tip recorded
+        start = time.perf_counter()
+        scanned = max(get_block_meta(backend, block_hash).work
+                      for block_hash, _ in backend.iter_raw_blocks())
+        scan_time = time.perf_counter() - start
+        assert scanned == get_block_meta(backend, best).work
+        click.echo(f"best tip by scan: {scan_time * 1e6:10.2f} us")
+
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,162 @@
+# bchosttrust/benchmarks/storage_backends.py
+# Compare import and full scan throughput of storage backends
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# Usage (with BCHostTrust installed, e.g. pip install --editable .):
+#   python benchmarks/storage_backends.py [--blocks N] [--backend NAME ...] [--repeat N]
+# Blocks are synthetic, with names out of 5000 domains, and do not satisfy the
+# proof-of-work, so they are imported by the steps of import_block and
+# import_blocks after validation. Run with python -O to leave out the
+# typeguard checks, which otherwise dominate the timings.
+#
+# Measured:
+#   import       blocks imported one at a time, as import_block does
+#   bulk import  blocks imported in batches of 1000, as import_blocks does
+#   scan         iter_blocks, decoding every block
+#   raw scan     iter_raw_blocks, without decoding
+
+# pylint: disable=missing-module-docstring
+
+import os
+import tempfile
+import time
+
+import click
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust import attitudes
+from bchosttrust.storage import (BCHTLevelDBStorage, BCHTSegmentStorage,
+                                 BCHTSQLiteStorage, BCHTShardedStorage, BCHTMemoryStorage)
+from bchosttrust.storage.batch import BCHTBatchOverlay
+from bchosttrust.storage.chainstate import sync_state
+from bchosttrust.storage.import_block import import_block, _import_block
+
+BATCH_SIZE = 1000
+
+BACKENDS = {
+    "leveldb": lambda p: BCHTLevelDBStorage.init_db(name=p, create_if_missing=True),
+    "leveldb-dict": lambda p: BCHTLevelDBStorage.init_db(
+        name=p, create_if_missing=True, codec="dict"),
+    "segment": BCHTSegmentStorage,
+    "sqlite": BCHTSQLiteStorage,
+    "sharded": lambda p: BCHTShardedStorage.init_db(
+        names=tuple(f"{p}.{i}" for i in range(4)), create_if_missing=True),
+    "memory": lambda _: BCHTMemoryStorage(),
+}
+
+
+def make_blocks(num: int) -> list[BCHTBlock]:
+    """Generate a chain of synthetic blocks"""
+
+    blocks = []
+    prev_hash = b"\x00" * 32
+    for i in range(num):
+        block = BCHTBlock(1, prev_hash, i, i, tuple(
+            BCHTEntry(f"www.example{(i * 7 + j) % 5000}.com", attitudes.UPVOTE)
+            for j in range(1 + i % 10)))
+        blocks.append(block)
+        prev_hash = block.hash
+    return blocks
+
+
+def import_one_by_one(backend, blocks: list[BCHTBlock]):
+    """Import the blocks as import_block does, skipping the validation"""
+
+    import_block(backend, blocks[0])  # The genesis block is not validated
+    for block in blocks[1:]:
+        _import_block(backend, block, valid=True)
+        sync_state(backend)
+
+
+def import_in_batches(backend, blocks: list[BCHTBlock]):
+    """Import the blocks as import_blocks does, skipping the validation"""
+
+    import_block(backend, blocks[0])
+    overlay = BCHTBatchOverlay(backend)
+    for i, block in enumerate(blocks[1:], 1):
+        _import_block(overlay, block, valid=True)
+        if i % BATCH_SIZE == 0 or i == len(blocks) - 1:
+            sync_state(overlay)
+            overlay.flush()
+
+
+def timed(func, *args) -> float:
+    """The seconds func took"""
+
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def measure(name: str, blocks: list[BCHTBlock]) -> tuple[float, float, float, float, int]:
+    """The seconds each step took on one backend, and the size of the bulk imported database"""
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backend = BACKENDS[name](os.path.join(temp_dir, "bench.db"))
+        import_time = timed(import_one_by_one, backend, blocks)
+        backend.close()
+
+        backend = BACKENDS[name](os.path.join(temp_dir, "bulk.db"))
+        bulk_time = timed(import_in_batches, backend, blocks)
+        scan_time = timed(lambda: sum(1 for _ in backend.iter_blocks()))
+        raw_scan_time = timed(lambda: sum(1 for _ in backend.iter_raw_blocks(fill_cache=False)))
+
+        memory = backend.memory_usage() if isinstance(backend, BCHTMemoryStorage) else 0
+        backend.close()
+        size = memory + sum(os.path.getsize(os.path.join(root, file))
+                            for root, _, files in os.walk(temp_dir)
+                            for file in files if "bulk.db" in root or "bulk.db" in file)
+    return import_time, bulk_time, scan_time, raw_scan_time, size
+
+
+def report(name: str, num_blocks: int, results: list[tuple[float, float, float, float, int]]):
+    """Print the best time of each step on one backend"""
+
+    import_time, bulk_time, scan_time, raw_scan_time, size = map(min, zip(*results))
+    click.echo(f"{name:>12}: import {num_blocks / import_time:8.0f}, "
+               f"bulk import {num_blocks / bulk_time:8.0f}, "
+               f"scan {num_blocks / scan_time:8.0f}, "
+               f"raw scan {num_blocks / raw_scan_time:8.0f} blocks/s, "
+               f"{size / 1024 / 1024:8.2f} MiB on disk or in memory")
+
+
+@click.command()
+@click.option("--blocks", "num_blocks", type=int, default=10000,
+              help="Number of blocks to be generated")
+@click.option("--backend", "names", multiple=True,
+              type=click.Choice(tuple(BACKENDS)), default=tuple(BACKENDS),
+              help="Backends to be measured, by default all of them")
+@click.option("--repeat", type=int, default=3,
+              help="Number of runs, of which the best is reported")
+def main(num_blocks: int, names: tuple[str, ...], repeat: int):
+    """Compare import and full scan throughput of storage backends"""
+
+    blocks = make_blocks(num_blocks)
+    results = {name: [] for name in names}
+    for _ in range(repeat):
+        # Taking turns, so that a slower or faster period of the machine affects them all
+        for name in names:
+            results[name].append(measure(name, blocks))
+    for name in names:
+        report(name, num_blocks, results[name])
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -28,6 +28,7 @@ import unittest
 
 from bchosttrust import BCHTBlock, BCHTEntry
 from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage.index import ensure_indexed
 from bchosttrust import attitudes
 from bchosttrust.analysis import search
 
@@ -93,6 +94,43 @@ class BCHTSearchTestCase(unittest.TestCase):
 
         self.assertEqual(specific_rating, 2)
 
+    def testRatingPeriod(self):
+        block4 = BCHTBlock(1, self.block3.hash, 100, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        block5 = BCHTBlock(1, block4.hash, 200, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        self.db.put(block4)
+        self.db.put(block5)
+
+        for indexed in (False, True):
+            if indexed:
+                ensure_indexed(self.db, block5.hash)
+            self.assertDictEqual(search.get_website_rating(
+                self.db, block5.hash, since=50), {
+                "www.example.com": 2,
+                "www.example.net": 1
+            })
+            self.assertDictEqual(search.get_website_rating(
+                self.db, block5.hash, 50, 150), {"www.example.com": 1})
+            self.assertEqual(search.get_specific_website_rating(
+                self.db, block5.hash, "www.example.com", until=150), 3)
+
+    def testSpecificRatingIndexed(self):
+        fork = BCHTBlock(1, self.block1.hash, 0, 5, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.db.put(fork)
+        ensure_indexed(self.db, self.block3.hash)
+        ensure_indexed(self.db, fork.hash)
+
+        specific_rating = search.get_specific_website_rating(
+            self.db, self.block3.hash, "www.example.com")
+
+        self.assertEqual(specific_rating, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
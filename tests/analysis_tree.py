@@ -28,6 +28,7 @@ import unittest
 
 from bchosttrust import BCHTBlock, BCHTEntry
 from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage.index import ensure_indexed
 from bchosttrust import attitudes
 from bchosttrust.analysis import tree
 
@@ -61,3 +62,19 @@ class BCHTTreeTestCase(unittest.TestCase):
         self.assertEqual(tree_root.children[0].name, self.block2.hash)
         self.assertEqual(
             tree_root.children[0].children[0].name, self.block3.hash)
+
+    def testTreeFromHeaders(self):
+        tree_root = tree.generate_tree_from_headers(
+            self.db.iter_headers(), self.block1.hash)
+
+        self.assertEqual(tree_root.children[0].name, self.block2.hash)
+        self.assertEqual(
+            tree_root.children[0].children[0].name, self.block3.hash)
+
+    def testTreeFromStorage(self):
+        ensure_indexed(self.db, self.block3.hash)
+        tree_root = tree.generate_tree_from_storage(self.db, self.block1.hash)
+
+        self.assertEqual(tree_root.children[0].name, self.block2.hash)
+        self.assertEqual(
+            tree_root.children[0].children[0].name, self.block3.hash)
@@ -0,0 +1,82 @@
+# bchosttrust/tests/backends.py
+# The storage backends the backend-independent tests run against
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-module-docstring
+
+import sys
+import tempfile
+import typing
+import unittest
+from os import path
+
+from bchosttrust.storage import (BCHTStorageBase, BCHTDummyStorage, BCHTMemoryStorage,
+                                 BCHTLevelDBStorage, BCHTSegmentStorage, BCHTSQLiteStorage,
+                                 BCHTShardedStorage)
+
+# Opening a backend at a path in a temporary directory
+BACKENDS: dict[str, typing.Callable[[str], BCHTStorageBase]] = {
+    "Dummy": lambda _: BCHTDummyStorage(),
+    "Memory": lambda _: BCHTMemoryStorage(),
+    "LevelDB": lambda name: BCHTLevelDBStorage.init_db(name=name, create_if_missing=True),
+    "LevelDBCodec": lambda name: BCHTLevelDBStorage.init_db(
+        name=name, create_if_missing=True, codec="dict"),
+    "Segment": BCHTSegmentStorage,
+    "SQLite": BCHTSQLiteStorage,
+    "Sharded": lambda name: BCHTShardedStorage.init_db(
+        names=tuple(f"{name}-{i}" for i in range(2)), create_if_missing=True),
+}
+
+
+def backend_maker(name: str) -> typing.Callable[[unittest.TestCase], BCHTStorageBase]:
+    """A make_backend method opening a new backend in a temporary directory,
+    removed after the test. Call it once per backend wanted."""
+
+    def make_backend(self: unittest.TestCase) -> BCHTStorageBase:
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        return BACKENDS[name](path.join(temp_dir.name, "test.db"))
+
+    return make_backend
+
+
+def for_each_backend(*names: str):
+    """Decorate a class of tests named BCHTxxxTests, calling self.make_backend()
+    for their backend, to add one BCHT<backend>xxxTestCase per backend to its module.
+
+    Parameters
+    ----------
+    *names : str
+        The keys of BACKENDS to run the tests on, by default all of them.
+    """
+
+    def decorate(tests: type) -> type:
+        module = sys.modules[tests.__module__]
+        stem = tests.__name__.removeprefix("BCHT").removesuffix("Tests")
+        for name in names or BACKENDS:
+            case_name = f"BCHT{name}{stem}TestCase"
+            setattr(module, case_name, type(case_name, (tests, unittest.TestCase), {
+                "__module__": tests.__module__,
+                "__qualname__": case_name,
+                "make_backend": backend_maker(name),
+            }))
+        return tests
+
+    return decorate
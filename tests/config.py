@@ -0,0 +1,122 @@
+# bchosttrust/tests/config.py
+# Test bchosttrust.config and bchosttrust.storage.uri
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+from os import path
+
+from bchosttrust.config import load_config
+from bchosttrust.storage import (BCHTLevelDBStorage, BCHTSQLiteStorage,
+                                 BCHTShardedStorage, BCHTDummyStorage)
+from bchosttrust.storage.uri import parse_storage_uri, get_leveldb_options, open_storage
+
+
+class BCHTConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = path.join(self.temp_dir.name, "config.toml")
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write("[storage]\n"
+                    "backend = \"sqlite\"\n"
+                    f"path = \"{path.join(self.temp_dir.name, 'test.sqlite')}\"\n"
+                    "profile = \"bulk-import\"\n"
+                    "[storage.leveldb]\n"
+                    "bloom_filter_bits = 16\n"
+                    "compression = \"none\"\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def testLoad(self):
+        config = load_config(environ={"BCHT_CONFIG": self.config_path})
+
+        self.assertEqual(config["storage"]["backend"], "sqlite")
+        self.assertEqual(config["storage"]["sharded"]["shards"], 4)
+
+    def testEnvironment(self):
+        config = load_config(self.config_path, environ={
+            "BCHT_STORAGE": "leveldb:/tmp/other.db",
+            "BCHT_STORAGE_PROFILE": "read-heavy"
+        })
+
+        self.assertEqual(config["storage"]["backend"], "leveldb")
+        self.assertEqual(config["storage"]["path"], "/tmp/other.db")
+        self.assertEqual(config["storage"]["profile"], "read-heavy")
+
+    def testMissingFile(self):
+        with self.assertRaises(FileNotFoundError):
+            load_config(path.join(self.temp_dir.name, "missing.toml"), environ={})
+
+    def testLevelDBOptions(self):
+        options = get_leveldb_options(load_config(self.config_path, environ={})["storage"])
+
+        self.assertEqual(options["bloom_filter_bits"], 16)
+        self.assertEqual(options["write_buffer_size"], 64 * 1024 * 1024)
+        self.assertIsNone(options["compression"])
+        with self.assertRaises(ValueError):
+            get_leveldb_options({"profile": "warp-speed"})
+
+
+class BCHTStorageURITestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def testParse(self):
+        self.assertEqual(parse_storage_uri("sqlite:/srv/bcht.sqlite"),
+                         ("sqlite", "/srv/bcht.sqlite"))
+        self.assertEqual(parse_storage_uri("segment:///srv/segments"),
+                         ("segment", "/srv/segments"))
+        self.assertEqual(parse_storage_uri("/srv/default.db"),
+                         ("leveldb", "/srv/default.db"))
+        self.assertEqual(parse_storage_uri("dummy:"), ("dummy", ""))
+        self.assertEqual(parse_storage_uri("SQLite:/srv/bcht.sqlite"),
+                         ("sqlite", "/srv/bcht.sqlite"))
+        self.assertEqual(parse_storage_uri("C:\\bcht\\default.db"),
+                         ("leveldb", "C:\\bcht\\default.db"))
+
+    def testUnknownBackend(self):
+        for uri in ("sqlit:/tmp/x", "s3://bucket/bcht", "level-db:test.db"):
+            with self.assertRaises(ValueError):
+                parse_storage_uri(uri)
+        with self.assertRaises(ValueError):
+            open_storage("sqlit:/tmp/x")
+
+    def testOpen(self):
+        for uri, cls in (
+                (f"leveldb:{self.temp_dir.name}/test.db", BCHTLevelDBStorage),
+                (f"sqlite:{self.temp_dir.name}/test.sqlite", BCHTSQLiteStorage),
+                (f"sharded:{self.temp_dir.name}/shards", BCHTShardedStorage),
+                ("dummy:", BCHTDummyStorage)):
+            backend = open_storage(uri, {"profile": "low-memory"})
+            self.assertIsInstance(backend, cls)
+            backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,18 +24,28 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=invalid-name
 
+import random
 import unittest
+from unittest import mock
+
+from backends import backend_maker
 
 from bchosttrust import BCHTBlock, BCHTEntry
 from bchosttrust.storage import BCHTDummyStorage
 from bchosttrust.storage import import_block
+from bchosttrust.storage import index
+from bchosttrust.storage.chainstate import get_state_tip, get_state_votes, sync_state
 from bchosttrust import attitudes
+from bchosttrust import exceptions
 from bchosttrust.consensus.powc import attempt
 
 
 class BCHTImportBlockTestCase(unittest.TestCase):
+    def make_backend(self):
+        return BCHTDummyStorage()
+
     def setUp(self):
-        self.db = BCHTDummyStorage()
+        self.db = self.make_backend()
 
         self.blocks = []
         self.blocks.append(BCHTBlock(1, b"\x00" * 32, 0, 4, (
@@ -79,6 +89,29 @@ class BCHTImportBlockTestCase(unittest.TestCase):
         self.assertEqual(import_block.parse_curr_hashes(self.db),
                          (self.blocks[1].hash, self.blocks[2].hash, new_hash))
 
+    def test_add_duplicate(self):
+        import_block.add_hash_to_current(self.db, self.blocks[1].hash)
+
+        self.assertEqual(import_block.parse_curr_hashes(self.db),
+                         (self.blocks[1].hash, self.blocks[2].hash))
+
+    def test_migrate_curr_hashes(self):
+        import_block.migrate_curr_hashes(self.db)
+
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.db.getattr(b"curr_hashes")
+        self.assertTrue(import_block.is_current(self.db, self.blocks[2].hash))
+        self.assertFalse(import_block.is_current(self.db, self.blocks[0].hash))
+        self.assertEqual(import_block.parse_curr_hashes(self.db),
+                         (self.blocks[1].hash, self.blocks[2].hash))
+
+    def test_remove_hash_from_current(self):
+        import_block.remove_hash_from_current(self.db, self.blocks[1].hash)
+        import_block.remove_hash_from_current(self.db, self.blocks[0].hash)
+
+        self.assertEqual(import_block.parse_curr_hashes(self.db),
+                         (self.blocks[2].hash, ))
+
     def test_get_curr_blocks(self):
         self.assertEqual(import_block.get_curr_blocks(self.db), (
             self.blocks[1],
@@ -110,6 +143,11 @@ class BCHTImportBlockTestCase(unittest.TestCase):
         self.assertEqual(import_block.parse_curr_hashes(self.db),
                          (new_block.hash, ))
 
+        # The materialized state follows prev_hash
+        self.assertEqual(get_state_tip(self.db), self.blocks[1].hash)
+        self.assertEqual(get_state_votes(self.db, "www.example.com"),
+                         {attitudes.UPVOTE: 2})
+
     def test_import_block_fork(self):
         # We build a block on top of blocks[0]
         # Simulating we receiving more tha one blocks simutanously
@@ -141,6 +179,164 @@ class BCHTImportBlockTestCase(unittest.TestCase):
             new_block.hash
         ))
 
+    def test_best_hash(self):
+        # Work is the same for every block, so the first block seen stays on a tie
+        self.assertEqual(import_block.get_best_hash(self.db), self.blocks[1].hash)
+
+        new_block, _ = attempt(1, self.blocks[2].hash, 5, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        import_block.import_block(self.db, new_block)
+        self.assertEqual(import_block.get_best_hash(self.db), new_block.hash)
+
+    def test_deep_reorg(self):
+        def add(prev_hash, i):
+            # Skipping the proof-of-work, as _import_block would do after validation
+            block = BCHTBlock(1, prev_hash, 10 + i, i, (
+                BCHTEntry(f"www.example{i}.com", attitudes.UPVOTE),
+            ))
+            self.db.put(block)
+            meta = index.index_block(self.db, block, index.ensure_indexed(self.db, prev_hash))
+            import_block.update_best_tip(self.db, block, meta)
+            sync_state(self.db)
+            return block.hash
+
+        main_tip = self.blocks[1].hash
+        for i in range(5):
+            main_tip = add(main_tip, i)
+        self.assertEqual(import_block.get_best_hash(self.db), main_tip)
+
+        # A fork from blocks[2] catching up does not win a tie...
+        fork_tip = self.blocks[2].hash
+        for i in range(100, 105):
+            fork_tip = add(fork_tip, i)
+        self.assertEqual(import_block.get_best_hash(self.db), main_tip)
+        self.assertEqual(import_block.parse_curr_hashes(self.db), (main_tip, ))
+
+        # ...but overtakes the main chain with one more block
+        prev_hash = fork_tip
+        fork_tip = add(fork_tip, 105)
+        self.assertEqual(import_block.get_best_hash(self.db), fork_tip)
+        self.assertEqual(import_block.parse_curr_hashes(self.db), (fork_tip, ))
+        self.assertEqual(self.db.getattr(b"prev_hash"), prev_hash)
+        self.assertEqual(get_state_tip(self.db), prev_hash)
+        self.assertEqual(get_state_votes(self.db, "www.example0.com"), {})
+        self.assertEqual(get_state_votes(self.db, "www.example104.com"),
+                         {attitudes.UPVOTE: 1})
+
+    def test_remove_block(self):
+        import_block.remove_block(self.db, self.blocks[2].hash)
+
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            self.db.get(self.blocks[2].hash)
+        self.assertEqual(import_block.parse_curr_hashes(self.db),
+                         (self.blocks[1].hash, ))
+
+
+class BCHTLevelDBImportBlockTestCase(BCHTImportBlockTestCase):
+    # Reorganizations walk the attributes in reverse, see BCHTLevelDBStorage.iter_attrs
+    make_backend = backend_maker("LevelDB")
+
+
+class BCHTImportBlocksTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.mined = [BCHTBlock(1, b"\x00" * 32, 0, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))]
+        for i in range(2):
+            block, _ = attempt(1, cls.mined[-1].hash, i + 1, (
+                BCHTEntry("www.example.com", attitudes.UPVOTE),
+            ))
+            cls.mined.append(block)
+
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+        # genesis -> main[1] -> main[2] -> main[3]
+        #                    -> fork
+        self.main = [BCHTBlock(1, b"\x00" * 32, 0, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))]
+        for i in range(1, 4):
+            self.main.append(self.make(self.main[-1], i))
+        self.fork = self.make(self.main[1], 100)
+
+    def tearDown(self):
+        self.db.close()
+
+    def make(self, prev_block, i, creation_time=None):
+        # Not mined, so validate is replaced in the tests importing them
+        return BCHTBlock(1, prev_block.hash,
+                         prev_block.creation_time + 1 if creation_time is None else creation_time,
+                         i, (BCHTEntry(f"www.example{i}.com", attitudes.UPVOTE), ))
+
+    def statuses(self, outcomes):
+        return [outcome.status for outcome in outcomes]
+
+    @mock.patch.object(import_block, "validate", return_value=True)
+    def testOrder(self, _):
+        import_block.import_block(self.db, self.main[0])
+        orphan = self.make(BCHTBlock(1, b"\x01" * 32, 0, 0, ()), 200)
+        orphan_child = self.make(orphan, 201)
+        blocks = self.main + [self.fork]
+        random.Random(0).shuffle(blocks)
+        blocks += [orphan_child, orphan, self.main[2]]
+
+        outcomes = import_block.import_blocks(self.db, blocks, workers=1)
+        self.assertEqual([outcome.block_hash for outcome in outcomes],
+                         [block.hash for block in blocks])
+        expected = {block.hash: import_block.IMPORTED for block in self.main[1:]}
+        expected[self.fork.hash] = import_block.IMPORTED
+        expected[self.main[0].hash] = import_block.DUPLICATE
+        expected[orphan.hash] = expected[orphan_child.hash] = import_block.ORPHAN
+        self.assertEqual(dict(zip((block.hash for block in blocks[:-1]),
+                                  self.statuses(outcomes))), expected)
+        self.assertEqual(outcomes[-1].status, import_block.DUPLICATE)
+        self.assertEqual(outcomes[-1].reason, "Given more than once")
+
+        self.assertEqual(import_block.get_best_hash(self.db), self.main[3].hash)
+        self.assertEqual(import_block.parse_curr_hashes(self.db), (self.main[3].hash, ))
+        self.assertEqual(get_state_tip(self.db), self.main[2].hash)
+        self.assertEqual(get_state_votes(self.db, "www.example2.com"), {attitudes.UPVOTE: 1})
+        self.assertEqual(get_state_votes(self.db, "www.example100.com"), {})
+        self.assertEqual(index.get_main_chain_hash(self.db, 2), self.main[2].hash)
+        self.assertEqual(index.get_children(self.db, self.main[1].hash),
+                         (self.main[2].hash, self.fork.hash))
+        for block in self.main[1:]:
+            self.assertEqual(self.db.get(block.hash), block)
+
+    @mock.patch.object(import_block, "validate", return_value=True)
+    def testInvalid(self, _):
+        early = self.make(self.main[1], 300, creation_time=0)
+        outcomes = import_block.import_blocks(
+            self.db, [self.make(early, 301), early] + self.main[:2], workers=1)
+        self.assertEqual(self.statuses(outcomes), [
+            import_block.INVALID, import_block.INVALID,
+            import_block.IMPORTED, import_block.IMPORTED])
+        self.assertEqual(outcomes[0].reason, "Previous block invalid")
+        self.assertFalse(self.db.contains(early.hash))
+
+    @mock.patch.object(import_block, "validate", return_value=True)
+    def testBatches(self, _):
+        seen = []
+        outcomes = import_block.import_blocks(
+            self.db, reversed(self.main), workers=1, batch_size=3,
+            progress=lambda done, total: seen.append((done, total)))
+        self.assertEqual(self.statuses(outcomes), [import_block.IMPORTED] * 4)
+        self.assertEqual(seen, [(3, 4), (4, 4)])
+        self.assertEqual(import_block.get_best_hash(self.db), self.main[3].hash)
+
+        with self.assertRaises(exceptions.BCHTOutOfRangeError):
+            import_block.import_blocks(self.db, self.main, batch_size=0)
+
+    @mock.patch.object(import_block, "MIN_PARALLEL_BLOCKS", 1)
+    def testParallel(self):
+        unmined = self.make(self.mined[1], 400)
+        outcomes = import_block.import_blocks(self.db, self.mined + [unmined], workers=2)
+        self.assertEqual(self.statuses(outcomes), [import_block.IMPORTED] * 3 + [
+            import_block.INVALID])
+        self.assertEqual(import_block.get_best_hash(self.db), self.mined[-1].hash)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,181 @@
+# bchosttrust/tests/storage_aio.py
+# Test bchosttrust.storage.aio.BCHTAsyncStorage
+# canonical: bchosttrust.storage.meta.BCHTStorageBase.getattr_cached
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from os import path
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage, BCHTSQLiteStorage
+from bchosttrust.storage.aio import BCHTAsyncStorage
+from bchosttrust.storage.import_block import import_block
+from bchosttrust.analysis import search
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTAsyncStorageTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+        self.blocks = []
+        prev_hash = b"\x00" * 32
+        for i in range(10):
+            block = BCHTBlock(1, prev_hash, 10 + i, i, (
+                BCHTEntry(f"www.example{i % 3}.com", attitudes.UPVOTE),
+            ))
+            # Skipping the proof-of-work, as only the reads are tested
+            self.db.put(block)
+            self.blocks.append(block)
+            prev_hash = block.hash
+
+    async def asyncSetUp(self):
+        self.adb = BCHTAsyncStorage(self.db, max_workers=2, batch_size=3)
+
+    async def asyncTearDown(self):
+        await self.adb.aclose()
+        self.db.close()
+
+    async def testGet(self):
+        self.assertEqual(await self.adb.aget(self.blocks[0].hash), self.blocks[0])
+        hashes = [block.hash for block in reversed(self.blocks)]
+        self.assertEqual(await self.adb.aget_many(hashes), tuple(reversed(self.blocks)))
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            await self.adb.aget(b"\x01" * 32)
+
+    async def testCoalesce(self):
+        reads = []
+        release = threading.Event()
+        get = self.db.get
+
+        def slow_get(block_hash):
+            reads.append(block_hash)
+            release.wait()
+            return get(block_hash)
+        self.db.get = slow_get
+
+        tasks = [asyncio.create_task(self.adb.aget(self.blocks[0].hash)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        # The loop stays responsive meanwhile
+        self.assertFalse(any(task.done() for task in tasks))
+        release.set()
+        self.assertEqual(await asyncio.gather(*tasks), [self.blocks[0]] * 5)
+        self.assertEqual(reads, [self.blocks[0].hash])
+
+        # Later reads go to the backend again
+        await self.adb.aget(self.blocks[0].hash)
+        self.assertEqual(len(reads), 2)
+
+    async def testPut(self):
+        block = BCHTBlock(1, b"\x00" * 32, 100, 0, ())
+        await self.adb.aput(block)
+        self.assertEqual(self.db.get(block.hash), block)
+
+    async def testSerialized(self):
+        running = []
+        overlapped = []
+        put = self.db.put
+
+        def slow_put(block_data):
+            running.append(block_data)
+            overlapped.append(len(running) > 1)
+            time.sleep(0.01)
+            running.remove(block_data)
+            put(block_data)
+        self.db.put = slow_put
+
+        await asyncio.gather(*(self.adb.aput(BCHTBlock(1, b"\x00" * 32, 100 + i, 0, ()))
+                               for i in range(6)))
+        # BCHTDummyStorage is not thread-safe
+        self.assertEqual(overlapped, [False] * 6)
+
+    async def testIter(self):
+        blocks = [block async for block in self.adb.aiter_blocks()]
+        self.assertCountEqual(blocks, self.blocks)
+
+        walked = [block async for block in self.adb.aiter_from_block(self.blocks[-1].hash)]
+        self.assertEqual(walked, self.blocks[::-1])
+
+        async for block in self.adb.aiter_from_block(self.blocks[-1].hash):
+            self.assertEqual(block, self.blocks[-1])
+            break
+
+    async def testSearch(self):
+        tip = self.blocks[-1].hash
+        self.assertEqual(await self.adb.aget_website_votes(tip),
+                         search.get_website_votes(self.db, tip))
+        self.assertEqual(await self.adb.aget_specific_website_rating(tip, "www.example0.com"), 4)
+        self.assertEqual(await self.adb.aget_website_rating(tip, since=15),
+                         search.get_website_rating(self.db, tip, since=15))
+
+    async def testMainChain(self):
+        genesis = BCHTBlock(1, b"\x00" * 32, 0, 0, ())
+        import_block(self.db, genesis)
+        self.assertEqual([block async for block in self.adb.aiter_main_chain_blocks()], [])
+
+
+class BCHTAsyncSQLiteTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db = BCHTSQLiteStorage(
+            path.join(self.temp_dir.name, "test.sqlite"), secondary_indexes=True)
+
+    async def asyncTearDown(self):
+        self.db.close()
+
+    async def testConcurrentPut(self):
+        blocks = [BCHTBlock(1, b"\x00" * 32, i, 0, (
+            BCHTEntry(f"www.example{i % 7}.com", attitudes.UPVOTE),
+        )) for i in range(400)]
+        async with BCHTAsyncStorage(self.db, max_workers=8) as adb:
+            await asyncio.gather(*(adb.aput(block) for block in blocks))
+            self.assertEqual(await adb.aget_many(block.hash for block in blocks),
+                             tuple(blocks))
+        self.assertEqual(len(list(self.db.iter_raw_blocks())), 400)
+
+    async def testReadWhileWriting(self):
+        names = tuple(b"attr-%03d" % i for i in range(200))
+        self.db.setattr_many((name, b"0") for name in names)
+        async with BCHTAsyncStorage(self.db, max_workers=4, batch_size=1) as adb:
+            async def write():
+                for i in range(20):
+                    # Rewriting the rows the readers are going through
+                    await adb.run(self.db.setattr_many, tuple((name, b"%d" % i) for name in names))
+
+            async def read():
+                return tuple([name async for name, _ in adb.aiter(self.db.iter_attrs())])
+
+            results = await asyncio.gather(write(), read(), read(), read())
+        for result in results[1:]:
+            self.assertEqual(result, names)
+
+
+if __name__ == '__main__':
+    unittest.main()
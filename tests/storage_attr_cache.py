@@ -0,0 +1,93 @@
+# bchosttrust/tests/storage_attr_cache.py
+# Test BCHTStorageBase.getattr_cached
+# canonical: bchosttrust.storage.meta.BCHTStorageBase.getattr_cached
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from backends import for_each_backend
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import import_block
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+# SQLite does not cache attributes, as other processes may change them
+@for_each_backend("Dummy", "LevelDB")
+class BCHTAttrCacheTests:
+    def setUp(self):
+        self.backend = self.make_backend()
+        self.reads = []
+        getattr_uncached = self.backend.getattr
+
+        def counting_getattr(attr_name):
+            self.reads.append(attr_name)
+            return getattr_uncached(attr_name)
+        self.backend.getattr = counting_getattr
+
+    def tearDown(self):
+        self.backend.close()
+
+    def testWriteThrough(self):
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.backend.getattr_cached(b"test")
+        self.backend.setattr(b"test", b"1")
+        self.assertEqual(self.backend.getattr_cached(b"test"), b"1")
+        self.backend.setattr(b"test", b"2")
+        self.assertEqual(self.backend.getattr_cached(b"test"), b"2")
+        self.backend.delattr(b"test")
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.backend.getattr_cached(b"test")
+        self.assertEqual(self.reads, [b"test"])
+
+    def testParsed(self):
+        self.backend.setattr(b"curr_hashes", b"\x01" * 32 + b"\x02" * 32)
+        first = import_block.parse_curr_hashes(self.backend)
+        self.assertEqual(first, (b"\x01" * 32, b"\x02" * 32))
+        self.assertIs(import_block.parse_curr_hashes(self.backend), first)
+
+        import_block.add_hash_to_current(self.backend, b"\x03" * 32)
+        self.assertEqual(import_block.parse_curr_hashes(self.backend),
+                         (b"\x01" * 32, b"\x02" * 32, b"\x03" * 32))
+        self.assertTrue(import_block.is_current(self.backend, b"\x03" * 32))
+        import_block.remove_hash_from_current(self.backend, b"\x01" * 32)
+        self.assertEqual(import_block.parse_curr_hashes(self.backend),
+                         (b"\x02" * 32, b"\x03" * 32))
+        self.assertEqual(self.reads, [b"curr_hashes", import_block.TIP_RANGE])
+
+    def testImport(self):
+        block = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        import_block.import_block(self.backend, block)
+        import_block.import_block(self.backend, block)
+        self.assertEqual(import_block.parse_curr_hashes(self.backend), (block.hash, ))
+        # Every tip attribute is read at most once
+        self.assertEqual(len(self.reads), len(set(self.reads)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# bchosttrust/tests/storage_batch.py
+# Test bchosttrust.storage.batch
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+from unittest import mock
+
+from bchosttrust import BCHTBlock, BCHTEntry, attitudes, exceptions
+from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage.batch import BCHTBatchOverlay
+
+
+class BCHTBatchOverlayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+        self.overlay = BCHTBatchOverlay(self.db)
+        self.blocks = [BCHTBlock(1, bytes([i]) * 32, 0, i, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(3)]
+        self.db.put(self.blocks[0])
+        self.db.setattr_many(((b"a1", b"1"), (b"a3", b"3"), (b"b1", b"4")))
+
+    def tearDown(self):
+        self.overlay.close()
+        self.db.close()
+
+    def test_blocks(self):
+        self.overlay.put(self.blocks[1])
+        self.overlay.delete(self.blocks[0].hash)
+        self.assertEqual(self.overlay.get(self.blocks[1].hash), self.blocks[1])
+        self.assertFalse(self.overlay.contains(self.blocks[0].hash))
+        self.assertTrue(self.db.contains(self.blocks[0].hash))
+        self.assertFalse(self.db.contains(self.blocks[1].hash))
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            self.overlay.get(self.blocks[0].hash)
+        self.assertEqual(dict(self.overlay.iter_blocks_with_key()),
+                         {self.blocks[1].hash: self.blocks[1]})
+
+        self.overlay.flush()
+        self.assertEqual(len(self.overlay), 0)
+        self.assertEqual(dict(self.db.iter_blocks_with_key()),
+                         {self.blocks[1].hash: self.blocks[1]})
+
+    def test_attrs(self):
+        self.overlay.setattr(b"a2", b"2")
+        self.overlay.setattr(b"a3", b"33")
+        self.overlay.delattr(b"a1")
+        self.overlay.setattr(b"a4", b"x")
+        self.overlay.delattr(b"a4")
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.overlay.delattr(b"a4")
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.overlay.getattr(b"a1")
+
+        expected = [(b"a2", b"2"), (b"a3", b"33")]
+        self.assertEqual(list(self.overlay.iter_attrs(b"a")), expected)
+        self.assertEqual(list(self.overlay.iter_attrs(b"a", reverse=True)),
+                         expected[::-1])
+        self.assertEqual(list(self.overlay.iter_attrs(start=b"a3")),
+                         [(b"a3", b"33"), (b"b1", b"4")])
+        self.assertEqual(list(self.overlay.iter_attrs(stop=b"a3")), [(b"a2", b"2")])
+        self.assertEqual(self.db.getattr(b"a3"), b"3")
+
+        # The deletions are written together with the rest
+        with mock.patch.object(self.db, "setattr_many", wraps=self.db.setattr_many) as many:
+            self.overlay.flush()
+        many.assert_called_once()
+        self.assertEqual(set(many.call_args.args[0]),
+                         {(b"a1", None), (b"a2", b"2"), (b"a3", b"33")})
+        self.assertEqual(list(self.db.iter_attrs()),
+                         [(b"a2", b"2"), (b"a3", b"33"), (b"b1", b"4")])
+
+    def test_failed_flush(self):
+        self.overlay.put(self.blocks[1])
+        self.overlay.setattr(b"a2", b"2")
+        with mock.patch.object(self.db, "setattr_many", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.overlay.flush()
+        # Kept, and flushed again
+        self.assertEqual(len(self.overlay), 2)
+        self.assertTrue(self.db.contains(self.blocks[1].hash))
+        self.overlay.flush()
+        self.assertEqual(self.db.getattr(b"a2"), b"2")
+
+    def test_discard(self):
+        self.overlay.put(self.blocks[2])
+        self.overlay.setattr(b"a1", b"0")
+        self.assertEqual(self.overlay.getattr(b"a1"), b"0")
+        self.overlay.discard()
+        self.assertEqual(self.overlay.getattr(b"a1"), b"1")
+        self.assertFalse(self.overlay.contains(self.blocks[2].hash))
+        self.overlay.flush()
+        self.assertFalse(self.db.contains(self.blocks[2].hash))
+
+
+if __name__ == '__main__':
+    unittest.main()
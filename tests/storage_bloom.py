@@ -0,0 +1,131 @@
+# bchosttrust/tests/storage_bloom.py
+# Test bchosttrust.storage.bloom and BCHTStorageBase.contains
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+
+import unittest
+import tempfile
+from hashlib import sha3_256
+from os import path
+
+from backends import for_each_backend, backend_maker
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage.bloom import BCHTBloomFilter
+from bchosttrust.storage.uri import open_storage
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTBloomFilterTestCase(unittest.TestCase):
+    def testFilter(self):
+        known = BCHTBloomFilter(1000, 0.01)
+        hashes = [sha3_256(i.to_bytes(4)).digest() for i in range(2000)]
+        known.update(hashes[:1000])
+        self.assertEqual(len(known), 1000)
+        for block_hash in hashes[:1000]:
+            self.assertIn(block_hash, known)
+        false_positives = sum(block_hash in known for block_hash in hashes[1000:])
+        self.assertLess(false_positives, 40)
+
+        # Keys too short to take the positions from are hashed
+        known.add(b"short")
+        self.assertIn(b"short", known)
+
+    def testInvalid(self):
+        with self.assertRaises(ValueError):
+            BCHTBloomFilter(0)
+        with self.assertRaises(ValueError):
+            BCHTBloomFilter(10, 1.0)
+
+
+# LevelDB is run below, with its own tests
+@for_each_backend("Dummy", "Memory", "LevelDBCodec", "Segment", "SQLite", "Sharded")
+class BCHTContainsTests:
+    def setUp(self):
+        self.db = self.make_backend()
+        self.blocks = [BCHTBlock(1, b"\x00" * 32, i, i, (
+            BCHTEntry(f"www.example{i}.com", attitudes.UPVOTE),
+        )) for i in range(3)]
+        self.db.put(self.blocks[0])
+
+    def tearDown(self):
+        if not self.db.closed:
+            self.db.close()
+
+    def check(self):
+        self.assertTrue(self.db.contains(self.blocks[0].hash))
+        self.assertFalse(self.db.contains(self.blocks[2].hash))
+        with self.assertRaises(exceptions.BCHTInvalidHashError):
+            self.db.contains(b"\x00")
+
+    def testContains(self):
+        self.check()
+
+    def testKnownHashes(self):
+        self.db.load_known_hashes()
+        self.check()
+        # Blocks put afterwards are known
+        self.db.put(self.blocks[1])
+        self.assertTrue(self.db.contains(self.blocks[1].hash))
+        self.db.put_raw_many(((self.blocks[2].hash, self.blocks[2].raw), ))
+        self.assertTrue(self.db.contains(self.blocks[2].hash))
+        # and those deleted are looked up
+        self.db.delete(self.blocks[0].hash)
+        self.assertFalse(self.db.contains(self.blocks[0].hash))
+
+    def testClosed(self):
+        self.db.close()
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            self.db.contains(self.blocks[0].hash)
+
+
+class BCHTLevelDBContainsTestCase(BCHTContainsTests, unittest.TestCase):
+    make_backend = backend_maker("LevelDB")
+
+    def testFiltered(self):
+        self.db.load_known_hashes()
+        self.db.db_block.delete(self.blocks[0].hash)
+        # Answered by the filter, not by the database
+        self.db.db_block.put(self.blocks[2].hash, self.blocks[2].raw)
+        self.assertFalse(self.db.contains(self.blocks[2].hash))
+
+
+class BCHTOpenKnownHashesTestCase(unittest.TestCase):
+    def testOpen(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            uri = f"sqlite:{path.join(temp_dir, 'test.sqlite')}"
+            block = BCHTBlock(1, b"\x00" * 32, 0, 0, (
+                BCHTEntry("www.example.com", attitudes.UPVOTE),
+            ))
+            with open_storage(uri) as db:
+                db.put(block)
+            with open_storage(uri, {"known_hashes": True}) as db:
+                self.assertIsNotNone(db._known_hashes)  # pylint: disable=protected-access
+                self.assertTrue(db.contains(block.hash))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+# bchosttrust/tests/storage_chainstate.py
+# Test bchosttrust.storage.chainstate
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import random
+import unittest
+from unittest import mock
+
+from backends import backend_maker
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage import chainstate
+from bchosttrust.storage.index import ensure_indexed
+from bchosttrust import attitudes
+from bchosttrust.analysis import search
+
+
+class BCHTChainStateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+
+        # Not caring about satisfying PoW here
+        # block1 -> block2 -> block3
+        #        -> fork1  -> fork2  -> fork3
+        self.block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        self.block2 = BCHTBlock(1, self.block1.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.block3 = BCHTBlock(1, self.block2.hash, 0, 4, (
+            BCHTEntry("www.example.org", attitudes.UPVOTE),
+        ))
+        self.fork1 = BCHTBlock(1, self.block1.hash, 0, 5, (
+            BCHTEntry("www.example.edu", attitudes.UPVOTE),
+        ))
+        self.fork2 = BCHTBlock(1, self.fork1.hash, 0, 5, (
+            BCHTEntry("www.example.edu", attitudes.UPVOTE),
+        ))
+        self.fork3 = BCHTBlock(1, self.fork2.hash, 0, 5, (
+            BCHTEntry("www.example.net", attitudes.UPVOTE),
+        ))
+
+        for block in (self.block1, self.block2, self.block3,
+                      self.fork1, self.fork2, self.fork3):
+            self.db.put(block)
+        ensure_indexed(self.db, self.block3.hash)
+        ensure_indexed(self.db, self.fork3.hash)
+
+    def tearDown(self):
+        self.db.close()
+
+    def ratings(self):
+        return {name: votes[attitudes.UPVOTE]
+                for name, votes in chainstate.iter_state_votes(self.db)}
+
+    def test_find_fork(self):
+        revert, apply = chainstate.find_fork(
+            self.db, self.block3.hash, self.fork3.hash)
+
+        self.assertEqual(revert, (self.block3.hash, self.block2.hash))
+        self.assertEqual(
+            apply, (self.fork1.hash, self.fork2.hash, self.fork3.hash))
+
+    def test_move_state(self):
+        chainstate.move_state(self.db, self.block3.hash)
+
+        self.assertEqual(chainstate.get_state_tip(self.db), self.block3.hash)
+        self.assertDictEqual(self.ratings(), {
+            "www.example.com": 2,
+            "www.example.net": 1,
+            "www.example.org": 1
+        })
+
+    def test_move_state_reorg(self):
+        chainstate.move_state(self.db, self.block3.hash)
+        chainstate.move_state(self.db, self.fork3.hash)
+
+        self.assertDictEqual(self.ratings(), {
+            "www.example.com": 1,
+            "www.example.net": 2,
+            "www.example.edu": 2
+        })
+
+        chainstate.move_state(self.db, b"\x00" * 32)
+
+        self.assertDictEqual(self.ratings(), {})
+
+    def test_move_state_atomic(self):
+        chainstate.move_state(self.db, self.block3.hash)
+        before = dict(self.db.iter_attrs())
+
+        with mock.patch.object(self.db, "setattr", side_effect=OSError), \
+                mock.patch.object(self.db, "delattr", side_effect=OSError), \
+                mock.patch.object(self.db, "setattr_many", side_effect=OSError):
+            with self.assertRaises(OSError):
+                chainstate.move_state(self.db, self.fork3.hash)
+
+        self.assertEqual(dict(self.db.iter_attrs()), before)
+
+    def test_main_chain(self):
+        chainstate.move_state(self.db, self.block3.hash)
+
+        self.assertEqual(tuple(chainstate.iter_main_chain(self.db)), (
+            (0, self.block1.hash),
+            (1, self.block2.hash),
+            (2, self.block3.hash)
+        ))
+
+        chainstate.move_state(self.db, self.fork3.hash)
+
+        self.assertEqual(tuple(chainstate.iter_main_chain(self.db)), (
+            (0, self.block1.hash),
+            (1, self.fork1.hash),
+            (2, self.fork2.hash),
+            (3, self.fork3.hash)
+        ))
+        self.assertEqual(
+            tuple(chainstate.iter_main_chain(self.db, 1, 3, reverse=True)),
+            ((2, self.fork2.hash), (1, self.fork1.hash)))
+
+        chainstate.move_state(self.db, self.block2.hash)
+
+        self.assertEqual(tuple(chainstate.iter_main_chain(self.db)), (
+            (0, self.block1.hash),
+            (1, self.block2.hash)
+        ))
+        self.assertDictEqual(self.ratings(), {
+            "www.example.com": 2,
+            "www.example.net": 1
+        })
+
+    def test_main_chain_legacy(self):
+        chainstate.move_state(self.db, self.fork2.hash)
+        # As written before the heights were recorded
+        for key, _ in tuple(self.db.iter_attrs(chainstate.HEIGHT_PREFIX)):
+            self.db.delattr(key)
+
+        chainstate.move_state(self.db, self.fork2.hash)
+        self.assertEqual(tuple(chainstate.iter_main_chain(self.db)), (
+            (0, self.block1.hash),
+            (1, self.fork1.hash),
+            (2, self.fork2.hash)
+        ))
+
+        # As recorded before only the blocks applied were
+        self.db.delattr(chainstate.HEIGHT_PREFIX + (0).to_bytes(8))
+        chainstate.move_state(self.db, self.block3.hash)
+        self.assertEqual(tuple(chainstate.iter_main_chain(self.db)), (
+            (0, self.block1.hash),
+            (1, self.block2.hash),
+            (2, self.block3.hash)
+        ))
+        self.assertDictEqual(self.ratings(), {
+            "www.example.com": 2,
+            "www.example.net": 1,
+            "www.example.org": 1
+        })
+
+    def test_search_main_chain(self):
+        chainstate.move_state(self.db, self.block3.hash)
+
+        self.assertEqual(tuple(search.iter_main_chain_blocks(self.db, reverse=True)),
+                         tuple(search.iter_from_block(self.db, self.block3.hash)))
+        # block2 is in the main chain, so the postings need no walk
+        self.assertEqual(search.get_specific_website_rating(
+            self.db, self.block2.hash, "www.example.com"), 2)
+
+    def test_search_uses_state(self):
+        chainstate.move_state(self.db, self.fork3.hash)
+
+        self.assertEqual(search.get_website_rating(self.db, self.fork3.hash),
+                         search.get_website_rating(self.db, self.fork2.hash)
+                         | {"www.example.net": 2})
+        self.assertEqual(search.get_specific_website_rating(
+            self.db, self.fork3.hash, "www.example.edu"), 2)
+
+
+class BCHTChainStateBackendsTestCase(unittest.TestCase):
+    # The backends keeping their attributes in LevelDB, compared with BCHTDummyStorage
+
+    def setUp(self):
+        self.backends = {name: backend_maker(name)(self)
+                         for name in ("Dummy", "LevelDB", "Sharded", "Segment")}
+        for backend in self.backends.values():
+            self.addCleanup(backend.close)
+
+    def put(self, *blocks):
+        for backend in self.backends.values():
+            for block in blocks:
+                backend.put(block)
+                ensure_indexed(backend, block.hash)
+
+    def ratings(self, backend):
+        return dict(chainstate.iter_state_votes(backend))
+
+    def test_one_block_reorg(self):
+        block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        block2 = BCHTBlock(1, block1.hash, 0, 4, (
+            BCHTEntry("www.example.net", attitudes.UPVOTE),
+        ))
+        fork1 = BCHTBlock(1, block1.hash, 0, 5, (
+            BCHTEntry("www.example.org", attitudes.UPVOTE),
+        ))
+        self.put(block1, block2, fork1)
+
+        for name, backend in self.backends.items():
+            with self.subTest(backend=name):
+                chainstate.move_state(backend, block2.hash)
+                chainstate.move_state(backend, fork1.hash)
+                self.assertEqual(self.ratings(backend), {
+                    "www.example.com": {attitudes.UPVOTE: 1},
+                    "www.example.org": {attitudes.UPVOTE: 1},
+                })
+
+    def test_random_moves(self):
+        rng = random.Random(0)
+        blocks = [BCHTBlock(1, b"\x00" * 32, 0, 0, ())]
+        for i in range(1, 80):
+            prev_block = blocks[max(0, len(blocks) - rng.randint(1, 4))]
+            blocks.append(BCHTBlock(1, prev_block.hash, 0, i, tuple(
+                BCHTEntry(f"www.example{rng.randrange(20)}.com",
+                          attitudes.UPVOTE)
+                for _ in range(rng.randint(0, 3)))))
+        self.put(*blocks)
+
+        for step in range(60):
+            target = rng.choice(blocks).hash
+            for backend in self.backends.values():
+                chainstate.move_state(backend, target)
+            expected = self.ratings(self.backends["Dummy"])
+            for name, backend in self.backends.items():
+                with self.subTest(backend=name, step=step):
+                    self.assertEqual(self.ratings(backend), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# bchosttrust/tests/storage_codec.py
+# Test bchosttrust.storage.BCHTLevelDBStorage with the domain dictionary codecs
+# canonical: bchosttrust.storage.codec
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+from os import path
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTLevelDBStorage, BCHTShardedStorage
+from bchosttrust import attitudes
+
+
+class BCHTDomainDictionaryCodecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.name = path.join(self.temp_dir.name, "test.db")
+        self.blocks = tuple(BCHTBlock(1, b"\x00" * 32, i, 4, tuple(
+            BCHTEntry(f"www.example{(i + j) % 7}.com", attitudes.UPVOTE if j % 2 else 2)
+            for j in range(i % 5 + 1))) for i in range(200))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, codec=None, name=None):
+        return BCHTLevelDBStorage.init_db(
+            name=name or self.name, create_if_missing=True, codec=codec)
+
+    def testRoundTrip(self):
+        backend = self.open("dict")
+        for block in self.blocks:
+            backend.put(block)
+
+        for block in self.blocks:
+            self.assertEqual(backend.get_raw(block.hash), block.raw)
+            self.assertEqual(backend.get(block.hash).hash, block.hash)
+        self.assertEqual(
+            list(backend.iter_raw_blocks()),
+            sorted((block.hash, block.raw) for block in self.blocks))
+        self.assertEqual(
+            sorted(block.hash for block in backend.iter_blocks()),
+            sorted(block.hash for block in self.blocks))
+        with backend.snapshot() as snapshot:
+            self.assertEqual(snapshot.get_raw(self.blocks[3].hash), self.blocks[3].raw)
+        backend.close()
+
+    def testSmaller(self):
+        backend = self.open("dict")
+        for block in self.blocks:
+            backend.put(block)
+
+        stored = sum(len(value) for _, value in backend.db_block)
+        self.assertLess(stored, sum(len(block.raw) for block in self.blocks) * 3 // 4)
+        backend.close()
+
+    def testPersistent(self):
+        backend = self.open("dict")
+        for block in self.blocks[:100]:
+            backend.put(block)
+        backend.close()
+
+        # Reopened with the codec it was created with, and the same dictionary
+        backend = self.open()
+        for block in self.blocks[100:]:
+            backend.put(block)
+        self.assertIsNotNone(backend.codec)
+        self.assertEqual(len(list(backend.db.iterator(prefix=b"dict-i"))), 7)
+        for block in self.blocks:
+            self.assertEqual(backend.get_raw(block.hash), block.raw)
+        backend.close()
+
+    def testFailedBatch(self):
+        first = BCHTBlock(1, b"\x00" * 32, 0, 4, (BCHTEntry("www.new.com", attitudes.UPVOTE), ))
+        second = BCHTBlock(1, b"\x00" * 32, 1, 4, (BCHTEntry("www.new.com", attitudes.UPVOTE), ))
+
+        def items():
+            yield first.hash, first.raw
+            raise OSError("Interrupted")
+
+        backend = self.open("dict")
+        with self.assertRaises(OSError):
+            backend.put_raw_many(items())
+        # The ID given to www.new.com in the batch given up is not reused unwritten
+        backend.put(second)
+        backend.close()
+
+        backend = self.open()
+        self.assertEqual(backend.get_raw(second.hash), second.raw)
+        self.assertFalse(backend.contains(first.hash))
+        backend.close()
+
+    def testSwitchFromRaw(self):
+        backend = self.open()
+        backend.put(self.blocks[0])
+        backend.close()
+
+        with self.assertRaises(ValueError):
+            self.open("dict")
+
+        backend = self.open("raw")
+        self.assertIsNone(backend.codec)
+        self.assertEqual(backend.get_raw(self.blocks[0].hash), self.blocks[0].raw)
+        backend.close()
+
+    def testUnknown(self):
+        with self.assertRaises(ValueError):
+            self.open("dict+zlib")
+
+    def testSharded(self):
+        names = tuple(path.join(self.temp_dir.name, f"shard{i}.db") for i in range(4))
+        backend = BCHTShardedStorage.init_db(names, create_if_missing=True, codec="dict")
+        backend.put_many(self.blocks)
+
+        for block in self.blocks:
+            self.assertEqual(backend.get_raw(block.hash), block.raw)
+        backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -84,6 +84,40 @@ class BCHTLevelDBStorageTestCase(unittest.TestCase):
         with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
             backend.getattr(attr_key)
 
+    def testAttrWriteMany(self):
+        backend = BCHTDummyStorage()
+
+        backend.setattr(b"a", b"1")
+        backend.setattr(b"b", b"2")
+
+        backend.setattr_many(((b"a", None), (b"c", b"3"), (b"d", None), (b"b", b"4")))
+
+        self.assertEqual(tuple(backend.iter_attrs()), ((b"b", b"4"), (b"c", b"3")))
+
+    def testAttrIteration(self):
+        backend = BCHTDummyStorage()
+
+        backend.setattr(b"fruit-pear", b"2")
+        backend.setattr(b"fruit-apple", b"1")
+        backend.setattr(b"vegetable-leek", b"3")
+
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-")), (
+            (b"fruit-apple", b"1"),
+            (b"fruit-pear", b"2")
+        ))
+        self.assertEqual(len(tuple(backend.iter_attrs())), 3)
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-", reverse=True)), (
+            (b"fruit-pear", b"2"),
+            (b"fruit-apple", b"1")
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(
+            b"fruit-", start=b"fruit-b", stop=b"fruit-q")), (
+            (b"fruit-pear", b"2"),
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(start=b"g")), (
+            (b"vegetable-leek", b"3"),
+        ))
+
     def testIteration(self):
         backend = BCHTDummyStorage()
 
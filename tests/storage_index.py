@@ -0,0 +1,192 @@
+# bchosttrust/tests/storage_index.py
+# Test bchosttrust.storage.index
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage import index
+from bchosttrust.storage.import_block import import_block
+from bchosttrust.storage.reindex import reindex
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+from bchosttrust.consensus.powc import BLOCK_WORK
+
+
+class BCHTIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+
+        # Not caring about satisfying PoW here
+        self.block1 = BCHTBlock(1, b"\x00" * 32, 10, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        self.block2 = BCHTBlock(1, self.block1.hash, 20, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.block3 = BCHTBlock(1, self.block2.hash, 30, 4, (
+            BCHTEntry("www.example.org", attitudes.UPVOTE),
+        ))
+
+        for block in (self.block1, self.block2, self.block3):
+            self.db.put(block)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_meta_raw(self):
+        meta = index.BCHTBlockMeta(self.block1.hash, 3, 4, 5, 1 << 200)
+
+        self.assertEqual(index.BCHTBlockMeta.from_raw(meta.raw), meta)
+
+    def test_index_block(self):
+        index.index_block(self.db, self.block1)
+        meta = index.index_block(self.db, self.block2)
+
+        self.assertEqual(meta, index.get_block_meta(self.db, self.block2.hash))
+        self.assertEqual(meta.prev_hash, self.block1.hash)
+        self.assertEqual(meta.height, 1)
+        self.assertEqual(meta.creation_time, 20)
+        self.assertEqual(meta.entry_count, 1)
+        self.assertEqual(meta.work, BLOCK_WORK * 2)
+
+    def test_index_block_no_parent(self):
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            index.index_block(self.db, self.block2)
+
+    def test_ensure_indexed(self):
+        self.assertFalse(index.has_block_meta(self.db, self.block3.hash))
+
+        meta = index.ensure_indexed(self.db, self.block3.hash)
+
+        self.assertEqual(meta.height, 2)
+        for block in (self.block1, self.block2, self.block3):
+            self.assertTrue(index.has_block_meta(self.db, block.hash))
+
+    def test_fully_indexed(self):
+        index.ensure_indexed(self.db, self.block3.hash)
+        self.assertFalse(index.is_fully_indexed(self.db))
+        reindex(self.db)
+        self.assertTrue(index.is_fully_indexed(self.db))
+
+        with BCHTDummyStorage() as db:
+            import_block(db, self.block1)
+            self.assertTrue(index.is_fully_indexed(db))
+
+    def test_unindex_block(self):
+        index.ensure_indexed(self.db, self.block3.hash)
+        index.unindex_block(self.db, self.block3.hash)
+
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            index.get_block_meta(self.db, self.block3.hash)
+
+    def test_children(self):
+        fork = BCHTBlock(1, self.block1.hash, 25, 5, (
+            BCHTEntry("www.example.org", attitudes.UPVOTE),
+        ))
+        self.db.put(fork)
+        index.ensure_indexed(self.db, self.block3.hash)
+        index.ensure_indexed(self.db, fork.hash)
+
+        self.assertEqual(index.get_children(self.db, b"\x00" * 32),
+                         (self.block1.hash, ))
+        self.assertEqual(index.get_children(self.db, self.block1.hash),
+                         tuple(sorted((self.block2.hash, fork.hash))))
+        self.assertEqual(index.get_children(self.db, self.block3.hash), ())
+        self.assertEqual(set(index.iter_descendants(self.db, self.block1.hash)),
+                         {self.block2.hash, self.block3.hash, fork.hash})
+
+        index.unindex_block(self.db, fork.hash)
+
+        self.assertEqual(index.get_children(self.db, self.block1.hash),
+                         (self.block2.hash, ))
+
+    def test_domain_postings(self):
+        fork = BCHTBlock(1, self.block1.hash, 25, 5, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.db.put(fork)
+        index.ensure_indexed(self.db, self.block3.hash)
+        index.ensure_indexed(self.db, fork.hash)
+
+        postings = tuple(index.iter_domain_postings(
+            self.db, "www.example.com"))
+        self.assertEqual(len(postings), 3)
+        self.assertEqual(postings[0], index.BCHTDomainPosting(
+            self.block1.hash, 0, attitudes.UPVOTE))
+
+        # Only block1 and block2 are ancestors of block3
+        postings = tuple(index.iter_domain_postings(
+            self.db, "www.example.com", self.block3.hash))
+        self.assertEqual(tuple(p.block_hash for p in postings),
+                         (self.block2.hash, self.block1.hash))
+
+        # "www.example.co" must not match "www.example.com"
+        self.assertEqual(tuple(index.iter_domain_postings(
+            self.db, "www.example.co")), ())
+
+    def test_domain_seen(self):
+        index.ensure_indexed(self.db, self.block3.hash)
+
+        self.assertEqual(index.get_domain_seen(
+            self.db, "www.example.com"), (10, 20))
+        self.assertEqual(index.get_domain_seen(
+            self.db, "www.example.org"), (30, 30))
+        self.assertIsNone(index.get_domain_seen(self.db, "www.example.edu"))
+
+    def test_blocks_by_time(self):
+        fork = BCHTBlock(1, self.block1.hash, 25, 5, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.db.put(fork)
+        index.ensure_indexed(self.db, self.block3.hash)
+        index.ensure_indexed(self.db, fork.hash)
+
+        self.assertEqual(tuple(index.iter_blocks_by_time(self.db, 15, 30)),
+                         (self.block2.hash, fork.hash))
+        self.assertEqual(tuple(index.iter_blocks_by_time(self.db, since=20)),
+                         (self.block2.hash, fork.hash, self.block3.hash))
+        self.assertEqual(tuple(index.iter_blocks_by_time(
+            self.db, 15, tip_hash=self.block3.hash)),
+            (self.block2.hash, self.block3.hash))
+        self.assertEqual(tuple(index.iter_blocks_by_time(self.db, 2 ** 64, None)), ())
+        self.assertEqual(tuple(index.iter_blocks_by_time(self.db, -5, 2 ** 70)),
+                         (self.block1.hash, self.block2.hash, fork.hash, self.block3.hash))
+
+    def test_is_ancestor(self):
+        index.ensure_indexed(self.db, self.block3.hash)
+
+        self.assertTrue(index.is_ancestor(
+            self.db, self.block1.hash, self.block3.hash))
+        self.assertTrue(index.is_ancestor(
+            self.db, self.block3.hash, self.block3.hash))
+        self.assertFalse(index.is_ancestor(
+            self.db, self.block3.hash, self.block2.hash))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# bchosttrust/tests/storage_instrument.py
+# Test bchosttrust.storage.instrument
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+
+import json
+import unittest
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage.instrument import (BCHTInstrumentedStorage, BCHTStorageStats,
+                                            LATENCY_BUCKETS)
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTInstrumentedStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = BCHTInstrumentedStorage(BCHTDummyStorage())
+        self.block = BCHTBlock(1, b"\x00" * 32, 0, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+
+    def tearDown(self):
+        self.db.close()
+
+    def operations(self):
+        return self.db.stats.to_dict()["operations"]
+
+    def testCounts(self):
+        self.db.put(self.block)
+        self.assertEqual(self.db.get(self.block.hash), self.block)
+        self.assertEqual(list(self.db.iter_blocks()), [self.block])
+        self.db.setattr(b"key", b"value")
+        self.assertEqual(self.db.getattr(b"key"), b"value")
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.db.getattr(b"missing")
+
+        operations = self.operations()
+        size = len(self.block.raw)
+        self.assertEqual(operations["put"]["calls"], 1)
+        self.assertEqual(operations["put"]["bytes_written"], size)
+        self.assertEqual(operations["get_raw"]["bytes_read"], size)
+        self.assertEqual(operations["iter_raw_blocks"]["calls"], 1)
+        self.assertEqual(operations["iter_raw_blocks"]["bytes_read"], size)
+        self.assertEqual(operations["decode"]["calls"], 2)
+        self.assertEqual(operations["setattr"]["bytes_written"], 5)
+        # Failed calls are not recorded
+        self.assertEqual(operations["getattr"]["calls"], 1)
+        self.assertEqual(operations["getattr"]["bytes_read"], 5)
+        self.assertEqual(operations["getattr"]["sampled"], 1)
+        self.assertLessEqual(operations["getattr"]["p50"], LATENCY_BUCKETS[-1])
+
+    def testSampling(self):
+        self.db.stats.sample_rate = 0.0
+        self.db.put(self.block)
+        with self.db.stats.timer("analysis"):
+            self.db.get(self.block.hash)
+        operations = self.operations()
+        self.assertEqual(operations["get_raw"]["calls"], 1)
+        self.assertEqual(operations["get_raw"]["sampled"], 0)
+        self.assertIsNone(operations["get_raw"]["p99"])
+        self.assertEqual(operations["get_raw"]["histogram"], [])
+        self.assertEqual(operations["analysis"]["calls"], 1)
+
+    def testSnapshot(self):
+        self.db.put(self.block)
+        with self.db.snapshot() as snapshot:
+            self.assertIs(snapshot.stats, self.db.stats)
+            snapshot.get(self.block.hash)
+            self.db.delete(self.block.hash)
+            snapshot.get(self.block.hash)
+        self.assertEqual(self.operations()["get_raw"]["calls"], 2)
+
+    def testExport(self):
+        self.db.put(self.block)
+        self.assertEqual(json.loads(self.db.stats.to_json()), self.db.stats.to_dict())
+        self.db.stats.reset()
+        self.assertEqual(self.operations(), {})
+
+
+class BCHTStorageStatsTestCase(unittest.TestCase):
+    def testHistogram(self):
+        stats = BCHTStorageStats()
+        for seconds in (0.0, 1e-6, 3e-6, 3e-6, 100.0):
+            stats.record("op", seconds)
+        operation = stats.to_dict()["operations"]["op"]
+        self.assertEqual(operation["histogram"][:3], [2, 0, 2])
+        self.assertEqual(operation["histogram"][-1], 1)
+        self.assertEqual(len(operation["histogram"]), len(LATENCY_BUCKETS))
+        self.assertEqual(operation["p50"], LATENCY_BUCKETS[2])
+        self.assertEqual(operation["p99"], LATENCY_BUCKETS[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# bchosttrust/tests/storage_memory.py
+# Test bchosttrust.storage.memory
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+
+import unittest
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTMemoryStorage, memory
+from bchosttrust.storage.uri import open_storage
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTMemoryStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = BCHTMemoryStorage()
+        self.blocks = [BCHTBlock(1, b"\x00" * 32, i, i, (
+            BCHTEntry(f"www.example{i}.com", attitudes.UPVOTE),
+        )) for i in range(5)]
+        for block in self.blocks[:3]:
+            self.db.put(block)
+        self.db.setattr(b"a", b"1")
+        self.db.setattr(b"b", b"2")
+
+    def tearDown(self):
+        self.db.close()
+
+    def testOrdered(self):
+        self.db.put(self.blocks[3])
+        self.db.delete(self.blocks[0].hash)
+        expected = sorted(block.hash for block in self.blocks[1:4])
+        self.assertEqual([key for key, _ in self.db.iter_raw_blocks()], expected)
+        self.assertEqual([key for key, _ in self.db.iter_headers(start=expected[1])],
+                         expected[1:])
+        self.assertEqual(self.db.get(self.blocks[3].hash), self.blocks[3])
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            self.db.get(self.blocks[0].hash)
+
+    def testClone(self):
+        clone = self.db.clone()
+        clone.put(self.blocks[3])
+        clone.delete(self.blocks[0].hash)
+        clone.setattr(b"a", b"3")
+        self.db.put(self.blocks[4])
+        self.db.delattr(b"b")
+
+        self.assertTrue(self.db.contains(self.blocks[0].hash))
+        self.assertFalse(self.db.contains(self.blocks[3].hash))
+        self.assertEqual(dict(self.db.iter_attrs()), {b"a": b"1"})
+        self.assertFalse(clone.contains(self.blocks[0].hash))
+        self.assertFalse(clone.contains(self.blocks[4].hash))
+        self.assertEqual(dict(clone.iter_attrs()), {b"a": b"3", b"b": b"2"})
+        self.assertEqual(len(list(clone.iter_blocks())), 3)
+
+        # Closing either leaves the other usable
+        self.db.close()
+        self.assertEqual(clone.getattr(b"b"), b"2")
+        clone.close()
+
+    def testLayers(self):
+        # Clones of an unchanged database share the same layers
+        clone = self.db.clone()
+        for _ in range(memory.MAX_LAYERS * 2):
+            self.db.clone().close()
+            clone.setattr(b"c", b"")
+            clone = clone.clone()
+        self.assertLessEqual(len(clone._attrs.frozen), memory.MAX_LAYERS)  # pylint: disable=protected-access
+        self.assertEqual(len(self.db._attrs.frozen), 1)  # pylint: disable=protected-access
+        self.assertEqual(dict(clone.iter_attrs()), {b"a": b"1", b"b": b"2", b"c": b""})
+
+        self.db.delattr(b"a")
+        self.db.compact()
+        self.assertEqual(self.db._attrs.frozen, ())  # pylint: disable=protected-access
+        self.assertEqual(dict(self.db.iter_attrs()), {b"b": b"2"})
+        self.assertEqual(clone.getattr(b"a"), b"1")
+
+    def testSnapshot(self):
+        with self.db.snapshot() as snapshot:
+            self.db.setattr(b"a", b"3")
+            self.assertEqual(snapshot.getattr(b"a"), b"1")
+            with self.assertRaises(exceptions.BCHTReadOnlyError):
+                snapshot.setattr(b"a", b"4")
+
+    def testSwapAttrs(self):
+        self.db.setattr(b"new-a", b"5")
+        self.db.swap_attrs(b"new-", (b"a", ))
+        self.assertEqual(dict(self.db.iter_attrs()), {b"a": b"5", b"b": b"2"})
+
+    def testAttrWriteMany(self):
+        self.db.setattr_many(((b"a", None), (b"c", b"3"), (b"d", None), (b"b", b"4")))
+        self.assertEqual(dict(self.db.iter_attrs()), {b"b": b"4", b"c": b"3"})
+
+    def testMemoryUsage(self):
+        usage = self.db.memory_usage()
+        self.db.put(self.blocks[3])
+        self.assertGreater(self.db.memory_usage(), usage + len(self.blocks[3].raw))
+
+    def testOpen(self):
+        with open_storage("memory:") as db:
+            self.assertIsInstance(db, BCHTMemoryStorage)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# bchosttrust/tests/storage_migrate.py
+# Test bchosttrust.storage.migrate
+# canonical: bchosttrust.storage.meta.BCHTStorageBase.getattr_cached
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+from os import path
+
+from backends import for_each_backend
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTLevelDBStorage
+from bchosttrust.storage.import_block import import_block
+from bchosttrust.storage.migrate import migrate, verify_migration, MIGRATE_CURSOR
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class Interrupted(Exception):
+    pass
+
+
+@for_each_backend("Dummy", "Memory", "LevelDBCodec", "SQLite", "Sharded", "Segment")
+class BCHTMigrateTests:
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.source = BCHTLevelDBStorage.init_db(
+            name=path.join(self.temp_dir.name, "source.db"), create_if_missing=True)
+        self.dest = self.make_backend()
+
+        prev_hash = b"\x00" * 32
+        for i in range(25):
+            block = BCHTBlock(1, prev_hash, 10 + i, i, (
+                BCHTEntry(f"www.example{i % 4}.com", attitudes.UPVOTE),
+            ))
+            # Skipping the proof-of-work, as only the copies are compared
+            self.source.put(block)
+            prev_hash = block.hash
+        import_block(self.source, BCHTBlock(1, b"\x00" * 32, 0, 0, ()))
+
+    def tearDown(self):
+        self.dest.close()
+        self.source.close()
+
+    def testMigrate(self):
+        stats = migrate(self.source, self.dest, batch_size=7)
+        self.assertEqual(stats.blocks, 26)
+        self.assertEqual(stats.attrs, len(list(self.source.iter_attrs())))
+        self.assertFalse(stats.resumed)
+        self.assertEqual(sorted(self.dest.iter_raw_blocks()),
+                         sorted(self.source.iter_raw_blocks()))
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            self.dest.getattr(MIGRATE_CURSOR)
+
+    def testResume(self):
+        copied = []
+
+        def progress(kind, count):
+            copied.append((kind, count))
+            if len(copied) == 2:
+                raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            migrate(self.source, self.dest, batch_size=10, progress=progress)
+        stats = migrate(self.source, self.dest, batch_size=10)
+        self.assertTrue(stats.resumed)
+        self.assertEqual(stats.blocks, 6)
+        verify_migration(self.source, self.dest)
+
+    def testVerify(self):
+        migrate(self.source, self.dest)
+        self.dest.put(BCHTBlock(1, b"\x00" * 32, 1, 1, ()))
+        with self.assertRaises(exceptions.BCHTMigrationError):
+            verify_migration(self.source, self.dest)
+        self.source.put(BCHTBlock(1, b"\x00" * 32, 1, 1, ()))
+        verify_migration(self.source, self.dest)
+        self.dest.setattr(b"test", b"")
+        with self.assertRaises(exceptions.BCHTMigrationError):
+            verify_migration(self.source, self.dest)
+
+
+if __name__ == '__main__':
+    unittest.main()
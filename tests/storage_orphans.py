@@ -0,0 +1,162 @@
+# bchosttrust/tests/storage_orphans.py
+# Test bchosttrust.storage.orphans.BCHTOrphanPool
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+from unittest import mock
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage
+from bchosttrust.storage.orphans import BCHTOrphanPool
+from bchosttrust.storage.import_block import import_block, get_best_hash
+from bchosttrust.storage.prune import set_prune_keep, get_pruned_height
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+from bchosttrust.consensus.powc import attempt
+
+
+def mine(prev_hash, creation_time):
+    block, _ = attempt(1, prev_hash, creation_time, (
+        BCHTEntry("www.example.com", attitudes.UPVOTE),
+    ))
+    return block
+
+
+class BCHTOrphanPoolTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # genesis -> chain[0] -> chain[1] -> chain[2]
+        #                     -> fork
+        cls.genesis = BCHTBlock(1, b"\x00" * 32, 0, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        cls.chain = []
+        prev_hash = cls.genesis.hash
+        for i in range(3):
+            cls.chain.append(mine(prev_hash, i + 1))
+            prev_hash = cls.chain[-1].hash
+        cls.fork = mine(cls.chain[0].hash, 10)
+
+    def setUp(self):
+        self.db = BCHTDummyStorage()
+        import_block(self.db, self.genesis)
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.db.close()
+
+    def clock(self):
+        return self.now
+
+    def testOrphanError(self):
+        with self.assertRaises(exceptions.BCHTOrphanBlockError):
+            import_block(self.db, self.chain[1])
+
+    def testOutOfOrder(self):
+        pool = BCHTOrphanPool(self.db, clock=self.clock)
+
+        self.assertEqual(pool.add(self.chain[2]), ())
+        self.assertEqual(pool.add(self.fork), ())
+        self.assertEqual(pool.add(self.chain[1]), ())
+        self.assertEqual(len(pool), 3)
+
+        imported = pool.add(self.chain[0])
+        self.assertEqual(imported[0], self.chain[0].hash)
+        self.assertEqual(set(imported), {self.chain[0].hash, self.chain[1].hash,
+                                         self.chain[2].hash, self.fork.hash})
+        self.assertLess(imported.index(self.chain[1].hash), imported.index(self.chain[2].hash))
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(get_best_hash(self.db), self.chain[2].hash)
+        self.assertEqual(self.db.getattr(b"prev_hash"), self.chain[1].hash)
+
+    def testEviction(self):
+        pool = BCHTOrphanPool(self.db, max_blocks=2, max_age=60, clock=self.clock)
+        pool.add(self.chain[1])
+        self.now += 30
+        pool.add(self.chain[2])
+        pool.add(self.fork)
+        # Over max_blocks, the oldest one goes
+        self.assertNotIn(self.chain[1].hash, pool)
+        self.assertEqual(len(pool), 2)
+
+        self.now += 31
+        self.assertEqual(pool.expire(), 0)
+        self.now += 30
+        self.assertEqual(pool.expire(), 2)
+        self.assertEqual(len(pool), 0)
+
+    def testPersist(self):
+        pool = BCHTOrphanPool(self.db, persist=True, clock=self.clock)
+        pool.add(self.chain[2])
+        pool.add(self.chain[1])
+
+        pool = BCHTOrphanPool(self.db, persist=True, clock=self.clock)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(len(pool.add(self.chain[0])), 3)
+        self.assertEqual(list(self.db.iter_attrs(b"orphan-")), [])
+
+    def testReleaseBatch(self):
+        pool = BCHTOrphanPool(self.db, persist=True, clock=self.clock)
+        pool.add(self.chain[2])
+        pool.add(self.chain[1])
+        set_prune_keep(self.db, 1)
+
+        # The blocks waiting are written together, and then pruned as import_block does
+        db = self.db
+        with mock.patch.object(db, "put_raw_many", wraps=db.put_raw_many) as put_many, \
+                mock.patch.object(db, "setattr_many", wraps=db.setattr_many) as set_many:
+            self.assertEqual(len(pool.add(self.chain[0])), 3)
+        put_many.assert_called_once()
+        # The last write, after those of import_block for chain[0]
+        flushed = dict(set_many.call_args.args[0])
+        self.assertIsNone(flushed[b"orphan-" + self.chain[1].hash])
+        self.assertIsNone(flushed[b"orphan-" + self.chain[2].hash])
+        self.assertEqual(list(self.db.iter_attrs(b"orphan-")), [])
+        self.assertEqual(get_best_hash(self.db), self.chain[2].hash)
+        self.assertGreater(get_pruned_height(self.db), 0)
+
+    def testNoHold(self):
+        pool = BCHTOrphanPool(self.db, clock=self.clock)
+        pool.add(self.chain[2])
+        with self.assertRaises(exceptions.BCHTOrphanBlockError):
+            pool.add(self.chain[1], hold=False)
+        self.assertEqual(len(pool), 1)
+
+    def testInvalidParent(self):
+        pool = BCHTOrphanPool(self.db, clock=self.clock)
+        pool.add(self.chain[2])
+        invalid = BCHTBlock(1, self.genesis.hash, 1, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        pool.add(BCHTBlock(1, invalid.hash, 2, 0, ()))
+        self.assertEqual(len(pool), 2)
+
+        with self.assertRaises(exceptions.BCHTConsensusFailedError):
+            pool.add(invalid)
+        self.assertEqual(len(pool), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
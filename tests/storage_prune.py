@@ -0,0 +1,168 @@
+# bchosttrust/tests/storage_prune.py
+# Test bchosttrust.storage.prune
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTDummyStorage, index, prune
+from bchosttrust.storage.import_block import import_block, update_best_tip, get_best_hash
+from bchosttrust.storage.chainstate import sync_state, get_state_votes
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+from bchosttrust.analysis import search
+from bchosttrust.consensus.powc import attempt
+
+
+class BCHTPruneTestCase(unittest.TestCase):
+    def setUp(self):
+        # main[0] -> main[1] -> ... -> main[11]
+        #         -> forks[0] (height 1) -> its child
+        #                                             main[8] -> forks[1] (height 9)
+        self.db = BCHTDummyStorage()
+        self.main = []
+        prev_hash = b"\x00" * 32
+        for i in range(12):
+            prev_hash = self.add(prev_hash, i)
+            self.main.append(prev_hash)
+        self.forks = [self.add(self.main[0], 100), self.add(self.main[8], 101)]
+        self.fork_child = self.add(self.forks[0], 102)
+
+    def tearDown(self):
+        self.db.close()
+
+    def add(self, prev_hash, i):
+        # Skipping the proof-of-work, as _import_block would do after validation
+        block = BCHTBlock(1, prev_hash, 10 + i, i, (
+            BCHTEntry(f"www.example{i}.com", attitudes.UPVOTE),
+        ))
+        self.db.put(block)
+        prev_meta = None if i == 0 else index.ensure_indexed(self.db, prev_hash)
+        meta = index.index_block(self.db, block, prev_meta)
+        update_best_tip(self.db, block, meta)
+        sync_state(self.db)
+        return block.hash
+
+    def assertRemoved(self, block_hash):
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            self.db.get(block_hash)
+        self.assertFalse(index.has_block_meta(self.db, block_hash))
+
+    def testStaleForks(self):
+        removed = prune.prune_stale_forks(self.db, depth=5)
+        self.assertEqual(set(removed), {self.forks[0], self.fork_child})
+        self.assertLess(removed.index(self.forks[0]), removed.index(self.fork_child))
+        for block_hash in removed:
+            self.assertRemoved(block_hash)
+        self.assertEqual(index.get_children(self.db, self.main[0]), (self.main[1], ))
+        # The recent fork stays
+        self.db.get(self.forks[1])
+        self.assertEqual(get_best_hash(self.db), self.main[11])
+
+        # Heights already checked are skipped, unless asked for
+        self.assertEqual(prune.prune_stale_forks(self.db, depth=5), ())
+        late = self.add(self.main[1], 103)
+        self.assertEqual(prune.prune_stale_forks(self.db, depth=5), ())
+        self.assertEqual(prune.prune_stale_forks(self.db, depth=5, full=True), (late, ))
+
+        with self.assertRaises(exceptions.BCHTOutOfRangeError):
+            prune.prune_stale_forks(self.db, depth=0)
+
+    def testHistory(self):
+        # The state tip is main[10], so main[8:11] are kept
+        removed = prune.prune_history(self.db, 3)
+        self.assertEqual(set(removed), set(self.main[:8]) | {self.forks[0], self.fork_child})
+        for block_hash in removed:
+            self.assertRemoved(block_hash)
+        self.assertEqual(prune.get_pruned_height(self.db), 8)
+        self.assertIsNone(index.get_main_chain_hash(self.db, 7))
+        self.assertEqual(index.get_main_chain_hash(self.db, 8), self.main[8])
+        self.db.get(self.forks[1])
+
+        # The removed blocks are still counted in the state
+        self.assertEqual(get_state_votes(self.db, "www.example0.com"), {attitudes.UPVOTE: 1})
+
+        self.assertEqual(prune.prune_history(self.db, 3), ())
+        self.assertEqual(prune.prune_stale_forks(self.db, depth=1, full=True), (self.forks[1], ))
+
+    def testRating(self):
+        prune.prune_history(self.db, 3)
+        # The best tip is built on the state tip, whose votes cover the removed blocks
+        self.assertEqual(search.get_specific_website_rating(
+            self.db, self.main[11], "www.example0.com"), 1)
+        self.assertEqual(search.get_specific_website_rating(
+            self.db, self.main[11], "www.example11.com"), 1)
+        ratings = search.get_website_rating(self.db, self.main[11])
+        self.assertEqual(set(ratings), {f"www.example{i}.com" for i in range(12)})
+
+        # A fork off a kept block would be rated without the removed blocks
+        with self.assertRaises(exceptions.BCHTHistoryPrunedError):
+            search.get_specific_website_rating(self.db, self.forks[1], "www.example0.com")
+        with self.assertRaises(exceptions.BCHTHistoryPrunedError):
+            search.get_website_rating(self.db, self.forks[1])
+
+    def testPruneKeep(self):
+        self.assertIsNone(prune.get_prune_keep(self.db))
+        prune.set_prune_keep(self.db, 5)
+        self.assertEqual(prune.get_prune_keep(self.db), 5)
+        prune.set_prune_keep(self.db, None)
+        self.assertIsNone(prune.get_prune_keep(self.db))
+        prune.set_prune_keep(self.db, None)
+        with self.assertRaises(exceptions.BCHTOutOfRangeError):
+            prune.set_prune_keep(self.db, 0)
+
+
+class BCHTPrunedModeTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.chain = [BCHTBlock(1, b"\x00" * 32, 0, 0, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))]
+        for i in range(3):
+            block, _ = attempt(1, cls.chain[-1].hash, i + 1, (
+                BCHTEntry("www.example.com", attitudes.UPVOTE),
+            ))
+            cls.chain.append(block)
+
+    def testImport(self):
+        db = BCHTDummyStorage()
+        prune.set_prune_keep(db, 1)
+        for block in self.chain:
+            import_block(db, block)
+
+        # Only the state tip and the best tip are left
+        for block in self.chain[:2]:
+            with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+                db.get(block.hash)
+        db.get(self.chain[2].hash)
+        self.assertEqual(get_best_hash(db), self.chain[3].hash)
+        self.assertEqual(prune.get_pruned_height(db), 2)
+        self.assertEqual(get_state_votes(db, "www.example.com"),
+                         {attitudes.UPVOTE: 3})
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# bchosttrust/tests/storage_reindex.py
+# Test bchosttrust.storage.reindex
+# canonical: bchosttrust.storage.meta.BCHTStorageBase.getattr_cached
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from backends import for_each_backend
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import index, prune
+from bchosttrust.storage.import_block import (update_best_tip, get_best_hash,
+                                              parse_curr_hashes, TIP_PREFIX, TIP_HASH_PREFIX,
+                                              TIP_RANGE)
+from bchosttrust.storage.chainstate import TALLY_PREFIX, sync_state, get_state_votes
+from bchosttrust.storage.reindex import reindex, SHADOW_PREFIX
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+# Renumbered by a rebuild
+TIP_SEQUENCES = (TIP_PREFIX, TIP_HASH_PREFIX, TIP_RANGE)
+
+
+@for_each_backend("Dummy", "Memory", "LevelDB", "SQLite", "Sharded")
+class BCHTReindexTests:
+    def setUp(self):
+        # main[0] -> ... -> main[9]
+        #         -> fork (height 1) -> its child
+        #                                main[8] -> sibling (height 9)
+        self.db = self.make_backend()
+        self.main = []
+        prev_hash = b"\x00" * 32
+        for i in range(10):
+            prev_hash = self.add(prev_hash, i)
+            self.main.append(prev_hash)
+        self.fork = self.add(self.main[0], 100)
+        self.fork_child = self.add(self.fork, 101)
+        self.sibling = self.add(self.main[8], 102)
+        self.db.setattr(index.INDEX_COMPLETE, b"1")  # As import_block does
+
+    def tearDown(self):
+        self.db.close()
+
+    def add(self, prev_hash, i):
+        # Skipping the proof-of-work, as _import_block would do after validation
+        block = BCHTBlock(1, prev_hash, 10 + i, i, (
+            BCHTEntry(f"www.example{i % 3}.com", attitudes.UPVOTE),
+        ))
+        self.db.put(block)
+        prev_meta = None if i == 0 else index.ensure_indexed(self.db, prev_hash)
+        meta = index.index_block(self.db, block, prev_meta)
+        update_best_tip(self.db, block, meta)
+        sync_state(self.db)
+        return block.hash
+
+    def derived_attrs(self):
+        return {key: content for key, content in self.db.iter_attrs()
+                if not key.startswith(TIP_SEQUENCES)}
+
+    def testRebuild(self):
+        expected = self.derived_attrs()
+        tips = parse_curr_hashes(self.db)
+        self.assertEqual(reindex(self.db, workers=2, chunk_size=3), (13, 0))
+        self.assertEqual(self.derived_attrs(), expected)
+        self.assertEqual(parse_curr_hashes(self.db), tips)
+        self.assertEqual(list(self.db.iter_attrs(SHADOW_PREFIX)), [])
+
+    def testCorrupted(self):
+        expected = self.derived_attrs()
+        self.db.delattr(index._key(index.META_PREFIX, self.main[3]))  # pylint: disable=protected-access
+        self.db.setattr(TALLY_PREFIX + b"www.example0.com", b"")
+        self.db.setattr(b"reindex-meta-leftover", b"")
+        reindex(self.db)
+        self.assertEqual(self.derived_attrs(), expected)
+
+    def testOnline(self):
+        votes = dict(get_state_votes(self.db, "www.example0.com"))
+        seen = []
+
+        def progress(done, total):
+            # Readers are still served the old attributes
+            self.assertEqual(get_state_votes(self.db, "www.example0.com"), votes)
+            self.assertEqual(get_best_hash(self.db), self.main[-1])
+            seen.append((done, total))
+
+        reindex(self.db, chunk_size=5, progress=progress)
+        self.assertEqual(seen[-1], (13, 13))
+        self.assertEqual(get_best_hash(self.db), self.main[-1])
+
+    def testPruned(self):
+        prune.prune_history(self.db, 3)
+        with self.assertRaises(ValueError):
+            reindex(self.db)
+        with self.assertRaises(exceptions.BCHTOutOfRangeError):
+            reindex(self.db, workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# bchosttrust/tests/storage_scan.py
+# Test bchosttrust.storage.scan and the scan methods of the storage backends
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from backends import backend_maker, for_each_backend
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.internal import BCHTBlockHeader
+from bchosttrust.storage.scan import scan_raw_blocks, scan_headers
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+@for_each_backend()
+class BCHTScanTests:
+    def setUp(self):
+        self.backend = self.make_backend()
+
+        self.blocks = tuple(BCHTBlock(1, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(5))
+        for block in self.blocks:
+            self.backend.put(block)
+        self.sorted_blocks = sorted(self.blocks, key=lambda block: block.hash)
+
+    def tearDown(self):
+        self.backend.close()
+
+    def testRaw(self):
+        self.assertEqual(self.backend.get_raw(self.blocks[0].hash), self.blocks[0].raw)
+        self.assertEqual(tuple(self.backend.iter_raw_blocks(fill_cache=False)),
+                         tuple((block.hash, block.raw) for block in self.sorted_blocks))
+
+    def testRange(self):
+        start = self.sorted_blocks[1].hash
+        stop = self.sorted_blocks[3].hash
+
+        self.assertEqual(tuple(key for key, _ in self.backend.iter_raw_blocks(start, stop)),
+                         (self.sorted_blocks[1].hash, self.sorted_blocks[2].hash))
+
+    def testHeaders(self):
+        self.assertEqual(tuple(self.backend.iter_headers()), tuple(
+            (block.hash, BCHTBlockHeader(1, b"\x00" * 32, block.creation_time, 4))
+            for block in self.sorted_blocks))
+
+    def testPagination(self):
+        page = scan_raw_blocks(self.backend, limit=2)
+        self.assertEqual(len(page.items), 2)
+
+        seen = list(page.items)
+        while page.cursor is not None:
+            page = scan_raw_blocks(self.backend, page.cursor, limit=2)
+            seen.extend(page.items)
+
+        self.assertEqual(tuple(seen),
+                         tuple((block.hash, block.raw) for block in self.sorted_blocks))
+
+        page = scan_headers(self.backend, limit=10)
+        self.assertEqual(len(page.items), 5)
+        self.assertIsNone(page.cursor)
+
+    def testInvalidLimit(self):
+        for limit in (0, -1):
+            with self.assertRaises(exceptions.BCHTOutOfRangeError):
+                scan_raw_blocks(self.backend, limit=limit)
+            with self.assertRaises(exceptions.BCHTOutOfRangeError):
+                scan_headers(self.backend, limit=limit)
+
+
+class BCHTLevelDBSnapshotScanTestCase(BCHTScanTests, unittest.TestCase):
+    make_backend = backend_maker("LevelDB")
+
+    def setUp(self):
+        super().setUp()
+        self.live = self.backend
+        self.backend = self.live.snapshot()
+        self.live.put(BCHTBlock(1, b"\x00" * 32, 5, 4, ()))  # Not seen
+
+    def tearDown(self):
+        self.backend.close()
+        self.live.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+# bchosttrust/tests/storage_segment.py
+# Test bchosttrust.storage.BCHTSegmentStorage
+# canonical: bchosttrust.storage.segment.BCHTSegmentStorage
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+from os import path
+from os.path import getsize
+from unittest import mock
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTSegmentStorage
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTSegmentStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def testReadWrite(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        entry_a = BCHTEntry("www.google.com", 2)
+        entry_b = BCHTEntry("www.example.net", 3)
+        entry_tuple = (entry_a, entry_b)
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+        backend.put(block)
+
+        self.assertEqual(backend.get(block.hash), block)
+
+    def testDelete(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        entry_a = BCHTEntry("www.google.com", 2)
+        entry_b = BCHTEntry("www.example.net", 3)
+        entry_tuple = (entry_a, entry_b)
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+        backend.put(block)
+
+        backend.delete(block.hash)
+
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            backend.get(block.hash)
+
+    def testAttrReadWrite(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        attr_key = b"last_block_id"
+        attr_value = b"Catgirl-Nya"
+
+        backend.setattr(attr_key, attr_value)
+
+        self.assertEqual(backend.getattr(attr_key), attr_value)
+
+    def testAttrDelete(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        attr_key = b"last_block_id"
+        attr_value = b"Catgirl-Nya"
+
+        backend.setattr(attr_key, attr_value)
+
+        backend.delattr(attr_key)
+
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            backend.getattr(attr_key)
+
+    def testAttrIteration(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        backend.setattr(b"fruit-pear", b"2")
+        backend.setattr(b"fruit-apple", b"1")
+        backend.setattr(b"vegetable-leek", b"3")
+
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-")), (
+            (b"fruit-apple", b"1"),
+            (b"fruit-pear", b"2")
+        ))
+        self.assertEqual(len(tuple(backend.iter_attrs())), 3)
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-", reverse=True)), (
+            (b"fruit-pear", b"2"),
+            (b"fruit-apple", b"1")
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(
+            b"fruit-", start=b"fruit-b", stop=b"fruit-q")), (
+            (b"fruit-pear", b"2"),
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(start=b"g")), (
+            (b"vegetable-leek", b"3"),
+        ))
+
+    def testIteration(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block2 = BCHTBlock(1, block1.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block3 = BCHTBlock(1, block2.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+
+        backend.put(block1)
+        backend.put(block2)
+        backend.put(block3)
+
+        list_blocks = tuple(backend.iter_blocks())
+
+        for block in (block1, block2, block3):
+            self.assertTrue(block in list_blocks)
+
+    def testIterationDict(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block2 = BCHTBlock(1, block1.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block3 = BCHTBlock(1, block2.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+
+        backend.put(block1)
+        backend.put(block2)
+        backend.put(block3)
+
+        dict_blocks = dict(backend.iter_blocks_with_key())
+
+        for block in (block1, block2, block3):
+            self.assertTrue(block.hash in dict_blocks)
+            self.assertEqual(dict_blocks[block.hash], block)
+
+    def testDBClose(self):
+        backend = BCHTSegmentStorage(path.join(self.temp_dir.name, "test.db"))
+
+        self.assertFalse(backend.closed)
+
+        backend.close()
+
+        self.assertTrue(backend.closed)
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            attr_key = b"last_block_id"
+            attr_value = b"Catgirl-Nya"
+
+            backend.setattr(attr_key, attr_value)
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            entry_a = BCHTEntry("www.google.com", 2)
+            entry_b = BCHTEntry("www.example.net", 3)
+            entry_tuple = (entry_a, entry_b)
+            block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+            backend.put(block)
+
+    def testReopen(self):
+        db_path = path.join(self.temp_dir.name, "test.db")
+        backend = BCHTSegmentStorage(db_path, segment_size=100)
+
+        blocks = tuple(BCHTBlock(0, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(5))
+        for block in blocks:
+            backend.put(block)
+        backend.delete(blocks[0].hash)
+        backend.setattr(b"last_block_id", b"Catgirl-Nya")
+        backend.close()
+
+        backend = BCHTSegmentStorage(db_path, segment_size=100)
+
+        self.assertEqual(tuple(backend.iter_blocks()), blocks[1:])
+        self.assertEqual(backend.getattr(b"last_block_id"), b"Catgirl-Nya")
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            backend.get(blocks[0].hash)
+        backend.close()
+
+    def testTruncatedRecord(self):
+        db_path = path.join(self.temp_dir.name, "test.db")
+        backend = BCHTSegmentStorage(db_path)
+
+        block1 = BCHTBlock(0, b"\x00" * 32, 1, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        block2 = BCHTBlock(0, b"\x00" * 32, 2, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        backend.put(block1)
+        backend.put(block2)
+        backend.close()
+
+        # Simulate a crash in the middle of writing block2
+        seg_path = path.join(db_path, "seg-00000000.dat")
+        with open(seg_path, "r+b") as f:
+            f.truncate(getsize(seg_path) - 3)
+
+        backend = BCHTSegmentStorage(db_path)
+
+        self.assertEqual(backend.get(block1.hash), block1)
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            backend.get(block2.hash)
+
+        backend.put(block2)
+        self.assertEqual(backend.get(block2.hash), block2)
+        backend.close()
+
+    def testFlushedBeforeAttrs(self):
+        db_path = path.join(self.temp_dir.name, "test.db")
+        backend = BCHTSegmentStorage(db_path)
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        seg_path = path.join(db_path, "seg-00000000.dat")
+
+        def check_flushed(*_):
+            # The block is in the file by the time an attribute refers to it
+            self.assertEqual(getsize(seg_path), 36 + len(block.raw))
+
+        backend.put(block)
+        with mock.patch("bchosttrust.storage.segment.os.fsync") as fsync, \
+                mock.patch.object(backend, "_attr_db") as attr_db:
+            attr_db.put.side_effect = check_flushed
+            backend.setattr(b"meta", block.hash)
+            backend.setattr(b"meta", block.hash)
+            self.assertEqual(attr_db.put.call_count, 2)
+            # Synced on close, not on every write
+            backend.put_raw_many([(block.hash, block.raw)])
+            fsync.assert_not_called()
+            backend.close()
+        fsync.assert_called_once()
+
+    def testWriteWhileIterating(self):
+        db_path = path.join(self.temp_dir.name, "test.db")
+        backend = BCHTSegmentStorage(db_path)
+        blocks = [BCHTBlock(0, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(4)]
+        for block in blocks[:2]:
+            backend.put(block)
+
+        seen = []
+        for block in backend.iter_blocks():
+            seen.append(block)
+            # Remaps the segment being read, which fails if a view of it is still held
+            backend.put(blocks[len(seen) + 1])
+            self.assertEqual(dict(backend.iter_raw_blocks())[blocks[len(seen) + 1].hash],
+                             blocks[len(seen) + 1].raw)
+        self.assertEqual(seen, blocks[:2])
+        self.assertEqual(backend.get(blocks[3].hash), blocks[3])
+        backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
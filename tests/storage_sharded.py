@@ -0,0 +1,126 @@
+# bchosttrust/tests/storage_sharded.py
+# Test bchosttrust.storage.BCHTShardedStorage
+# canonical: bchosttrust.storage.sharded.BCHTShardedStorage
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+from os import path
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTShardedStorage
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTShardedStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.names = tuple(path.join(self.temp_dir.name, f"shard{i}.db") for i in range(4))
+        self.blocks = tuple(BCHTBlock(1, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(20))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, names=None):
+        return BCHTShardedStorage.init_db(names or self.names, create_if_missing=True)
+
+    def testReadWrite(self):
+        backend = self.open()
+
+        for block in self.blocks:
+            backend.put(block)
+
+        for block in self.blocks:
+            self.assertEqual(backend.get(block.hash), block)
+        # Spread over the shards
+        self.assertGreater(sum(any(True for _ in shard.iter_raw_blocks())
+                               for shard in backend.shards), 1)
+        backend.close()
+
+    def testDelete(self):
+        backend = self.open()
+        backend.put(self.blocks[0])
+
+        backend.delete(self.blocks[0].hash)
+
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            backend.get(self.blocks[0].hash)
+        backend.close()
+
+    def testIteration(self):
+        backend = self.open()
+        backend.put_many(self.blocks)
+
+        sorted_hashes = sorted(block.hash for block in self.blocks)
+        self.assertEqual([key for key, _ in backend.iter_blocks_with_key()], sorted_hashes)
+        self.assertEqual(len(tuple(backend.iter_blocks())), 20)
+        self.assertEqual(
+            [key for key, _ in backend.iter_raw_blocks(sorted_hashes[3], sorted_hashes[15])],
+            sorted_hashes[3:15])
+        backend.close()
+
+    def testAttrs(self):
+        backend = self.open()
+
+        backend.setattr(b"last_block_id", b"Catgirl-Nya")
+
+        self.assertEqual(backend.getattr(b"last_block_id"), b"Catgirl-Nya")
+        self.assertEqual(backend.shards[0].getattr(b"last_block_id"), b"Catgirl-Nya")
+        backend.delattr(b"last_block_id")
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            backend.getattr(b"last_block_id")
+        backend.close()
+
+    def testShardCount(self):
+        backend = self.open()
+        backend.put_many(self.blocks)
+        backend.close()
+
+        with self.assertRaises(ValueError):
+            self.open(self.names[:2])
+
+        backend = self.open()
+        backend.compact()
+        self.assertEqual(len(tuple(backend.iter_blocks())), 20)
+        backend.close()
+
+    def testDBClose(self):
+        backend = self.open()
+
+        self.assertFalse(backend.closed)
+
+        backend.close()
+
+        self.assertTrue(backend.closed)
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            backend.put(self.blocks[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# bchosttrust/tests/storage_snapshot.py
+# Test the snapshot method of the storage backends
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+
+from backends import for_each_backend
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+@for_each_backend()
+class BCHTSnapshotTests:
+    def setUp(self):
+        self.backend = self.make_backend()
+
+        self.block1 = BCHTBlock(1, b"\x00" * 32, 1, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        self.block2 = BCHTBlock(1, self.block1.hash, 2, 4, (
+            BCHTEntry("www.example.net", attitudes.UPVOTE),
+        ))
+        self.block3 = BCHTBlock(1, self.block2.hash, 3, 4, (
+            BCHTEntry("www.example.org", attitudes.UPVOTE),
+        ))
+        self.backend.put(self.block1)
+        self.backend.put(self.block2)
+        self.backend.setattr(b"fruit-apple", b"1")
+        self.backend.setattr(b"fruit-pear", b"2")
+
+    def tearDown(self):
+        self.backend.close()
+
+    def testPinned(self):
+        with self.backend.snapshot() as snapshot:
+            self.backend.put(self.block3)
+            self.backend.delete(self.block1.hash)
+            self.backend.setattr(b"fruit-apple", b"3")
+            self.backend.setattr(b"fruit-banana", b"4")
+            self.backend.delattr(b"fruit-pear")
+
+            self.assertEqual(snapshot.get(self.block1.hash), self.block1)
+            with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+                snapshot.get(self.block3.hash)
+            self.assertEqual(dict(snapshot.iter_blocks_with_key()), {
+                self.block1.hash: self.block1,
+                self.block2.hash: self.block2
+            })
+            self.assertEqual(snapshot.getattr(b"fruit-apple"), b"1")
+            with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+                snapshot.getattr(b"fruit-banana")
+            self.assertEqual(tuple(snapshot.iter_attrs(b"fruit-", reverse=True)), (
+                (b"fruit-pear", b"2"),
+                (b"fruit-apple", b"1")
+            ))
+
+        self.assertTrue(snapshot.closed)
+        self.assertFalse(self.backend.closed)
+        self.assertEqual(self.backend.get(self.block3.hash), self.block3)
+        self.assertEqual(self.backend.getattr(b"fruit-apple"), b"3")
+
+    def testReadOnly(self):
+        with self.backend.snapshot() as snapshot:
+            with self.assertRaises(exceptions.BCHTReadOnlyError):
+                snapshot.put(self.block3)
+            with self.assertRaises(exceptions.BCHTReadOnlyError):
+                snapshot.setattr(b"fruit-apple", b"3")
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            snapshot.get(self.block1.hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
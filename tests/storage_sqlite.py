@@ -0,0 +1,326 @@
+# bchosttrust/tests/storage_sqlite.py
+# Test bchosttrust.storage.BCHTSQLiteStorage
+# canonical: bchosttrust.storage.sqlite.BCHTSQLiteStorage
+
+# Copyright (C) 2023  Marco Pui, Cato Yiu, Lewis Chen
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The legal text of GPLv3 and LGPLv3 can be found at
+# bchosttrust/gpl-3.0.txt and bchosttrust/lgpl-3.0.txt respectively.
+
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=invalid-name
+
+import unittest
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from bchosttrust import BCHTBlock, BCHTEntry
+from bchosttrust.storage import BCHTSQLiteStorage
+from bchosttrust import attitudes
+from bchosttrust import exceptions
+
+
+class BCHTSQLiteStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def testReadWrite(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        entry_a = BCHTEntry("www.google.com", 2)
+        entry_b = BCHTEntry("www.example.net", 3)
+        entry_tuple = (entry_a, entry_b)
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+        backend.put(block)
+
+        self.assertEqual(backend.get(block.hash), block)
+
+    def testDelete(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        entry_a = BCHTEntry("www.google.com", 2)
+        entry_b = BCHTEntry("www.example.net", 3)
+        entry_tuple = (entry_a, entry_b)
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+        backend.put(block)
+
+        backend.delete(block.hash)
+
+        with self.assertRaises(exceptions.BCHTBlockNotFoundError):
+            backend.get(block.hash)
+
+    def testAttrReadWrite(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        attr_key = b"last_block_id"
+        attr_value = b"Catgirl-Nya"
+
+        backend.setattr(attr_key, attr_value)
+
+        self.assertEqual(backend.getattr(attr_key), attr_value)
+
+    def testAttrDelete(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        attr_key = b"last_block_id"
+        attr_value = b"Catgirl-Nya"
+
+        backend.setattr(attr_key, attr_value)
+
+        backend.delattr(attr_key)
+
+        with self.assertRaises(exceptions.BCHTAttributeNotFoundError):
+            backend.getattr(attr_key)
+
+    def testAttrWriteMany(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        backend.setattr(b"a", b"1")
+        backend.setattr(b"b", b"2")
+
+        backend.setattr_many(((b"a", None), (b"c", b"3"), (b"d", None), (b"b", b"4")))
+
+        self.assertEqual(tuple(backend.iter_attrs()), ((b"b", b"4"), (b"c", b"3")))
+
+    def testAttrIteration(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        backend.setattr(b"fruit-pear", b"2")
+        backend.setattr(b"fruit-apple", b"1")
+        backend.setattr(b"vegetable-leek", b"3")
+
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-")), (
+            (b"fruit-apple", b"1"),
+            (b"fruit-pear", b"2")
+        ))
+        self.assertEqual(len(tuple(backend.iter_attrs())), 3)
+        self.assertEqual(tuple(backend.iter_attrs(b"fruit-", reverse=True)), (
+            (b"fruit-pear", b"2"),
+            (b"fruit-apple", b"1")
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(
+            b"fruit-", start=b"fruit-b", stop=b"fruit-q")), (
+            (b"fruit-pear", b"2"),
+        ))
+        self.assertEqual(tuple(backend.iter_attrs(start=b"g")), (
+            (b"vegetable-leek", b"3"),
+        ))
+
+    def testIteration(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block2 = BCHTBlock(1, block1.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block3 = BCHTBlock(1, block2.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+
+        backend.put(block1)
+        backend.put(block2)
+        backend.put(block3)
+
+        list_blocks = tuple(backend.iter_blocks())
+
+        for block in (block1, block2, block3):
+            self.assertTrue(block in list_blocks)
+
+    def testIterationDict(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        block1 = BCHTBlock(1, b"\x00" * 32, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block2 = BCHTBlock(1, block1.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+        block3 = BCHTBlock(1, block2.hash, 0, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", attitudes.UPVOTE)
+        ))
+
+        backend.put(block1)
+        backend.put(block2)
+        backend.put(block3)
+
+        dict_blocks = dict(backend.iter_blocks_with_key())
+
+        for block in (block1, block2, block3):
+            self.assertTrue(block.hash in dict_blocks)
+            self.assertEqual(dict_blocks[block.hash], block)
+
+    def testDBClose(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+
+        self.assertFalse(backend.closed)
+
+        backend.close()
+
+        self.assertTrue(backend.closed)
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            attr_key = b"last_block_id"
+            attr_value = b"Catgirl-Nya"
+
+            backend.setattr(attr_key, attr_value)
+
+        with self.assertRaises(exceptions.BCHTDatabaseClosedError):
+            entry_a = BCHTEntry("www.google.com", 2)
+            entry_b = BCHTEntry("www.example.net", 3)
+            entry_tuple = (entry_a, entry_b)
+            block = BCHTBlock(0, b"\x00" * 32, 1, 4, entry_tuple)
+
+            backend.put(block)
+
+    def testConcurrentReader(self):
+        db_path = path.join(self.temp_dir.name, "test.sqlite")
+        writer = BCHTSQLiteStorage(db_path)
+        reader = BCHTSQLiteStorage(db_path, read_only=True)
+
+        block = BCHTBlock(0, b"\x00" * 32, 1, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        writer.put(block)
+        writer.setattr(b"last_block_id", b"Catgirl-Nya")
+
+        self.assertEqual(reader.get(block.hash), block)
+        self.assertEqual(reader.getattr(b"last_block_id"), b"Catgirl-Nya")
+        with self.assertRaises(exceptions.BCHTReadOnlyError):
+            reader.setattr(b"last_block_id", b"Catboy-Nya")
+
+        reader.close()
+        writer.close()
+
+    def testConcurrentWriters(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"),
+                                    secondary_indexes=True)
+        blocks = tuple(BCHTBlock(0, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(400))
+
+        def write(block):
+            backend.put(block)
+            backend.setattr_many(((block.hash, b"1"), (b"last_block_id", block.hash)))
+
+        with ThreadPoolExecutor(8) as executor:
+            tuple(executor.map(write, blocks))
+
+        self.assertEqual(sum(1 for _ in backend.iter_blocks()), len(blocks))
+        self.assertEqual(sum(1 for _ in backend.iter_attrs()), len(blocks) + 1)
+        backend.close()
+
+    def testReadWhileWriting(self):
+        backend = BCHTSQLiteStorage(path.join(self.temp_dir.name, "test.sqlite"))
+        names = tuple(b"attr-%03d" % i for i in range(200))
+        backend.setattr_many((name, b"0") for name in names)
+        blocks = tuple(BCHTBlock(0, b"\x00" * 32, i, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        )) for i in range(300))
+        for block in blocks:
+            backend.put(block)
+        done = threading.Event()
+
+        def write():
+            i = 0
+            while not done.is_set():
+                i += 1
+                # Rewriting the rows the readers are going through
+                backend.setattr_many((name, b"%d" % i) for name in names)
+                backend.put_raw_many((block.hash, block.raw) for block in blocks)
+
+        def read(iterator):
+            keys = []
+            for key, _ in iterator:
+                keys.append(key)
+                time.sleep(0.0001)  # Letting the writer in
+            return tuple(keys)
+
+        with ThreadPoolExecutor(1) as executor:
+            writing = executor.submit(write)
+            try:
+                for _ in range(5):
+                    self.assertEqual(read(backend.iter_attrs()), names)
+                    self.assertEqual(read(backend.iter_attrs(reverse=True)), names[::-1])
+                    self.assertEqual(read(backend.iter_raw_blocks()),
+                                     tuple(sorted(block.hash for block in blocks)))
+            finally:
+                done.set()
+            writing.result()
+        backend.close()
+
+    def testSecondaryIndexes(self):
+        db_path = path.join(self.temp_dir.name, "test.sqlite")
+        backend = BCHTSQLiteStorage(db_path)
+
+        block1 = BCHTBlock(1, b"\x00" * 32, 10, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+            BCHTEntry("www.example.net", 2)
+        ))
+        block2 = BCHTBlock(1, block1.hash, 20, 4, (
+            BCHTEntry("www.example.com", attitudes.UPVOTE),
+        ))
+        block3 = BCHTBlock(1, block2.hash, 30, 4, (
+            BCHTEntry("www.example.com", 2),
+        ))
+        backend.put(block1)
+        backend.put(block2)
+        backend.close()
+
+        # Created and filled in on the existing blocks
+        backend = BCHTSQLiteStorage(db_path, secondary_indexes=True)
+        backend.put(block3)
+
+        self.assertTrue(backend.secondary_indexes)
+        self.assertEqual(backend.conn.execute(
+            "SELECT height FROM block_index WHERE creation_time >= 20 "
+            "ORDER BY height").fetchall(), [(1, ), (2, )])
+        self.assertEqual(backend.conn.execute(
+            "SELECT attitude, COUNT(*) FROM domain_votes WHERE domain = ? "
+            "GROUP BY attitude", ("www.example.com", )).fetchall(),
+            [(attitudes.UPVOTE, 2), (2, 1)])
+
+        backend.delete(block3.hash)
+
+        self.assertEqual(backend.conn.execute(
+            "SELECT MAX(height) FROM block_index").fetchone(), (1, ))
+        backend.close()
+
+        # Kept up to date even if not asked for
+        backend = BCHTSQLiteStorage(db_path)
+        self.assertTrue(backend.secondary_indexes)
+        backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()